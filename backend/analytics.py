@@ -0,0 +1,202 @@
+"""Per-user PnL and equity analytics.
+
+A user's closed trades are read once, projected, from the trade repository into
+NumPy columns sorted by ``closed_at``. Every breakdown after that is plain
+array work: a date range is two ``searchsorted`` calls, and period and
+symbol buckets are ``bincount`` sums. The columns are cached per user and
+stay valid until the user's count of closed trades changes. Trades are
+never reopened or deleted, so every close changes it, and repeated
+requests cost one indexed count.
+"""
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from user_cache import UserCache
+
+INTERVALS = ("day", "week", "month")
+MAX_BUCKETS = 1000
+
+TRADE_COLUMNS_PROJECTION = {"_id": 0, "closed_at": 1, "created_at": 1, "symbol": 1, "amount": 1, "pnl": 1}
+
+_DAY = np.timedelta64(1, "D")
+
+
+class TooManyBuckets(ValueError):
+    pass
+
+
+@dataclass
+class TradeColumns:
+    closed_count: int  # as read before loading; the cache key
+    closed_at: np.ndarray  # datetime64[ms], ascending
+    pnl: np.ndarray
+    amount: np.ndarray
+    symbol_codes: np.ndarray
+    symbols: np.ndarray
+    # Calendar day and month numbers since the epoch, computed once per load
+    days: np.ndarray
+    months: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.closed_at)
+
+    def window(self, start: Optional[datetime], end: Optional[datetime]) -> slice:
+        # [start, end), like the date filters on history and export
+        lo = 0 if start is None else int(np.searchsorted(self.closed_at, _datetime64(start), "left"))
+        hi = len(self) if end is None else int(np.searchsorted(self.closed_at, _datetime64(end), "left"))
+        return slice(lo, hi)
+
+
+def _datetime64(value: datetime) -> np.datetime64:
+    # Mongo hands back naive UTC datetimes; compare everything as naive UTC
+    timestamp = pd.Timestamp(value)
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.tz_convert("UTC").tz_localize(None)
+    return timestamp.to_datetime64().astype("datetime64[ms]")
+
+
+def build_columns(closed_count: int, docs: List[dict]) -> TradeColumns:
+    closed_at = pd.to_datetime(
+        [doc.get("closed_at") or doc["created_at"] for doc in docs], utc=True
+    ).tz_convert(None).values.astype("datetime64[ms]")
+    pnl = np.fromiter((doc.get("pnl", 0.0) for doc in docs), dtype=np.float64, count=len(docs))
+    amount = np.fromiter((doc["amount"] for doc in docs), dtype=np.float64, count=len(docs))
+    symbol_codes, symbols = pd.factorize(np.array([doc["symbol"] for doc in docs], dtype=object))
+
+    order = np.argsort(closed_at, kind="stable")
+    closed_at = closed_at[order]
+    return TradeColumns(
+        closed_count, closed_at, pnl[order], amount[order], symbol_codes[order],
+        np.asarray(symbols, dtype=object),
+        closed_at.astype("datetime64[D]").astype(np.int64),
+        closed_at.astype("datetime64[M]").astype(np.int64),
+    )
+
+
+async def load_trade_columns(trades, user_id: str, closed_count: int) -> TradeColumns:
+    return build_columns(closed_count, await trades.closed(user_id, TRADE_COLUMNS_PROJECTION))
+
+
+class AnalyticsCache:
+    """Trade columns per user, reused until another of the user's trades closes."""
+
+    def __init__(self, max_size: int = 1000, ttl_seconds: float = 600.0):
+        self._columns = UserCache(max_size, ttl_seconds)
+
+    async def get(self, trades, user_id: str) -> TradeColumns:
+        # Counted before loading, so a close that lands during the load is picked up next time
+        closed_count = await trades.closed_count(user_id)
+        columns = self._columns.get(user_id)
+        if columns is None or columns.closed_count != closed_count:
+            columns = await load_trade_columns(trades, user_id, closed_count)
+            self._columns.set(user_id, columns)
+        return columns
+
+    def invalidate(self, user_id: str) -> None:
+        self._columns.invalidate(user_id)
+
+    def stats(self) -> Dict[str, Any]:
+        return self._columns.stats()
+
+
+def _bucket_numbers(days: np.ndarray, months: np.ndarray, interval: str) -> np.ndarray:
+    """Consecutive integer bucket numbers, so a bucket index is a subtraction."""
+    if interval == "day":
+        return days
+    if interval == "week":
+        # 1970-01-01 was a Thursday; weeks start on Monday
+        return (days + 3) // 7
+    return months
+
+
+def _bucket_labels(first: int, last: int, interval: str) -> List[str]:
+    numbers = np.arange(first, last + 1)
+    if interval == "day":
+        starts = numbers.astype("datetime64[D]")
+    elif interval == "week":
+        starts = (numbers * 7 - 3).astype("datetime64[D]")
+    else:
+        starts = numbers.astype("datetime64[M]").astype("datetime64[D]")
+    return [str(start) for start in starts.tolist()]
+
+
+def _bucket_number(value: datetime, interval: str) -> int:
+    timestamp = _datetime64(value)
+    days = np.array([timestamp.astype("datetime64[D]").astype(np.int64)])
+    months = np.array([timestamp.astype("datetime64[M]").astype(np.int64)])
+    return int(_bucket_numbers(days, months, interval)[0])
+
+
+def pnl_report(columns: TradeColumns, interval: str = "day", start: Optional[datetime] = None,
+               end: Optional[datetime] = None) -> Dict[str, Any]:
+    window = columns.window(start, end)
+    closed_at = columns.closed_at[window]
+    pnl = columns.pnl[window]
+    amount = columns.amount[window]
+    codes = columns.symbol_codes[window]
+    # Equity carries forward everything realized before the window
+    opening_equity = float(columns.pnl[:window.start].sum())
+
+    first = _bucket_number(start, interval) if start else None
+    # The end is exclusive, so a period starting exactly at it is not in range
+    last = _bucket_number(end - timedelta(microseconds=1), interval) if end else None
+    if len(closed_at):
+        bucket_of_trade = _bucket_numbers(columns.days[window], columns.months[window], interval)
+        first = int(bucket_of_trade[0]) if first is None else first
+        last = int(bucket_of_trade[-1]) if last is None else last
+
+    periods: List[Dict[str, Any]] = []
+    if first is not None and last is not None and first <= last:
+        size = last - first + 1
+        if size > MAX_BUCKETS:
+            raise TooManyBuckets(f"Range spans {size} {interval}s; the limit is {MAX_BUCKETS}")
+        index = bucket_of_trade - first if len(closed_at) else np.zeros(0, dtype=np.int64)
+        period_pnl = np.bincount(index, weights=pnl, minlength=size)
+        period_volume = np.bincount(index, weights=amount, minlength=size)
+        period_trades = np.bincount(index, minlength=size)
+        period_wins = np.bincount(index, weights=pnl > 0, minlength=size)
+        equity = opening_equity + np.cumsum(period_pnl)
+        periods = [
+            {"period": period, "pnl": p, "trades": t, "winning_trades": int(w), "volume": v, "equity": e}
+            for period, p, t, w, v, e in zip(
+                _bucket_labels(first, last, interval), period_pnl.tolist(), period_trades.tolist(), period_wins.tolist(),
+                period_volume.tolist(), equity.tolist(),
+            )
+        ]
+
+    symbol_pnl = np.bincount(codes, weights=pnl, minlength=len(columns.symbols))
+    symbol_volume = np.bincount(codes, weights=amount, minlength=len(columns.symbols))
+    symbol_trades = np.bincount(codes, minlength=len(columns.symbols))
+    symbol_wins = np.bincount(codes, weights=pnl > 0, minlength=len(columns.symbols))
+    by_symbol = [
+        {"symbol": symbol, "pnl": p, "trades": t, "win_rate": w / t, "volume": v}
+        for symbol, p, t, w, v in zip(
+            columns.symbols.tolist(), symbol_pnl.tolist(), symbol_trades.tolist(),
+            symbol_wins.tolist(), symbol_volume.tolist(),
+        )
+        if t
+    ]
+    by_symbol.sort(key=lambda row: row["pnl"], reverse=True)
+
+    # Drawdown is measured trade by trade, not on period totals
+    trade_equity = opening_equity + np.cumsum(pnl)
+    drawdown = np.maximum.accumulate(np.concatenate(([opening_equity], trade_equity)))[1:] - trade_equity
+    trades = len(pnl)
+    return {
+        "interval": interval,
+        "summary": {
+            "trades": trades,
+            "total_pnl": float(pnl.sum()),
+            "volume": float(amount.sum()),
+            "win_rate": float((pnl > 0).sum() / trades) if trades else 0.0,
+            "opening_equity": opening_equity,
+            "closing_equity": float(trade_equity[-1]) if trades else opening_equity,
+            "max_drawdown": float(drawdown.max()) if trades else 0.0,
+        },
+        "periods": periods,
+        "by_symbol": by_symbol,
+    }
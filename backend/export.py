@@ -0,0 +1,139 @@
+"""Streaming trade-history exports.
+
+A user's trades are read from the trade repository, oldest first, in
+batches of ``EXPORT_BATCH_SIZE``, and each batch is encoded and sent as
+soon as it arrives. The first bytes go out after one batch, and memory is
+bounded by the batch size rather than by the length of the history.
+
+In Parquet, each batch is written as one row group and flushed to the
+response straight away.
+"""
+import csv
+import io
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
+
+import orjson
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from serialization import ORJSON_OPTIONS
+
+EXPORT_BATCH_SIZE = 5000
+
+EXPORT_COLUMNS = (
+    "id", "symbol", "side", "amount", "price", "stop_loss", "take_profit", "status",
+    "created_at", "closed_at", "close_price", "close_reason", "pnl",
+)
+EXPORT_PROJECTION = {"_id": 0, **{column: 1 for column in EXPORT_COLUMNS}}
+
+# Naive datetimes are UTC; write them with an explicit offset
+NDJSON_OPTIONS = ORJSON_OPTIONS | orjson.OPT_NAIVE_UTC | orjson.OPT_APPEND_NEWLINE
+
+Batches = AsyncIterator[List[dict]]
+
+
+# Positions of the datetime columns; every other cell goes to the csv writer
+# as is, which writes None as an empty field
+_CSV_DATETIME_COLUMNS = tuple(EXPORT_COLUMNS.index(column) for column in ("created_at", "closed_at"))
+
+
+def _isoformat(value: Optional[datetime]) -> Optional[str]:
+    if value is None:
+        return None
+    # Mongo hands back naive UTC datetimes
+    return value.isoformat() + "+00:00" if value.tzinfo is None else value.isoformat()
+
+
+def _csv_row(trade: dict) -> List[Any]:
+    row = [trade.get(column) for column in EXPORT_COLUMNS]
+    for index in _CSV_DATETIME_COLUMNS:
+        row[index] = _isoformat(row[index])
+    return row
+
+
+async def encode_csv(batches: Batches) -> AsyncIterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    writer.writerow(EXPORT_COLUMNS)
+    yield buffer.getvalue().encode()
+    async for batch in batches:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(_csv_row(trade) for trade in batch)
+        yield buffer.getvalue().encode()
+
+
+async def encode_ndjson(batches: Batches) -> AsyncIterator[bytes]:
+    async for batch in batches:
+        yield b"".join(
+            orjson.dumps({column: trade.get(column) for column in EXPORT_COLUMNS}, option=NDJSON_OPTIONS)
+            for trade in batch
+        )
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file that hands what was written so far back to the response."""
+
+    def __init__(self):
+        super().__init__()
+        self._chunks: List[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        # Parquet records absolute offsets in the footer
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def parquet_schema() -> pa.Schema:
+    timestamp = pa.timestamp("ms", tz="UTC")
+    return pa.schema([
+        ("id", pa.string()), ("symbol", pa.string()), ("side", pa.string()),
+        ("amount", pa.float64()), ("price", pa.float64()),
+        ("stop_loss", pa.float64()), ("take_profit", pa.float64()), ("status", pa.string()),
+        ("created_at", timestamp), ("closed_at", timestamp),
+        ("close_price", pa.float64()), ("close_reason", pa.string()), ("pnl", pa.float64()),
+    ])
+
+
+async def encode_parquet(batches: Batches) -> AsyncIterator[bytes]:
+    schema = parquet_schema()
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema)
+    try:
+        async for batch in batches:
+            writer.write_table(pa.Table.from_pylist(
+                [{column: trade.get(column) for column in EXPORT_COLUMNS} for trade in batch], schema=schema
+            ))
+            yield sink.drain()
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+@dataclass(frozen=True)
+class ExportFormat:
+    media_type: str
+    extension: str
+    encode: Callable[[Batches], AsyncIterator[bytes]]
+
+
+EXPORT_FORMATS: Dict[str, ExportFormat] = {
+    "csv": ExportFormat("text/csv; charset=utf-8", "csv", encode_csv),
+    "ndjson": ExportFormat("application/x-ndjson", "ndjson", encode_ndjson),
+    "parquet": ExportFormat("application/vnd.apache.parquet", "parquet", encode_parquet),
+}
@@ -0,0 +1,190 @@
+"""Idempotency keys for retried write requests.
+
+A client sends the same ``Idempotency-Key`` header with every retry of one
+request. The first request carrying a key runs. Its status code and encoded
+body are then stored in the ``idempotency_keys`` collection, which a TTL
+index on ``expires_at`` empties after ``ttl_seconds``, and in an in-process
+LRU in front of it. A retry gets the stored response back without running
+the handler again.
+
+Before running, the first request inserts a ``pending`` record; the unique
+index on ``key`` makes that the claim. Duplicates that arrive while it runs
+wait for its response: in the same worker on an ``asyncio.Future``, across
+workers by polling the record, and get ``IdempotencyInProgress`` after
+``pending_timeout``. A pending record is never taken over, since its
+request may still be running; the TTL index drops it ``pending_ttl``
+seconds after the claim, so a key whose worker died runs again after that.
+
+If the handler fails with an unexpected error, or answers with a status in
+``RETRYABLE_STATUS_CODES`` (a conflict or throttle that a retry can get
+past), the claim is released so the retry runs it again. Handlers must
+therefore only do either before their main write commits. Anything they do
+after it has to log its failures instead of raising.
+
+Keys are scoped by the caller (user and route), and a key reused with a
+different request body is rejected.
+"""
+import asyncio
+import hashlib
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from pymongo.errors import DuplicateKeyError
+
+from serialization import dumps
+from user_cache import UserCache
+
+IDEMPOTENCY_TTL_SECONDS = 24 * 3600.0
+PENDING_TIMEOUT_SECONDS = 60.0
+PENDING_TTL_SECONDS = 3600.0
+MAX_KEY_LENGTH = 255
+# Responses that mean "try again", which must not be replayed to the retry
+RETRYABLE_STATUS_CODES = frozenset({408, 409, 425, 429})
+
+
+class IdempotencyMismatch(Exception):
+    """The key was already used for a request with a different body."""
+
+
+class IdempotencyInProgress(Exception):
+    """The first request with this key is still running after ``pending_timeout``."""
+
+
+@dataclass(frozen=True)
+class StoredResponse:
+    status_code: int
+    body: bytes
+
+
+def fingerprint(payload: Any) -> str:
+    return hashlib.sha256(dumps(payload)).hexdigest()
+
+
+class IdempotencyStore:
+    def __init__(self, get_db: Callable[[], Any], ttl_seconds: float = IDEMPOTENCY_TTL_SECONDS,
+                 pending_timeout: float = PENDING_TIMEOUT_SECONDS, pending_ttl: float = PENDING_TTL_SECONDS,
+                 cache_size: int = 10000, poll_interval: float = 0.05):
+        self._get_db = get_db
+        self.ttl_seconds = ttl_seconds
+        self.pending_timeout = pending_timeout
+        self.pending_ttl = pending_ttl
+        self.poll_interval = poll_interval
+        # key -> (fingerprint, StoredResponse)
+        self._cache = UserCache(cache_size, ttl_seconds)
+        # key -> Future resolved with (fingerprint, StoredResponse), or None if the request failed
+        self._in_flight: Dict[str, asyncio.Future] = {}
+        self.replays = 0
+        self.store_failures = 0
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._in_flight)
+
+    async def run(self, scope: str, key: str, request_fingerprint: str,
+                  handler: Callable[[], Awaitable[StoredResponse]]) -> Tuple[StoredResponse, bool]:
+        """Run ``handler`` once per ``(scope, key)``; returns the response and whether it was replayed.
+
+        Raises ``IdempotencyMismatch`` if the key was used with another
+        fingerprint, and ``IdempotencyInProgress`` if the request holding
+        the key does not finish within ``pending_timeout``.
+        """
+        full_key = f"{scope}:{key}"
+        while True:
+            cached = self._cache.get(full_key)
+            if cached is not None:
+                return self._replay(cached, request_fingerprint)
+            running = self._in_flight.get(full_key)
+            if running is None:
+                break
+            # The first request failing resolves to None, and the loop runs it again
+            outcome = await asyncio.shield(running)
+            if outcome is not None:
+                return self._replay(outcome, request_fingerprint)
+
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[full_key] = future
+        outcome = None
+        try:
+            stored = await self._claim(full_key, request_fingerprint)
+            if stored is not None:
+                outcome = stored
+                self._cache.set(full_key, stored)
+                return self._replay(stored, request_fingerprint)
+            try:
+                response = await handler()
+            except BaseException:
+                await self._release(full_key, request_fingerprint)
+                raise
+            if response.status_code in RETRYABLE_STATUS_CODES:
+                # Waiters see no outcome and run the handler again
+                await self._release(full_key, request_fingerprint)
+                return response, False
+            outcome = (request_fingerprint, response)
+            self._cache.set(full_key, outcome)
+            await self._complete(full_key, request_fingerprint, response)
+            return response, False
+        finally:
+            del self._in_flight[full_key]
+            future.set_result(outcome)
+
+    def _replay(self, outcome: Tuple[str, StoredResponse], request_fingerprint: str) -> Tuple[StoredResponse, bool]:
+        stored_fingerprint, response = outcome
+        if stored_fingerprint != request_fingerprint:
+            raise IdempotencyMismatch()
+        self.replays += 1
+        return response, True
+
+    async def _claim(self, full_key: str, request_fingerprint: str) -> Optional[Tuple[str, StoredResponse]]:
+        """Claim the key for this request; returns the stored outcome if another request already completed it."""
+        collection = self._get_db().idempotency_keys
+        deadline = time.monotonic() + self.pending_timeout
+        while True:
+            try:
+                await collection.insert_one({
+                    "key": full_key, "status": "pending", "fingerprint": request_fingerprint,
+                    "expires_at": datetime.now(timezone.utc) + timedelta(seconds=self.pending_ttl),
+                })
+                return None
+            except DuplicateKeyError:
+                pass
+            record = await collection.find_one({"key": full_key}, {"_id": 0})
+            if record is None:
+                continue  # released, or expired, in the meantime
+            if record["status"] == "completed":
+                return record["fingerprint"], StoredResponse(record["status_code"], bytes(record["body"]))
+            # Still pending, even past pending_ttl until the TTL index drops it:
+            # running the handler while the first request may not be done
+            # would apply its writes twice
+            if time.monotonic() >= deadline:
+                raise IdempotencyInProgress()
+            await asyncio.sleep(self.poll_interval)
+
+    async def _release(self, full_key: str, request_fingerprint: str) -> None:
+        await self._get_db().idempotency_keys.delete_one(
+            {"key": full_key, "status": "pending", "fingerprint": request_fingerprint}
+        )
+
+    async def _complete(self, full_key: str, request_fingerprint: str, response: StoredResponse) -> None:
+        try:
+            await self._get_db().idempotency_keys.update_one(
+                {"key": full_key},
+                {"$set": {
+                    "status": "completed", "fingerprint": request_fingerprint,
+                    "status_code": response.status_code, "body": response.body,
+                    "expires_at": datetime.now(timezone.utc) + timedelta(seconds=self.ttl_seconds),
+                }},
+            )
+        except Exception:
+            # The work is done and the response is cached in this worker.
+            # Elsewhere, the pending record expires and a retry runs again.
+            self.store_failures += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self._cache.stats(),
+            "in_flight": self.in_flight,
+            "replays": self.replays,
+            "store_failures": self.store_failures,
+        }
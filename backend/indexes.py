@@ -0,0 +1,155 @@
+"""MongoDB index provisioning and query-plan verification.
+
+Run ``python indexes.py`` from the backend directory to create the indexes,
+or ``python indexes.py --verify`` to additionally explain every hot query and
+exit non-zero if any of them still falls back to a collection scan.
+"""
+import argparse
+import asyncio
+import os
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Tuple
+
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ASCENDING, DESCENDING, IndexModel
+
+# collection -> indexes required by the queries in server.py
+INDEXES: Dict[str, List[IndexModel]] = {
+    "users": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("email", ASCENDING)], name="email_unique", unique=True),
+    ],
+    "stakes": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("user_id", ASCENDING), ("is_active", ASCENDING)], name="user_id_is_active"),
+        IndexModel([("user_id", ASCENDING), ("start_date", DESCENDING), ("id", DESCENDING)],
+                   name="user_id_start_date_id"),
+        IndexModel([("is_active", ASCENDING), ("end_date", ASCENDING)], name="is_active_end_date"),
+        # Matured stakes whose payout has not landed, for the maturity recovery pass
+        IndexModel([("maturity_claimed_at", ASCENDING)], name="maturity_credit_pending",
+                   partialFilterExpression={"maturity_credited": False}),
+    ],
+    "trades": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("user_id", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)],
+                   name="user_id_created_at_id"),
+        IndexModel([("user_id", ASCENDING), ("symbol", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)],
+                   name="user_id_symbol_created_at_id"),
+        IndexModel([("user_id", ASCENDING), ("status", ASCENDING)], name="user_id_status"),
+        # Only open positions are indexed, for matching-engine recovery
+        IndexModel([("status", ASCENDING)], name="status_open", partialFilterExpression={"status": "open"}),
+        # Positions opened recently, picked up by the trading leader
+        IndexModel([("created_at", ASCENDING)], name="created_at_open", partialFilterExpression={"status": "open"}),
+    ],
+    "ledger": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("user_id", ASCENDING), ("at", ASCENDING)], name="user_id_at"),
+        IndexModel([("at", ASCENDING)], name="at"),
+    ],
+    "ledger_snapshots": [
+        IndexModel([("user_id", ASCENDING)], name="user_id_unique", unique=True),
+        IndexModel([("through", ASCENDING)], name="through"),
+    ],
+    "portfolio_summary": [
+        IndexModel([("user_id", ASCENDING)], name="user_id_unique", unique=True),
+    ],
+    "rate_limits": [
+        # A bucket is full again, and can go, one period after it was last touched
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0),
+    ],
+    "idempotency_keys": [
+        IndexModel([("key", ASCENDING)], name="key_unique", unique=True),
+        # Records are removed once expires_at passes
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0),
+    ],
+}
+
+SAMPLE_USER_ID = "00000000-0000-0000-0000-000000000000"
+
+# name -> callable building the cursor for each hot query, mirroring server.py
+HOT_QUERIES: Dict[str, Callable[[Any], Any]] = {
+    "users.by_email": lambda db: db.users.find({"email": "probe@example.com"}).limit(1),
+    "users.by_id": lambda db: db.users.find({"id": SAMPLE_USER_ID}).limit(1),
+    "portfolio_summary.by_user": lambda db: db.portfolio_summary.find({"user_id": SAMPLE_USER_ID}).limit(1),
+    "stakes.active_by_user": lambda db: db.stakes.find({"user_id": SAMPLE_USER_ID, "is_active": True}),
+    "stakes.page_by_user": lambda db: db.stakes.find({"user_id": SAMPLE_USER_ID}).sort(
+        [("start_date", -1), ("id", -1)]).limit(51),
+    "stakes.due": lambda db: db.stakes.find({"is_active": True, "end_date": {"$lte": datetime(2025, 1, 1)}}).sort(
+        "end_date", 1).limit(1000),
+    "stakes.credit_pending": lambda db: db.stakes.find(
+        {"maturity_credited": False, "maturity_claimed_at": {"$lt": datetime(2025, 1, 1)}}).limit(1000),
+    "trades.recent_by_user": lambda db: db.trades.find({"user_id": SAMPLE_USER_ID}).sort(
+        [("created_at", -1), ("id", -1)]).limit(10),
+    "trades.page_by_user": lambda db: db.trades.find({"user_id": SAMPLE_USER_ID}).sort(
+        [("created_at", -1), ("id", -1)]).limit(51),
+    "trades.page_by_user_symbol": lambda db: db.trades.find({"user_id": SAMPLE_USER_ID, "symbol": "BTC/USDT"}).sort(
+        [("created_at", -1), ("id", -1)]).limit(51),
+    "trades.closed_by_user": lambda db: db.trades.find({"user_id": SAMPLE_USER_ID, "status": "closed"}),
+    "trades.open_positions": lambda db: db.trades.find({"status": "open"}),
+    "trades.open_since": lambda db: db.trades.find({"status": "open", "created_at": {"$gte": datetime(2025, 1, 1)}}),
+    "ledger.tail_by_user": lambda db: db.ledger.find({"user_id": SAMPLE_USER_ID, "at": {"$gte": datetime(2025, 1, 1)}}),
+    "ledger.replay_window": lambda db: db.ledger.find({"at": {"$gte": datetime(2025, 1, 1), "$lt": datetime(2025, 1, 2)}}),
+    "ledger_snapshots.by_user": lambda db: db.ledger_snapshots.find({"user_id": SAMPLE_USER_ID}).limit(1),
+    "idempotency_keys.by_key": lambda db: db.idempotency_keys.find({"key": f"{SAMPLE_USER_ID}:stake:probe"}).limit(1),
+}
+
+
+async def ensure_indexes(db) -> Dict[str, List[str]]:
+    """Create every declared index; safe to call on each startup."""
+    created = {}
+    for collection, models in INDEXES.items():
+        created[collection] = await db[collection].create_indexes(models)
+    return created
+
+
+def plan_stages(plan: Any) -> Iterable[str]:
+    """Yield every ``stage`` name found anywhere in an explain() plan tree."""
+    if isinstance(plan, dict):
+        stage = plan.get("stage")
+        if isinstance(stage, str):
+            yield stage
+        for value in plan.values():
+            yield from plan_stages(value)
+    elif isinstance(plan, list):
+        for item in plan:
+            yield from plan_stages(item)
+
+
+async def verify_query_plans(db) -> List[Tuple[str, List[str]]]:
+    """Explain each hot query and return (name, stages) for any COLLSCAN."""
+    failures = []
+    for name, build_cursor in HOT_QUERIES.items():
+        explanation = await build_cursor(db).explain()
+        stages = list(plan_stages(explanation.get("queryPlanner", {}).get("winningPlan", {})))
+        if "COLLSCAN" in stages:
+            failures.append((name, stages))
+    return failures
+
+
+async def main(verify: bool) -> int:
+    load_dotenv(Path(__file__).parent / ".env")
+    client = AsyncIOMotorClient(os.environ["MONGO_URL"])
+    try:
+        db = client[os.environ["DB_NAME"]]
+        for collection, names in (await ensure_indexes(db)).items():
+            print(f"{collection}: {', '.join(names)}")
+        if not verify:
+            return 0
+        failures = await verify_query_plans(db)
+        for name, stages in failures:
+            print(f"COLLSCAN in {name}: {' -> '.join(stages)}")
+        if failures:
+            return 1
+        print(f"All {len(HOT_QUERIES)} hot queries use an index")
+        return 0
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Provision and verify MongoDB indexes")
+    parser.add_argument("--verify", action="store_true", help="fail if any hot query does a COLLSCAN")
+    args = parser.parse_args()
+    raise SystemExit(asyncio.run(main(args.verify)))
@@ -0,0 +1,62 @@
+"""Leader lease for work that must run in exactly one worker.
+
+Every API worker shares the database, but the price feed and the matching
+engine only make sense once: two engines would close the same position at
+two different prices. Workers compete for a lease document in ``leases``.
+The holder renews it every ``renew_interval`` seconds; a lease that is not
+renewed within ``ttl`` seconds, because its worker died or stalled, is
+taken over by the next worker that asks.
+
+A worker that fails to renew steps down straight away, so two workers only
+both believe they lead if one of them stalls for longer than ``ttl``
+between renewals. Work done under the lease must still be safe if that
+happens; settlement only lands a close once.
+"""
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Optional
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+LEASE_TTL_SECONDS = 15.0
+
+
+class LeaderLease:
+    def __init__(self, get_collection: Callable[[], Any], name: str, ttl: float = LEASE_TTL_SECONDS,
+                 holder: Optional[str] = None):
+        self._get_collection = get_collection
+        self.name = name
+        self.ttl = ttl
+        self.holder = holder or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.is_leader = False
+
+    @property
+    def renew_interval(self) -> float:
+        return self.ttl / 3
+
+    async def acquire(self) -> bool:
+        """Take or renew the lease; returns whether this worker holds it now."""
+        now = datetime.now(timezone.utc)
+        try:
+            lease = await self._get_collection().find_one_and_update(
+                {"_id": self.name, "$or": [{"holder": self.holder}, {"expires_at": {"$lte": now}}]},
+                {"$set": {"holder": self.holder, "expires_at": now + timedelta(seconds=self.ttl)}},
+                upsert=True, return_document=ReturnDocument.AFTER,
+            )
+        except DuplicateKeyError:
+            # Someone else holds a live lease, so the upsert collided with it
+            lease = None
+        except Exception:
+            self.is_leader = False
+            raise
+        self.is_leader = lease is not None and lease["holder"] == self.holder
+        return self.is_leader
+
+    async def release(self) -> None:
+        """Give the lease up so another worker can take over without waiting for it to expire."""
+        was_leader, self.is_leader = self.is_leader, False
+        if was_leader:
+            await self._get_collection().delete_one({"_id": self.name, "holder": self.holder})
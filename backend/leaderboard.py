@@ -0,0 +1,216 @@
+"""Trader leaderboard and trading level tiers.
+
+Rankings are served from an in-memory index: one ``SortedList`` per metric,
+updated incrementally as this process fills trades. Both a top-N slice and
+a single user's rank are O(log n) on the index. Each worker only sees its
+own fills, so the index is periodically reconciled against
+``portfolio_summary``, which every worker keeps current. Rankings are
+eventually consistent across workers, within one reconcile interval.
+"""
+import asyncio
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from sortedcontainers import SortedList
+
+METRICS = ("pnl", "win_rate", "volume")
+
+RECONCILE_CHUNK_SIZE = 5000
+
+# Win rate only ranks traders with enough trades for it to mean something
+MIN_TRADES_FOR_WIN_RATE = 10
+
+# (level, minimum trades, minimum win rate), lowest first
+TRADING_LEVELS = (
+    ("Bronze", 0, 0.0),
+    ("Silver", 25, 0.5),
+    ("Gold", 100, 0.55),
+    ("Prime", 500, 0.6),
+)
+_LEVEL_ORDER = {level: order for order, (level, _, _) in enumerate(TRADING_LEVELS)}
+
+# total_trades, successful_trades, total_pnl, trade_volume
+Stats = Tuple[int, int, float, float]
+EMPTY_STATS: Stats = (0, 0, 0.0, 0.0)
+
+STATS_PROJECTION = {"_id": 0, "user_id": 1, "total_trades": 1, "successful_trades": 1,
+                    "total_pnl": 1, "trade_volume": 1}
+
+
+def win_rate(stats: Stats) -> float:
+    return stats[1] / stats[0] if stats[0] else 0.0
+
+
+def trading_level(total_trades: int, successful_trades: int) -> str:
+    rate = successful_trades / total_trades if total_trades else 0.0
+    level = TRADING_LEVELS[0][0]
+    for name, min_trades, min_win_rate in TRADING_LEVELS:
+        if total_trades >= min_trades and rate >= min_win_rate:
+            level = name
+    return level
+
+
+def is_promotion(current: str, candidate: str) -> bool:
+    return _LEVEL_ORDER.get(candidate, 0) > _LEVEL_ORDER.get(current, 0)
+
+
+def display_name(user: dict) -> str:
+    """Public name for a ranked trader: first name and last initial."""
+    first_name = user.get("first_name") or "Trader"
+    initial = (user.get("last_name") or "")[:1]
+    return f"{first_name} {initial}." if initial else first_name
+
+
+def _sort_key(metric: str, user_id: str, stats: Stats) -> Optional[tuple]:
+    """Ascending sort key for ``metric`` (best first), or None if unranked."""
+    if metric == "pnl":
+        return (-stats[2], user_id)
+    if metric == "volume":
+        return (-stats[3], user_id)
+    if stats[0] < MIN_TRADES_FOR_WIN_RATE:
+        return None
+    # Ties on win rate go to the trader with the longer record
+    return (-win_rate(stats), -stats[0], user_id)
+
+
+def metric_value(metric: str, stats: Stats) -> float:
+    if metric == "pnl":
+        return stats[2]
+    if metric == "volume":
+        return stats[3]
+    return win_rate(stats)
+
+
+def build_indexes(stats: Dict[str, Stats]) -> Dict[str, SortedList]:
+    """Build every metric's index from a full snapshot of user stats.
+
+    The keys are ordered with ``np.lexsort``, which is several times faster than
+    sorting a million key tuples in Python. The ``SortedList`` then only has to
+    confirm the order it is given.
+    """
+    user_ids = list(stats)
+    columns = np.array(list(stats.values()), dtype=np.float64).reshape(-1, 4)
+    trades, successful = columns[:, 0].astype(np.int64), columns[:, 1]
+    rates = np.divide(successful, trades, out=np.zeros(len(trades)), where=trades > 0)
+    ids = np.array(user_ids, dtype=str)
+
+    indexes = {}
+    for metric in METRICS:
+        if metric == "win_rate":
+            ranked = np.flatnonzero(trades >= MIN_TRADES_FOR_WIN_RATE)
+            order = ranked[np.lexsort((ids[ranked], -trades[ranked], -rates[ranked]))]
+            columns_in_order = ((-rates)[order].tolist(), (-trades)[order].tolist())
+        else:
+            values = -columns[:, 2 if metric == "pnl" else 3]
+            order = np.lexsort((ids, values))
+            columns_in_order = (values[order].tolist(),)
+        # Same float and int values as _sort_key computes, so record() can
+        # find and remove these keys later
+        indexes[metric] = SortedList(zip(*columns_in_order, [user_ids[i] for i in order.tolist()]))
+    return indexes
+
+
+class Leaderboard:
+    def __init__(self):
+        self._stats: Dict[str, Stats] = {}
+        self._indexes: Dict[str, SortedList] = {metric: SortedList() for metric in METRICS}
+
+    def __len__(self) -> int:
+        return len(self._stats)
+
+    def stats(self, user_id: str) -> Stats:
+        return self._stats.get(user_id, EMPTY_STATS)
+
+    def get(self, user_id: str) -> Optional[Stats]:
+        return self._stats.get(user_id)
+
+    def user_ids(self):
+        return self._stats.keys()
+
+    def record(self, user_id: str, fills: Iterable[Tuple[float, float]]) -> Stats:
+        """Add (amount, pnl) fills to a user's stats and move them in every index."""
+        trades, successful, pnl, volume = self.stats(user_id)
+        for amount, fill_pnl in fills:
+            trades += 1
+            successful += 1 if fill_pnl > 0 else 0
+            pnl += fill_pnl
+            volume += amount
+        new = (trades, successful, pnl, volume)
+        self.set_stats(user_id, new)
+        return new
+
+    def record_closes(self, user_id: str, pnls: Iterable[float]) -> Stats:
+        """Add the realized PnL of closed positions, already counted as trades when opened."""
+        trades, successful, pnl, volume = self.stats(user_id)
+        for close_pnl in pnls:
+            successful += 1 if close_pnl > 0 else 0
+            pnl += close_pnl
+        new = (trades, successful, pnl, volume)
+        self.set_stats(user_id, new)
+        return new
+
+    def set_stats(self, user_id: str, stats: Optional[Stats]) -> None:
+        """Move a user to the positions for ``stats``; None drops them from the rankings."""
+        old = self._stats.pop(user_id, None)
+        if stats is not None:
+            self._stats[user_id] = stats
+        for metric, index in self._indexes.items():
+            old_key = None if old is None else _sort_key(metric, user_id, old)
+            new_key = None if stats is None else _sort_key(metric, user_id, stats)
+            if old_key == new_key:
+                continue
+            if old_key is not None:
+                index.remove(old_key)
+            if new_key is not None:
+                index.add(new_key)
+
+    def replace(self, stats: Dict[str, Stats], indexes: Optional[Dict[str, SortedList]] = None) -> None:
+        """Swap in rankings rebuilt from a full snapshot of every user's stats."""
+        self._stats, self._indexes = stats, build_indexes(stats) if indexes is None else indexes
+
+    def ranked(self, metric: str) -> int:
+        return len(self._indexes[metric])
+
+    def top(self, metric: str, limit: int) -> List[Tuple[int, str, Stats]]:
+        return [
+            (rank, key[-1], self._stats[key[-1]])
+            for rank, key in enumerate(self._indexes[metric].islice(0, limit), start=1)
+        ]
+
+    def rank(self, metric: str, user_id: str) -> Optional[int]:
+        stats = self._stats.get(user_id)
+        key = None if stats is None else _sort_key(metric, user_id, stats)
+        if key is None:
+            return None
+        return self._indexes[metric].bisect_left(key) + 1
+
+
+async def reconcile(db, leaderboard: Leaderboard) -> Dict[str, int]:
+    """Bring ``leaderboard`` in line with ``portfolio_summary``.
+
+    The first run builds the indexes in a worker thread. Later runs only
+    move the users whose stats differ, in chunks that yield to the event
+    loop, so requests are never stalled behind a full rebuild.
+    """
+    stats: Dict[str, Stats] = {}
+    async for doc in db.portfolio_summary.find({"total_trades": {"$gt": 0}}, STATS_PROJECTION, batch_size=10000):
+        stats[doc["user_id"]] = (
+            doc.get("total_trades", 0), doc.get("successful_trades", 0),
+            doc.get("total_pnl", 0.0), doc.get("trade_volume", 0.0),
+        )
+
+    if not len(leaderboard):
+        indexes = await asyncio.to_thread(build_indexes, stats)
+        leaderboard.replace(stats, indexes)
+        return {"users": len(stats), "changed": len(stats)}
+
+    changed = 0
+    user_ids = list(stats.keys() | leaderboard.user_ids())
+    for start in range(0, len(user_ids), RECONCILE_CHUNK_SIZE):
+        for user_id in user_ids[start:start + RECONCILE_CHUNK_SIZE]:
+            fresh = stats.get(user_id)
+            if leaderboard.get(user_id) != fresh:
+                leaderboard.set_stats(user_id, fresh)
+                changed += 1
+        await asyncio.sleep(0)
+    return {"users": len(stats), "changed": changed}
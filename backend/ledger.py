@@ -0,0 +1,392 @@
+"""Append-only balance ledger.
+
+Every movement of a user's TFT balance is an immutable document in
+``ledger``: the welcome bonus, stake locks and releases, the margin an open
+position holds and its release, and realized trade PnL. An entry's ``id``
+is derived from what caused it (``stake_lock:<stake id>``) and is unique,
+so writing the same entry twice is a no-op and a failed batch can always be
+retried.
+
+Request handlers append through ``LedgerWriter``, which coalesces the
+entries of concurrent requests into one ``insert_many``. Each caller still
+waits until its entry is acknowledged, so batching never loses a write.
+
+``ledger_snapshots`` holds each user's balance through a cutoff time. A
+balance read is the snapshot plus the sum of the user's entries at or after
+the cutoff. ``take_snapshots`` advances the snapshots by replaying only the
+entries since the previous cutoff, summed per user with NumPy; ``--full``
+replays the whole ledger. The cutoff trails the clock by ``SNAPSHOT_LAG``
+so an entry stamped just before it, but still in flight, is not missed.
+
+``users.tft_balance`` stays the materialized balance that guarded writes
+check against. ``find_drift`` compares it with the ledger. Run ``python
+ledger.py`` from the backend directory to advance the snapshots and report
+drift; ``--repair`` resets drifted balances to the ledger's.
+"""
+import argparse
+import asyncio
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+ENTRY_TYPES = (
+    "welcome_bonus", "stake_lock", "stake_release", "trade_margin", "margin_release", "trade_pnl", "opening_balance",
+)
+
+REPLAY_BATCH_SIZE = 50000
+SNAPSHOT_WRITE_BATCH_SIZE = 10000
+SNAPSHOT_LAG = timedelta(seconds=60)
+# Balances are rounded to 8 decimals; anything below this is float noise
+DRIFT_TOLERANCE = 1e-6
+
+REPLAY_PROJECTION = {"_id": 0, "user_id": 1, "amount": 1}
+SNAPSHOT_PROJECTION = {"_id": 0, "user_id": 1, "balance": 1, "through": 1}
+
+_DUPLICATE_KEY = 11000
+_EPOCH = np.datetime64(0, "ms")
+
+
+def ledger_entry(entry_type: str, user_id: str, amount: float, ref: str,
+                 at: Optional[datetime] = None) -> dict:
+    if entry_type not in ENTRY_TYPES:
+        raise ValueError(f"Unknown ledger entry type {entry_type!r}")
+    return {
+        "id": f"{entry_type}:{ref}",
+        "user_id": user_id,
+        "type": entry_type,
+        "amount": round(float(amount), 8),
+        "ref": ref,
+        "at": at or datetime.now(timezone.utc),
+    }
+
+
+async def insert_entries(db, entries: List[dict]) -> List[dict]:
+    """Insert entries, skipping any already written; returns the ones this call wrote."""
+    if not entries:
+        return []
+    try:
+        await db.ledger.insert_many(entries, ordered=False)
+    except BulkWriteError as e:
+        if any(error["code"] != _DUPLICATE_KEY for error in e.details["writeErrors"]):
+            raise
+        duplicates = {error["index"] for error in e.details["writeErrors"]}
+        return [entry for index, entry in enumerate(entries) if index not in duplicates]
+    return entries
+
+
+async def append_entries(db, entries: List[dict]) -> int:
+    """Insert entries, skipping any already written; returns how many are new."""
+    return len(await insert_entries(db, entries))
+
+
+class LedgerWriter:
+    """Group commit for ledger entries written from request handlers.
+
+    Entries appended within ``max_delay`` seconds of each other, up to
+    ``max_batch`` of them, go to Mongo in one write. A failed write fails
+    every caller in its batch.
+    """
+
+    def __init__(self, get_db: Callable[[], Any], max_batch: int = 500, max_delay: float = 0.002):
+        self._get_db = get_db
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self._pending: List[Tuple[List[dict], asyncio.Future]] = []
+        self._pending_entries = 0
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._writes: set = set()
+
+    async def append(self, *entries: dict) -> None:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((list(entries), future))
+        self._pending_entries += len(entries)
+        if self._pending_entries >= self.max_batch:
+            self._flush_now()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_delay, self._flush_now)
+        await future
+
+    def _flush_now(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return
+        batch, self._pending, self._pending_entries = self._pending, [], 0
+        task = asyncio.create_task(self._write(batch))
+        self._writes.add(task)
+        task.add_done_callback(self._writes.discard)
+
+    async def _write(self, batch: List[Tuple[List[dict], asyncio.Future]]) -> None:
+        try:
+            await append_entries(self._get_db(), [entry for entries, _ in batch for entry in entries])
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+        else:
+            for _, future in batch:
+                if not future.done():
+                    future.set_result(None)
+
+    async def flush(self) -> None:
+        """Write everything queued and wait for writes in flight; used at shutdown."""
+        self._flush_now()
+        await asyncio.gather(*self._writes, return_exceptions=True)
+
+
+async def ledger_balance(db, user_id: str) -> Optional[float]:
+    """A user's balance: their latest snapshot plus every entry after it.
+
+    None if the user has no ledger history at all, which means they predate
+    the ledger and ``--backfill`` has not recorded their opening balance yet.
+    """
+    snapshot = await db.ledger_snapshots.find_one({"user_id": user_id}, SNAPSHOT_PROJECTION)
+    query: Dict[str, Any] = {"user_id": user_id}
+    total = None
+    if snapshot is not None:
+        query["at"] = {"$gte": snapshot["through"]}
+        total = snapshot["balance"]
+    async for row in db.ledger.aggregate([
+        {"$match": query},
+        {"$group": {"_id": None, "amount": {"$sum": "$amount"}, "entries": {"$sum": 1}}},
+    ]):
+        if row["entries"]:
+            total = (total or 0.0) + row["amount"]
+    return None if total is None else round(total, 8)
+
+
+def _datetime_column(values: List[datetime]) -> np.ndarray:
+    # Mongo hands back naive UTC datetimes; NumPy datetime64 has no timezone
+    return pd.to_datetime(values, utc=True).tz_convert(None).values.astype("datetime64[ms]")
+
+
+def cutoff_column(since: Dict[str, datetime]) -> pd.Series:
+    """Per-user cutoffs as a datetime64 Series indexed by user id, for ``sum_batch``."""
+    return pd.Series(_datetime_column(list(since.values())), index=list(since.keys()))
+
+
+def sum_batch(docs: List[dict], since: Optional[pd.Series] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """Per-user totals of one batch of entries, as (user ids, sums).
+
+    With ``since`` (see ``cutoff_column``), a user's entries before their own
+    cutoff are left out; they are already in that user's snapshot.
+    """
+    user_ids, users = pd.factorize(np.array([doc["user_id"] for doc in docs], dtype=object))
+    amount = np.fromiter((doc["amount"] for doc in docs), dtype=np.float64, count=len(docs))
+    if since is not None:
+        at = _datetime_column([doc["at"] for doc in docs])
+        floor = since.reindex(users, fill_value=_EPOCH).values.astype("datetime64[ms]")
+        keep = at >= floor[user_ids]
+        user_ids, amount = user_ids[keep], amount[keep]
+    return np.asarray(users, dtype=object), np.bincount(user_ids, weights=amount, minlength=len(users))
+
+
+def merge_sums(parts: List[Tuple[np.ndarray, np.ndarray]]) -> Dict[str, float]:
+    if not parts:
+        return {}
+    user_ids, users = pd.factorize(np.concatenate([users for users, _ in parts]))
+    sums = np.bincount(user_ids, weights=np.concatenate([sums for _, sums in parts]), minlength=len(users))
+    return dict(zip(users.tolist(), np.round(sums, 8).tolist()))
+
+
+async def replay(db, start: Optional[datetime], end: datetime, since: Optional[Dict[str, datetime]] = None,
+                 batch_size: int = REPLAY_BATCH_SIZE) -> Tuple[Dict[str, float], int]:
+    """Sum every user's entries with ``start <= at < end``; returns (sums, entries read)."""
+    at: Dict[str, datetime] = {"$lt": end}
+    if start is not None:
+        at["$gte"] = start
+    cutoffs = cutoff_column(since) if since else None
+    projection = REPLAY_PROJECTION if cutoffs is None else {**REPLAY_PROJECTION, "at": 1}
+    parts: List[Tuple[np.ndarray, np.ndarray]] = []
+    entries = 0
+    docs: List[dict] = []
+    async for doc in db.ledger.find({"at": at}, projection).batch_size(batch_size):
+        docs.append(doc)
+        if len(docs) >= batch_size:
+            parts.append(sum_batch(docs, cutoffs))
+            entries += len(docs)
+            docs = []
+    if docs:
+        parts.append(sum_batch(docs, cutoffs))
+        entries += len(docs)
+    return merge_sums(parts), entries
+
+
+async def take_snapshots(db, cutoff: Optional[datetime] = None, full: bool = False,
+                         batch_size: int = REPLAY_BATCH_SIZE) -> Dict[str, Any]:
+    """Advance every user's snapshot to ``cutoff`` (default: now minus ``SNAPSHOT_LAG``).
+
+    Each snapshot only moves if its ``through`` is still the cutoff this run
+    replayed it from, so runs that overlap never add the same entries twice;
+    whichever writes a snapshot first wins and the other leaves it alone. An
+    interrupted run is repaired by running again. ``full`` rebuilds every
+    snapshot from scratch and should not overlap other runs.
+    """
+    cutoff = cutoff or datetime.now(timezone.utc) - SNAPSHOT_LAG
+    started = time.perf_counter()
+    throughs = [] if full else await db.ledger_snapshots.distinct("through")
+    start = min(throughs) if throughs else None
+    since: Dict[str, datetime] = {}
+    if len(throughs) > 1:
+        # An earlier run stopped partway; each user resumes from their own cutoff
+        since = {
+            doc["user_id"]: doc["through"]
+            async for doc in db.ledger_snapshots.find({}, SNAPSHOT_PROJECTION).batch_size(batch_size)
+        }
+
+    deltas, entries = await replay(db, start, cutoff, since or None, batch_size)
+    user_ids = list(deltas)
+    now = datetime.now(timezone.utc)
+    for offset in range(0, len(user_ids), SNAPSHOT_WRITE_BATCH_SIZE):
+        chunk = user_ids[offset:offset + SNAPSHOT_WRITE_BATCH_SIZE]
+        if full:
+            updates = [
+                UpdateOne({"user_id": user_id}, {"$set": {
+                    "balance": deltas[user_id], "through": cutoff, "updated_at": now,
+                }}, upsert=True)
+                for user_id in chunk
+            ]
+        else:
+            # A user without a snapshot yet matches through: None, which upserts it
+            updates = [
+                UpdateOne({"user_id": user_id, "through": since.get(user_id, start)}, {
+                    "$inc": {"balance": deltas[user_id]},
+                    "$set": {"through": cutoff, "updated_at": now},
+                }, upsert=True)
+                for user_id in chunk
+            ]
+        try:
+            await db.ledger_snapshots.bulk_write(updates, ordered=False)
+        except BulkWriteError as e:
+            # Another run created the snapshot first
+            if any(error["code"] != _DUPLICATE_KEY for error in e.details["writeErrors"]):
+                raise
+    # Nobody else had entries in the window, so their balances carry over unchanged;
+    # after a full replay they have no entries at all
+    carried: Dict[str, Any] = {"through": cutoff, "updated_at": now}
+    if full:
+        carried["balance"] = 0.0
+        await db.ledger_snapshots.update_many({"through": {"$ne": cutoff}}, {"$set": carried})
+    elif throughs:
+        # Only snapshots still at a cutoff this run replayed from; one another run
+        # moved may have entries this run did not read
+        await db.ledger_snapshots.update_many({"through": {"$in": throughs}}, {"$set": carried})
+
+    elapsed = time.perf_counter() - started
+    return {
+        "entries": entries,
+        "users": len(deltas),
+        "seconds": elapsed,
+        "entries_per_second": entries / elapsed if elapsed else 0.0,
+    }
+
+
+async def find_drift(db, batch_size: int = REPLAY_BATCH_SIZE) -> List[Dict[str, Any]]:
+    """Users whose ``tft_balance`` differs from their ledger balance.
+
+    Meant to run right after ``take_snapshots``, when every snapshot shares
+    one cutoff. A request between its balance write and its ledger write
+    shows up as drift until it finishes, so only persistent drift needs repair.
+    Users with no ledger history predate the ledger and are left to
+    ``--backfill``.
+    """
+    snapshots: Dict[str, float] = {}
+    through = None
+    async for doc in db.ledger_snapshots.find({}, SNAPSHOT_PROJECTION).batch_size(batch_size):
+        snapshots[doc["user_id"]] = doc["balance"]
+        through = doc["through"]
+    tail_match = {} if through is None else {"at": {"$gte": through}}
+    tails = {
+        row["_id"]: row["amount"]
+        async for row in db.ledger.aggregate([
+            {"$match": tail_match},
+            {"$group": {"_id": "$user_id", "amount": {"$sum": "$amount"}}},
+        ])
+    }
+
+    drift = []
+    async for user in db.users.find({}, {"_id": 0, "id": 1, "tft_balance": 1}).batch_size(batch_size):
+        user_id = user["id"]
+        if user_id not in snapshots and user_id not in tails:
+            continue
+        expected = round(snapshots.get(user_id, 0.0) + tails.get(user_id, 0.0), 8)
+        actual = user.get("tft_balance", 0.0)
+        if abs(actual - expected) > DRIFT_TOLERANCE:
+            drift.append({"user_id": user_id, "tft_balance": actual, "ledger_balance": expected})
+    return drift
+
+
+async def repair_drift(db, drift: List[Dict[str, Any]]) -> int:
+    """Move each drifted ``tft_balance`` to the ledger balance; returns users repaired."""
+    if not drift:
+        return 0
+    # Only overwrite the value that was compared, so a concurrent write wins
+    result = await db.users.bulk_write([
+        UpdateOne({"id": row["user_id"], "tft_balance": row["tft_balance"]},
+                  {"$set": {"tft_balance": row["ledger_balance"]}})
+        for row in drift
+    ], ordered=False)
+    return result.modified_count
+
+
+async def backfill_opening_balances(db, batch_size: int = REPLAY_BATCH_SIZE) -> int:
+    """Record an ``opening_balance`` entry for users that predate the ledger."""
+    ledgered = set(await db.ledger.distinct("user_id"))
+    entries = []
+    written = 0
+    async for user in db.users.find({}, {"_id": 0, "id": 1, "tft_balance": 1}).batch_size(batch_size):
+        if user["id"] in ledgered:
+            continue
+        entries.append(ledger_entry("opening_balance", user["id"], user.get("tft_balance", 0.0), user["id"]))
+        if len(entries) >= batch_size:
+            written += await append_entries(db, entries)
+            entries = []
+    written += await append_entries(db, entries)
+    return written
+
+
+async def reconcile_ledger(db) -> Dict[str, Any]:
+    """Advance the snapshots and count users whose balance drifted from the ledger."""
+    stats = await take_snapshots(db)
+    stats["drifted"] = len(await find_drift(db))
+    return stats
+
+
+async def main(full: bool, repair: bool, backfill: bool) -> None:
+    load_dotenv(Path(__file__).parent / ".env")
+    client = AsyncIOMotorClient(os.environ["MONGO_URL"])
+    db = client[os.environ["DB_NAME"]]
+    try:
+        if backfill:
+            print(f"Recorded {await backfill_opening_balances(db)} opening balances")
+        stats = await take_snapshots(db, full=full)
+        print(f"Replayed {stats['entries']} entries for {stats['users']} users "
+              f"in {stats['seconds']:.2f}s, {stats['entries_per_second']:.0f} entries/s")
+        drift = await find_drift(db)
+        for row in drift[:20]:
+            print(f"  {row['user_id']}: tft_balance {row['tft_balance']}, ledger {row['ledger_balance']}")
+        print(f"{len(drift)} users drifted from the ledger")
+        if repair:
+            print(f"Repaired {await repair_drift(db, drift)} balances")
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Snapshot ledger balances and check them against users")
+    parser.add_argument("--full", action="store_true", help="replay the whole ledger instead of the new entries")
+    parser.add_argument("--repair", action="store_true", help="reset drifted balances to the ledger balance")
+    parser.add_argument("--backfill", action="store_true", help="record opening balances for pre-ledger users")
+    args = parser.parse_args()
+    asyncio.run(main(args.full, args.repair, args.backfill))
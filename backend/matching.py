@@ -0,0 +1,289 @@
+"""In-memory matching engine for open positions.
+
+Each symbol keeps every open position's stop-loss and take-profit levels in
+two heaps. One holds the levels that fire when the price falls to them: a
+long's stop loss and a short's take profit. The other holds the levels that
+fire when the price rises to them. A tick pops only the levels it crosses,
+so its cost depends on the positions it closes, not on how many are open.
+Entries for positions that were closed through their other level are
+discarded lazily when they surface.
+
+Closed positions queue up in ``pending`` until the settlement loop writes
+them to Mongo in batches with ``close_trades`` and ``credit_closes``.
+``load_open_positions`` rebuilds the engine from the trade repository when
+a worker takes the trading lease. The engine remembers the ids it closed
+recently and never opens them again, so a position picked up from Mongo
+before its close settled is not closed twice.
+"""
+import heapq
+import uuid
+from collections import OrderedDict, defaultdict
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from ledger import insert_entries, ledger_entry
+from portfolio import trade_closed_update
+from price_book import Quote
+
+OPEN_POSITION_PROJECTION = {
+    "_id": 0, "id": 1, "user_id": 1, "symbol": 1, "side": 1, "amount": 1,
+    "price": 1, "stop_loss": 1, "take_profit": 1, "margin": 1,
+}
+RECENTLY_CLOSED_LIMIT = 100_000
+
+
+class SettlementIncomplete(Exception):
+    """Trades were closed but their PnL was not credited; retrying would pay twice."""
+
+
+@dataclass
+class Position:
+    id: str
+    user_id: str
+    symbol: str
+    side: str
+    amount: float
+    price: float
+    stop_loss: float
+    take_profit: float
+    # Balance locked when the position opened; 0 for positions opened before margin was reserved
+    margin: float = 0.0
+
+    def pnl_at(self, price: float) -> float:
+        """Realized PnL in TFT for closing ``amount`` of notional at ``price``.
+
+        A loss is capped at the notional, so releasing the margin plus the PnL
+        never takes the balance below zero.
+        """
+        change = (price - self.price) / self.price
+        return round(max(self.amount * (change if self.side == "buy" else -change), -self.amount), 8)
+
+
+@dataclass
+class ClosedPosition:
+    position: Position
+    close_price: float
+    close_reason: str  # "stop_loss", "take_profit" or "manual"
+    closed_at: datetime = field(default_factory=lambda: datetime.now(timezone.utc))
+    # Marks the trade document so a retried settlement can tell which closes landed
+    close_id: str = field(default_factory=lambda: str(uuid.uuid4()))
+
+    @property
+    def pnl(self) -> float:
+        return self.position.pnl_at(self.close_price)
+
+    def as_dict(self) -> dict:
+        return {**asdict(self.position), **self.trade_update()}
+
+    def trade_update(self) -> dict:
+        return {
+            "status": "closed",
+            "closed_at": self.closed_at,
+            "close_price": self.close_price,
+            "close_reason": self.close_reason,
+            "pnl": self.pnl,
+            "close_id": self.close_id,
+        }
+
+
+class SymbolBook:
+    def __init__(self):
+        # (-level, seq, position id): fires once price <= level
+        self.falling: List[Tuple[float, int, str]] = []
+        # (level, seq, position id): fires once price >= level
+        self.rising: List[Tuple[float, int, str]] = []
+        self.open = 0
+        # Heap entries left behind by positions that are already closed
+        self.stale = 0
+
+
+class MatchingEngine:
+    def __init__(self, recently_closed_limit: int = RECENTLY_CLOSED_LIMIT):
+        self._books: Dict[str, SymbolBook] = defaultdict(SymbolBook)
+        self._positions: Dict[str, Position] = {}
+        self._seq = 0
+        self.pending: List[ClosedPosition] = []
+        self._closed: "OrderedDict[str, None]" = OrderedDict()
+        self.recently_closed_limit = recently_closed_limit
+
+    def __len__(self) -> int:
+        return len(self._positions)
+
+    def __contains__(self, position_id: str) -> bool:
+        return position_id in self._positions
+
+    def get(self, position_id: str) -> Optional[Position]:
+        return self._positions.get(position_id)
+
+    def clear(self) -> None:
+        """Drop every open position; closes still waiting in ``pending`` are kept."""
+        self._books.clear()
+        self._positions.clear()
+        self._closed.clear()
+
+    def open(self, position: Position) -> None:
+        if position.id in self._positions or position.id in self._closed:
+            return
+        if position.side == "buy":
+            falling, rising = position.stop_loss, position.take_profit
+        else:
+            falling, rising = position.take_profit, position.stop_loss
+        book = self._books[position.symbol]
+        self._seq += 1
+        heapq.heappush(book.falling, (-falling, self._seq, position.id))
+        heapq.heappush(book.rising, (rising, self._seq, position.id))
+        book.open += 1
+        self._positions[position.id] = position
+
+    def load(self, positions: Iterable[Position]) -> int:
+        count = 0
+        for position in positions:
+            self.open(position)
+            count += 1
+        return count
+
+    def close(self, position_id: str, price: float, reason: str = "manual") -> Optional[ClosedPosition]:
+        """Close an open position now; the caller settles the returned close."""
+        position = self._positions.pop(position_id, None)
+        if position is None:
+            return None
+        book = self._books[position.symbol]
+        book.open -= 1
+        book.stale += 2
+        self._compact(book)
+        self._remember_closed(position_id)
+        return ClosedPosition(position, price, reason)
+
+    def on_quote(self, quote: Quote) -> List[ClosedPosition]:
+        """Price listener: close every position whose level the tick crossed."""
+        book = self._books.get(quote.symbol)
+        if book is None:
+            return []
+        price = quote.price
+        closed = []
+        while book.rising and book.rising[0][0] <= price:
+            _, _, position_id = heapq.heappop(book.rising)
+            self._trigger(book, position_id, price, "rising", closed)
+        while book.falling and -book.falling[0][0] >= price:
+            _, _, position_id = heapq.heappop(book.falling)
+            self._trigger(book, position_id, price, "falling", closed)
+        if closed:
+            self._compact(book)
+            self.pending.extend(closed)
+        return closed
+
+    def _trigger(self, book: SymbolBook, position_id: str, price: float, direction: str,
+                 closed: List[ClosedPosition]) -> None:
+        position = self._positions.pop(position_id, None)
+        if position is None:
+            book.stale -= 1  # already closed through its other level
+            return
+        book.open -= 1
+        book.stale += 1
+        self._remember_closed(position_id)
+        # A long takes profit on the way up; a short takes profit on the way down
+        take_profit = (direction == "rising") == (position.side == "buy")
+        closed.append(ClosedPosition(position, price, "take_profit" if take_profit else "stop_loss"))
+
+    def _remember_closed(self, position_id: str) -> None:
+        self._closed[position_id] = None
+        if len(self._closed) > self.recently_closed_limit:
+            self._closed.popitem(last=False)
+
+    def _compact(self, book: SymbolBook) -> None:
+        # Rebuild once stale entries outnumber live ones, keeping the heaps
+        # proportional to the open positions
+        if book.stale <= 2 * book.open + 64:
+            return
+        book.falling = [entry for entry in book.falling if entry[2] in self._positions]
+        book.rising = [entry for entry in book.rising if entry[2] in self._positions]
+        heapq.heapify(book.falling)
+        heapq.heapify(book.rising)
+        book.stale = 0
+
+    def drain(self, limit: int) -> List[ClosedPosition]:
+        batch, self.pending = self.pending[:limit], self.pending[limit:]
+        return batch
+
+
+def position_from_trade(trade: dict) -> Position:
+    return Position(
+        id=trade["id"], user_id=trade["user_id"], symbol=trade["symbol"], side=trade["side"],
+        amount=trade["amount"], price=trade["price"],
+        stop_loss=trade["stop_loss"], take_profit=trade["take_profit"], margin=trade.get("margin", 0.0),
+    )
+
+
+async def load_open_positions(trades, engine: MatchingEngine) -> int:
+    positions = [position_from_trade(trade) for trade in await trades.open_positions(OPEN_POSITION_PROJECTION)]
+    return engine.load(positions)
+
+
+async def close_trades(trades, closes: List[ClosedPosition]) -> List[ClosedPosition]:
+    """Mark a batch of trades closed; returns the closes that landed.
+
+    The update only matches a trade that is still open, so a position closed
+    elsewhere (by another worker, or before a restart) is never closed twice.
+    A failed batch can be retried as is. Closes that landed in the earlier
+    attempt are recognised by their close_id.
+    """
+    if not closes:
+        return []
+    landed_ids = await trades.close([(close.position.id, close.trade_update()) for close in closes])
+    return [close for close in closes if close.position.id in landed_ids]
+
+
+def pnl_by_user(closes: Iterable[ClosedPosition]) -> Dict[str, List[float]]:
+    by_user: Dict[str, List[float]] = defaultdict(list)
+    for close in closes:
+        by_user[close.position.user_id].append(close.pnl)
+    return by_user
+
+
+def close_entries(close: ClosedPosition) -> List[dict]:
+    position = close.position
+    entries = [ledger_entry("trade_pnl", position.user_id, close.pnl, position.id)]
+    if position.margin:
+        entries.append(ledger_entry("margin_release", position.user_id, position.margin, position.id))
+    return entries
+
+
+async def credit_closes(db, users, closes: List[ClosedPosition]) -> List[ClosedPosition]:
+    """Release margin and credit realized PnL to balances and portfolio summaries, one write per user.
+
+    The ledger entries go first, and only the closes whose ``trade_pnl``
+    entry this call wrote are credited; returns those. A retried batch
+    therefore never pays a trade twice. If an earlier attempt wrote an entry
+    but failed before crediting it, the ledger is the record to repair the
+    balance from.
+    """
+    written = {entry["id"] for entry in await insert_entries(db, [
+        entry for close in closes for entry in close_entries(close)
+    ])}
+    credited = [close for close in closes if f"trade_pnl:{close.position.id}" in written]
+    try:
+        await _credit(db, users, credited)
+    except Exception as e:
+        raise SettlementIncomplete([close.position.id for close in credited]) from e
+    return credited
+
+
+async def _credit(db, users, closes: List[ClosedPosition]) -> None:
+    by_user = pnl_by_user(closes)
+    if not by_user:
+        return
+    margins: Dict[str, float] = defaultdict(float)
+    for close in closes:
+        margins[close.position.user_id] += close.position.margin
+    await users.increment_many({
+        user_id: {
+            "tft_balance": round(sum(pnls) + margins[user_id], 8),
+            "open_margin": -round(margins[user_id], 8),
+            "successful_trades": sum(1 for pnl in pnls if pnl > 0),
+        }
+        for user_id, pnls in by_user.items()
+    })
+    await db.portfolio_summary.bulk_write(
+        [trade_closed_update(user_id, pnls) for user_id, pnls in by_user.items()], ordered=False
+    )
@@ -0,0 +1,242 @@
+"""Stake maturity processing.
+
+A stake matures at ``end_date``: it is deactivated, and its principal plus
+the rewards for its full term go back to the user's ``tft_balance``. Due
+stakes are found through the ``(is_active, end_date)`` index, oldest first.
+
+Several workers can run the processor at once. Each batch is claimed with
+one ``update_many`` that stamps a fresh claim id on due stakes nobody else
+holds; a worker only settles the stakes carrying its own claim id. A claim
+that is not settled within ``claim_timeout`` seconds, because its worker
+died, can be taken over by another worker.
+
+A claimed batch is settled with bulk writes:
+
+1. The stakes are deactivated, but only if they still carry this claim and
+   the rewards that were read. They keep the claim and are marked
+   ``maturity_credited: False`` until their payout lands.
+2. ``stake_release`` ledger entries. Their ids are derived from the stake,
+   so a batch taken over after a crash never records a payout twice.
+3. The stakes are marked credited, then the balances and portfolio
+   summaries are credited, one bulk write each. If the balance write fails
+   the mark is taken back, so a later pass pays them. A worker that dies
+   between the two leaves the ledger entry to repair the balance from
+   (``ledger.py --repair``); crediting before marking could pay twice.
+
+Stakes still marked uncredited once their claim has expired, because the
+worker died or the balance write failed, are claimed again before any newly
+due stakes and go straight to step 2.
+
+Run ``python maturity.py`` from the backend directory for a one-off pass.
+"""
+import argparse
+import asyncio
+import os
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import UpdateOne
+
+from ledger import append_entries, ledger_entry
+from portfolio import stake_matured_update
+from rewards import compute_batch
+
+MATURITY_BATCH_SIZE = 1000
+CLAIM_TIMEOUT_SECONDS = 300.0
+
+MATURITY_PROJECTION = {
+    "_id": 0, "id": 1, "user_id": 1, "amount": 1, "duration_days": 1,
+    "start_date": 1, "end_date": 1, "rewards_earned": 1, "rewards_accrued": 1, "is_active": 1,
+    "maturity_claim": 1,
+}
+
+
+# Deactivated stakes whose payout has not landed yet
+CREDIT_PENDING = {"maturity_credited": False}
+
+
+def due_query(now: datetime) -> Dict[str, Any]:
+    return {"is_active": True, "end_date": {"$lte": now}}
+
+
+def _naive_utc(value: datetime) -> datetime:
+    # Mongo hands back naive UTC datetimes
+    return value.astimezone(timezone.utc).replace(tzinfo=None) if value.tzinfo else value
+
+
+class MaturityProcessor:
+    """Settles due stakes in claimed batches and tracks the remaining backlog."""
+
+    def __init__(self, batch_size: int = MATURITY_BATCH_SIZE, claim_timeout: float = CLAIM_TIMEOUT_SECONDS,
+                 on_matured: Optional[Callable[[List[str]], None]] = None):
+        self.batch_size = batch_size
+        self.claim_timeout = claim_timeout
+        # Called with the ids of users whose balances were credited
+        self.on_matured = on_matured
+        # Due stakes still active after the last pass, and how overdue the oldest was
+        self.backlog = 0
+        self.lag_seconds = 0.0
+
+    async def claim(self, db, now: datetime) -> Optional[List[dict]]:
+        """Claim up to ``batch_size`` due or uncredited stakes; returns the ones this worker now holds.
+
+        Returns None when no unclaimed stake is due, and an empty list when
+        other workers claimed every candidate first.
+        """
+        expired = now - timedelta(seconds=self.claim_timeout)
+        unclaimed = {"$or": [{"maturity_claimed_at": None}, {"maturity_claimed_at": {"$lt": expired}}]}
+        candidates = [
+            doc["id"] async for doc in db.stakes.find(
+                {**CREDIT_PENDING, "maturity_claimed_at": {"$lt": expired}}, {"_id": 0, "id": 1},
+            ).limit(self.batch_size)
+        ]
+        if len(candidates) < self.batch_size:
+            candidates += [
+                doc["id"] async for doc in db.stakes.find(
+                    {**due_query(now), **unclaimed}, {"_id": 0, "id": 1},
+                ).sort("end_date", 1).limit(self.batch_size - len(candidates))
+            ]
+        if not candidates:
+            return None
+        claim_id = str(uuid.uuid4())
+        # Re-checks the claim filter per stake, so a stake another worker
+        # claimed in the meantime is left alone
+        await db.stakes.update_many(
+            {"id": {"$in": candidates}, "$and": [{"$or": [due_query(now), CREDIT_PENDING]}, unclaimed]},
+            {"$set": {"maturity_claim": claim_id, "maturity_claimed_at": now}},
+        )
+        return [
+            doc async for doc in db.stakes.find({"id": {"$in": candidates}, "maturity_claim": claim_id},
+                                                MATURITY_PROJECTION)
+        ]
+
+    async def settle(self, db, stakes: List[dict], now: datetime) -> List[str]:
+        """Deactivate and pay out a claimed batch; returns the ids of the stakes credited."""
+        if not stakes:
+            return []
+        claim_id = stakes[0]["maturity_claim"]
+        active = [stake for stake in stakes if stake["is_active"]]
+        if active:
+            # Rewards for the whole term: accrual stops at end_date, which has passed
+            rewards = compute_batch(active, now)["rewards"]
+            await db.stakes.bulk_write([
+                UpdateOne(
+                    {"id": stake["id"], "is_active": True, "maturity_claim": claim_id,
+                     "rewards_earned": stake.get("rewards_earned", 0.0)},
+                    # The summary holds the rewards accrual added, which is what was read
+                    {"$set": {"is_active": False, "rewards_earned": reward, "matured_at": now,
+                              "rewards_accrued": stake.get("rewards_earned", 0.0), "maturity_credited": False}},
+                )
+                for stake, reward in zip(active, rewards.tolist())
+            ], ordered=False)
+        # Deactivated just now, or by a pass that did not get to credit them
+        pending = [
+            doc async for doc in db.stakes.find(
+                {"id": {"$in": [stake["id"] for stake in stakes]}, "maturity_claim": claim_id, **CREDIT_PENDING},
+                MATURITY_PROJECTION,
+            )
+        ]
+        return await self.credit(db, pending, claim_id)
+
+    async def credit(self, db, stakes: List[dict], claim_id: str) -> List[str]:
+        """Pay out deactivated stakes held under ``claim_id``; returns the ids credited."""
+        if not stakes:
+            return []
+        await append_entries(db, [
+            ledger_entry("stake_release", stake["user_id"], stake["amount"] + stake["rewards_earned"], stake["id"])
+            for stake in stakes
+        ])
+        ids = [stake["id"] for stake in stakes]
+        marked = await db.stakes.update_many(
+            {"id": {"$in": ids}, "maturity_claim": claim_id, **CREDIT_PENDING}, {"$set": {"maturity_credited": True}},
+        )
+        if marked.modified_count != len(stakes):
+            # Another worker took some over after this claim expired
+            ids = [
+                doc["id"] async for doc in db.stakes.find(
+                    {"id": {"$in": ids}, "maturity_claim": claim_id, "maturity_credited": True}, {"_id": 0, "id": 1},
+                )
+            ]
+            kept = set(ids)
+            stakes = [stake for stake in stakes if stake["id"] in kept]
+            if not stakes:
+                return []
+
+        user_ids = np.array([stake["user_id"] for stake in stakes], dtype=object)
+        amount = np.array([stake["amount"] for stake in stakes], dtype=np.float64)
+        rewards = np.array([stake["rewards_earned"] for stake in stakes], dtype=np.float64)
+        users, inverse = np.unique(user_ids, return_inverse=True)
+        principal = np.bincount(inverse, weights=amount)
+        payout = np.bincount(inverse, weights=amount + rewards)
+        try:
+            await db.users.bulk_write([
+                UpdateOne({"id": user_id}, {"$inc": {"tft_balance": round(paid, 8), "staked_amount": -staked}})
+                for user_id, paid, staked in zip(users.tolist(), payout.tolist(), principal.tolist())
+            ], ordered=False)
+        except Exception:
+            # Nothing was paid; leave them for the next pass once this claim expires
+            await db.stakes.update_many({"id": {"$in": ids}, "maturity_claim": claim_id},
+                                        {"$set": {"maturity_credited": False}})
+            raise
+        if self.on_matured is not None:
+            self.on_matured(users.tolist())
+        # Paid and marked by now, so a failure here only leaves the summary
+        # for the periodic rebuild to repair
+        await db.portfolio_summary.bulk_write([
+            stake_matured_update(stake["user_id"], stake["amount"], stake.get("rewards_accrued", 0.0))
+            for stake in stakes
+        ], ordered=False)
+        return ids
+
+    async def measure(self, db, now: datetime) -> None:
+        self.backlog = await db.stakes.count_documents(due_query(now))
+        oldest = await db.stakes.find_one(due_query(now), {"_id": 0, "end_date": 1}, sort=[("end_date", 1)])
+        self.lag_seconds = (_naive_utc(now) - oldest["end_date"]).total_seconds() if oldest else 0.0
+
+    async def run(self, db, now: Optional[datetime] = None) -> Dict[str, Any]:
+        """Settle every stake due as of ``now`` (default: now) that no other worker holds."""
+        now = now or datetime.now(timezone.utc)
+        started = time.perf_counter()
+        matured = batches = 0
+        while True:
+            stakes = await self.claim(db, now)
+            if stakes is None:
+                break
+            matured += len(await self.settle(db, stakes, now))
+            batches += 1
+        await self.measure(db, now)
+
+        elapsed = time.perf_counter() - started
+        return {
+            "matured": matured,
+            "batches": batches,
+            "backlog": self.backlog,
+            "lag_seconds": self.lag_seconds,
+            "seconds": elapsed,
+            "stakes_per_second": matured / elapsed if elapsed else 0.0,
+        }
+
+
+async def main(batch_size: int) -> None:
+    load_dotenv(Path(__file__).parent / ".env")
+    client = AsyncIOMotorClient(os.environ["MONGO_URL"])
+    try:
+        stats = await MaturityProcessor(batch_size).run(client[os.environ["DB_NAME"]])
+        print(f"Matured {stats['matured']} stakes in {stats['batches']} batches "
+              f"in {stats['seconds']:.2f}s, {stats['stakes_per_second']:.0f} stakes/s; "
+              f"{stats['backlog']} still due, oldest {stats['lag_seconds']:.0f}s overdue")
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Settle every stake past its end date")
+    parser.add_argument("--batch-size", type=int, default=MATURITY_BATCH_SIZE)
+    args = parser.parse_args()
+    asyncio.run(main(args.batch_size))
@@ -0,0 +1,222 @@
+"""Request and MongoDB instrumentation with Prometheus text exposition.
+
+``MetricsMiddleware`` is a plain ASGI middleware (no per-request task or
+Request object) that records per-route latency histograms, in-flight
+requests and status codes. ``MongoCommandMetrics`` is a pymongo command
+listener that times every command per collection and operation. It
+attributes each command to the route that issued it through a context
+variable, which Motor carries into its executor threads.
+"""
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from pymongo import monitoring
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# The ASGI scope of the request being served; routing fills in scope["route"]
+current_scope: ContextVar[Optional[dict]] = ContextVar("current_scope", default=None)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, labels: Tuple[str, ...] = (), amount: float = 1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = list(self._values.items())
+        return self.header() + [
+            f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}" for labels, value in values
+        ]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, labels: Tuple[str, ...] = (), amount: float = 1) -> None:
+        self.inc(labels, -amount)
+
+
+class CallbackGauge(Metric):
+    """Gauge whose value is read from ``callback`` at scrape time."""
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, callback: Callable[[], float]):
+        super().__init__(name, documentation)
+        self._callback = callback
+
+    def render(self) -> List[str]:
+        return self.header() + [f"{self.name} {_number(self._callback())}"]
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+        # labels -> [per-bucket counts..., +Inf count, sum]
+        self._series: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, labels: Tuple[str, ...], value: float) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 2)
+            series[index] += 1
+            series[-1] += value
+
+    def render(self) -> List[str]:
+        with self._lock:
+            series = [(labels, list(values)) for labels, values in self._series.items()]
+        lines = self.header()
+        for labels, values in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), values):
+                cumulative += count
+                bucket_labels = _labels(self.labelnames, labels, 'le="%s"' % bound)
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            series_labels = _labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{series_labels} {_number(values[-1])}")
+            lines.append(f"{self.name}_count{series_labels} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: List[Metric] = []
+
+    def register(self, metric: Metric) -> Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+def route_label(scope: Optional[dict]) -> str:
+    if scope is None:
+        return "background"
+    route = scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+
+class RequestMetrics:
+    def __init__(self, registry: MetricsRegistry):
+        self.latency = registry.register(Histogram(
+            "averix_http_request_duration_seconds", "HTTP request latency by route.", ("method", "route")))
+        self.responses = registry.register(Counter(
+            "averix_http_requests_total", "HTTP responses by route and status code.", ("method", "route", "status")))
+        self.in_flight = registry.register(Gauge(
+            "averix_http_requests_in_flight", "HTTP requests currently being served.", ("method",)))
+
+
+class MetricsMiddleware:
+    def __init__(self, app, metrics: RequestMetrics):
+        self.app = app
+        self.metrics = metrics
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        metrics = self.metrics
+        token = current_scope.set(scope)
+        metrics.in_flight.inc((method,))
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            metrics.in_flight.dec((method,))
+            current_scope.reset(token)
+            # Label by route template, not raw path, to keep cardinality bounded
+            route = route_label(scope)
+            metrics.latency.observe((method, route), elapsed)
+            metrics.responses.inc((method, route, str(status_code)))
+
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    def __init__(self, registry: MetricsRegistry):
+        self.duration = registry.register(Histogram(
+            "averix_mongo_command_duration_seconds",
+            "MongoDB command latency by collection, operation and issuing route.",
+            ("collection", "operation", "route")))
+        self.failures = registry.register(Counter(
+            "averix_mongo_command_failures_total", "Failed MongoDB commands.", ("collection", "operation", "route")))
+        self._pending: Dict[Tuple[int, int], Tuple[str, str, str]] = {}
+
+    def started(self, event) -> None:
+        collection = event.command.get(event.command_name)
+        if not isinstance(collection, str):
+            collection = "-"
+        self._pending[(event.request_id, event.operation_id or 0)] = (
+            collection, event.command_name, route_label(current_scope.get())
+        )
+
+    def _finish(self, event) -> Optional[Tuple[str, str, str]]:
+        return self._pending.pop((event.request_id, event.operation_id or 0), None)
+
+    def succeeded(self, event) -> None:
+        labels = self._finish(event)
+        if labels is not None:
+            self.duration.observe(labels, event.duration_micros / 1e6)
+
+    def failed(self, event) -> None:
+        labels = self._finish(event)
+        if labels is not None:
+            self.duration.observe(labels, event.duration_micros / 1e6)
+            self.failures.inc(labels)
@@ -0,0 +1,70 @@
+"""Keyset (cursor) pagination helpers.
+
+Pages are ordered newest first on ``(<timestamp field>, id)``. The cursor is
+an opaque, URL-safe token holding the sort key of the last row returned, so
+every page is a bounded index range scan no matter how deep it is.
+"""
+import base64
+import binascii
+import json
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(timestamp: datetime, row_id: str) -> str:
+    raw = json.dumps([timestamp.isoformat(), row_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        timestamp, row_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(timestamp), str(row_id)
+    except (binascii.Error, ValueError, TypeError) as exc:
+        raise InvalidCursor("Invalid pagination cursor") from exc
+
+
+def keyset_query(query: Dict[str, Any], sort_field: str, cursor: Optional[str]) -> Dict[str, Any]:
+    """Restrict ``query`` to rows strictly after ``cursor`` in descending order."""
+    if not cursor:
+        return query
+    timestamp, row_id = decode_cursor(cursor)
+    after_cursor = {"$or": [
+        {sort_field: {"$lt": timestamp}},
+        {sort_field: timestamp, "id": {"$lt": row_id}},
+    ]}
+    return {"$and": [query, after_cursor]} if query else after_cursor
+
+
+def date_range(start: Optional[datetime], end: Optional[datetime]) -> Optional[Dict[str, datetime]]:
+    bounds = {}
+    if start is not None:
+        bounds["$gte"] = start
+    if end is not None:
+        bounds["$lt"] = end
+    return bounds or None
+
+
+async def fetch_page(collection, query: Dict[str, Any], sort_field: str,
+                     cursor: Optional[str], limit: int,
+                     projection: Optional[Dict[str, Any]] = None) -> Tuple[List[dict], Optional[str]]:
+    """Return one page of documents and the cursor for the next page, if any."""
+    if projection is None:
+        projection = {"_id": 0}
+    docs_cursor = collection.find(
+        keyset_query(query, sort_field, cursor), projection
+    ).sort([(sort_field, -1), ("id", -1)]).limit(limit + 1)
+    docs = await docs_cursor.to_list(length=limit + 1)
+    if len(docs) <= limit:
+        return docs, None
+    docs = docs[:limit]
+    last = docs[-1]
+    return docs, encode_cursor(last[sort_field], last["id"])
@@ -0,0 +1,93 @@
+"""Password hashing off the event loop.
+
+Hashes are stored as ``<algorithm>$<encoded hash>`` so the algorithm and its
+parameters travel with every hash:
+
+* ``bcrypt_sha256$$2b$12$...``: bcrypt over a base64 SHA-256 digest of the
+  password, which lifts bcrypt's 72-byte input limit. The cost factor is
+  part of the bcrypt string.
+* a bare 64-character hex digest: the original fixed-salt SHA-256 scheme.
+  These still verify, and ``verify`` flags them for rehashing.
+
+Logins for unknown emails call ``verify_missing``, which checks the
+password against a dummy hash of the same cost, so a failed login takes
+as long whether or not the account exists.
+
+bcrypt releases the GIL, so running it in a bounded thread pool keeps the
+event loop free to serve other requests while logins are in flight.
+"""
+import asyncio
+import base64
+import hashlib
+import hmac
+import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple
+
+import bcrypt
+
+BCRYPT_SHA256 = "bcrypt_sha256"
+LEGACY_SHA256_SALT = "averix_salt_2025"
+DUMMY_PASSWORD = "averix-no-such-user"
+
+_LEGACY_SHA256 = re.compile(r"^[0-9a-f]{64}$")
+
+
+def _prehash(password: str) -> bytes:
+    return base64.b64encode(hashlib.sha256(password.encode()).digest())
+
+
+def legacy_sha256(password: str) -> str:
+    return hashlib.sha256((password + LEGACY_SHA256_SALT).encode()).hexdigest()
+
+
+class PasswordHasher:
+    def __init__(self, rounds: int = 12, max_workers: int = 4):
+        self.rounds = rounds
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="password-hash")
+        # Hashed on first use, at this hasher's cost
+        self._dummy_hash: Optional[str] = None
+
+    def hash_sync(self, password: str) -> str:
+        hashed = bcrypt.hashpw(_prehash(password), bcrypt.gensalt(self.rounds))
+        return f"{BCRYPT_SHA256}${hashed.decode()}"
+
+    def verify_sync(self, password: str, stored: str) -> Tuple[bool, bool]:
+        """Return (matches, needs_rehash) for a stored hash in any known format."""
+        if _LEGACY_SHA256.match(stored):
+            return hmac.compare_digest(legacy_sha256(password), stored), True
+        algorithm, _, encoded = stored.partition("$")
+        if algorithm != BCRYPT_SHA256:
+            return False, False
+        try:
+            matches = bcrypt.checkpw(_prehash(password), encoded.encode())
+        except ValueError:
+            return False, False
+        return matches, self.needs_rehash(stored)
+
+    def needs_rehash(self, stored: str) -> bool:
+        algorithm, _, encoded = stored.partition("$")
+        if algorithm != BCRYPT_SHA256:
+            return True
+        # bcrypt strings look like $2b$<cost>$<salt+hash>
+        return encoded.split("$")[2] != f"{self.rounds:02d}"
+
+    async def hash(self, password: str) -> str:
+        return await asyncio.get_running_loop().run_in_executor(self._executor, self.hash_sync, password)
+
+    async def verify(self, password: str, stored: str) -> Tuple[bool, bool]:
+        if _LEGACY_SHA256.match(stored):
+            # Cheap enough to run inline
+            return self.verify_sync(password, stored)
+        return await asyncio.get_running_loop().run_in_executor(
+            self._executor, self.verify_sync, password, stored
+        )
+
+    async def verify_missing(self, password: str) -> None:
+        """Spend as long as ``verify`` would, for an account that does not exist."""
+        if self._dummy_hash is None:
+            self._dummy_hash = await self.hash(DUMMY_PASSWORD)
+        await self.verify(password, self._dummy_hash)
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False)
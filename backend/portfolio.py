@@ -0,0 +1,166 @@
+"""Materialized per-user portfolio summary.
+
+``portfolio_summary`` holds one document per user with the dashboard totals,
+kept current by single-document ``$inc`` updates issued from the same write
+paths that change stakes and trades. Those updates are separate writes,
+made after the stake or trade has landed, so the summary is eventually
+consistent: a failed update is logged rather than failing the request, and
+the server rebuilds every summary from ``stakes`` and ``trades`` every
+``PORTFOLIO_REBUILD_SECONDS``. ``python portfolio.py`` does the same by hand.
+"""
+import argparse
+import asyncio
+import os
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Tuple
+
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import UpdateOne
+
+EMPTY_SUMMARY = {
+    "total_staked": 0.0,
+    "total_rewards": 0.0,
+    "active_stakes": 0,
+    "total_trades": 0,
+    "successful_trades": 0,
+    "total_pnl": 0.0,
+    "trade_volume": 0.0,
+}
+
+SUMMARY_PROJECTION = {"_id": 0, "user_id": 0, "updated_at": 0}
+
+STAKE_TOTALS_GROUP = {
+    "$group": {
+        "_id": "$user_id",
+        "total_staked": {"$sum": "$amount"},
+        "total_rewards": {"$sum": {"$ifNull": ["$rewards_earned", 0]}},
+        "active_stakes": {"$sum": 1},
+    }
+}
+
+TRADE_TOTALS_GROUP = {
+    "$group": {
+        "_id": "$user_id",
+        "total_trades": {"$sum": 1},
+        "successful_trades": {"$sum": {"$cond": [{"$gt": ["$pnl", 0]}, 1, 0]}},
+        "total_pnl": {"$sum": {"$ifNull": ["$pnl", 0]}},
+        "trade_volume": {"$sum": "$amount"},
+    }
+}
+
+
+def _increment(inc: Dict[str, float]) -> Dict[str, dict]:
+    return {"$inc": inc, "$set": {"updated_at": datetime.now(timezone.utc)}}
+
+
+def _trade_increments(fills: Iterable[Tuple[float, float]]) -> Dict[str, float]:
+    inc = {"total_trades": 0, "successful_trades": 0, "total_pnl": 0.0, "trade_volume": 0.0}
+    for amount, pnl in fills:
+        inc["total_trades"] += 1
+        inc["successful_trades"] += 1 if pnl > 0 else 0
+        inc["total_pnl"] += pnl
+        inc["trade_volume"] += amount
+    return inc
+
+
+async def create_summary(db, user_id: str) -> None:
+    await db.portfolio_summary.insert_one({
+        "user_id": user_id, **EMPTY_SUMMARY, "updated_at": datetime.now(timezone.utc)
+    })
+
+
+async def record_stake(db, user_id: str, amount: float) -> None:
+    await db.portfolio_summary.update_one(
+        {"user_id": user_id},
+        _increment({"total_staked": amount, "active_stakes": 1}),
+        upsert=True,
+    )
+
+
+async def record_trades(db, user_id: str, fills: Iterable[Tuple[float, float]]) -> None:
+    """Add one or more (amount, pnl) trade fills to the user's trade stats."""
+    await db.portfolio_summary.update_one(
+        {"user_id": user_id}, _increment(_trade_increments(fills)), upsert=True
+    )
+
+
+def trade_closed_update(user_id: str, pnls: Iterable[float]) -> UpdateOne:
+    """Bulk-write operation adding the realized PnL of closed positions."""
+    pnls = list(pnls)
+    return UpdateOne(
+        {"user_id": user_id},
+        _increment({"successful_trades": sum(1 for pnl in pnls if pnl > 0), "total_pnl": sum(pnls)}),
+        upsert=True,
+    )
+
+
+def stake_matured_update(user_id: str, amount: float, rewards: float) -> UpdateOne:
+    """Bulk-write operation removing a matured stake from the active totals."""
+    return UpdateOne(
+        {"user_id": user_id},
+        _increment({"total_staked": -amount, "total_rewards": -rewards, "active_stakes": -1}),
+        upsert=True,
+    )
+
+
+async def get_summary(db, user_id: str) -> Dict[str, float]:
+    """Point lookup of a user's summary, rebuilding it if it was never written."""
+    summary = await db.portfolio_summary.find_one({"user_id": user_id}, SUMMARY_PROJECTION)
+    if summary is None:
+        summary = await rebuild_summaries(db, user_id)
+    return {**EMPTY_SUMMARY, **summary}
+
+
+async def rebuild_summaries(db, user_id: Optional[str] = None) -> Dict[str, float]:
+    """Recompute summaries from the source collections.
+
+    Rebuilds a single user when ``user_id`` is given and returns that
+    summary; otherwise rebuilds every user with stakes, trades or an
+    existing summary.
+    """
+    stakes_match = {"is_active": True}
+    trades_match = {}
+    if user_id is not None:
+        stakes_match["user_id"] = user_id
+        trades_match["user_id"] = user_id
+
+    # Users whose stakes all matured still need their summary zeroed
+    summaries: Dict[str, Dict[str, float]] = {}
+    if user_id is not None:
+        summaries[user_id] = dict(EMPTY_SUMMARY)
+    else:
+        async for doc in db.portfolio_summary.find({}, {"_id": 0, "user_id": 1}):
+            summaries[doc["user_id"]] = dict(EMPTY_SUMMARY)
+    async for totals in db.stakes.aggregate([{"$match": stakes_match}, STAKE_TOTALS_GROUP]):
+        summaries.setdefault(totals.pop("_id"), dict(EMPTY_SUMMARY)).update(totals)
+    async for totals in db.trades.aggregate([{"$match": trades_match}, TRADE_TOTALS_GROUP]):
+        summaries.setdefault(totals.pop("_id"), dict(EMPTY_SUMMARY)).update(totals)
+
+    now = datetime.now(timezone.utc)
+    writes = [
+        UpdateOne({"user_id": uid}, {"$set": {**summary, "updated_at": now}}, upsert=True)
+        for uid, summary in summaries.items()
+    ]
+    for start in range(0, len(writes), 1000):
+        await db.portfolio_summary.bulk_write(writes[start:start + 1000], ordered=False)
+    return summaries.get(user_id, dict(EMPTY_SUMMARY)) if user_id is not None else {}
+
+
+async def main(user_id: Optional[str]) -> None:
+    load_dotenv(Path(__file__).parent / ".env")
+    client = AsyncIOMotorClient(os.environ["MONGO_URL"])
+    try:
+        db = client[os.environ["DB_NAME"]]
+        await rebuild_summaries(db, user_id)
+        print(f"Rebuilt portfolio summary for {user_id or 'all users'}")
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild portfolio summaries from stakes and trades")
+    parser.add_argument("--user", help="only rebuild this user id")
+    args = parser.parse_args()
+    asyncio.run(main(args.user))
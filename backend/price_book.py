@@ -0,0 +1,169 @@
+"""In-memory price book.
+
+Holds the latest quote and 24h change per symbol, fed by a pluggable
+``PriceSource``. Reads never touch Mongo. ``SimulatedPriceSource`` is a
+deterministic, seeded feed for local runs.
+
+Only the worker holding the trading lease runs the feed. It writes its
+quotes to the ``prices`` collection with ``save_quotes``, and the other
+workers follow them with ``SharedPriceSource``, so every worker validates
+and values orders at the same prices.
+"""
+import asyncio
+import random
+import time
+from abc import ABC, abstractmethod
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Callable, Deque, Dict, List, Optional, Tuple
+
+from pymongo import UpdateOne
+
+DAY_SECONDS = 24 * 3600
+# One 24h-history point per minute bounds memory at 1440 points per symbol
+HISTORY_RESOLUTION_SECONDS = 60
+
+# symbol -> (price, 24h change %) used to seed the book at startup
+DEFAULT_INSTRUMENTS: Dict[str, Tuple[float, float]] = {
+    "BTC/USDT": (45000.00, 2.5),
+    "ETH/USDT": (2800.00, 1.8),
+    "EUR/USD": (1.1200, -0.2),
+    "XAU/USD": (1950.00, 0.8),
+}
+
+
+@dataclass
+class Quote:
+    symbol: str
+    price: float
+    updated_at: float
+    history: Deque[Tuple[float, float]] = field(default_factory=deque)
+
+    @property
+    def change(self) -> float:
+        reference = self.history[0][1] if self.history else self.price
+        return round((self.price - reference) / reference * 100, 2) if reference else 0.0
+
+    def as_dict(self) -> dict:
+        return {"symbol": self.symbol, "price": self.price, "change": self.change}
+
+
+class PriceBook:
+    def __init__(self, instruments: Optional[Dict[str, Tuple[float, float]]] = None,
+                 clock=time.time):
+        self._clock = clock
+        self._quotes: Dict[str, Quote] = {}
+        self._snapshot: Optional[List[dict]] = None
+        self._listeners: List[Callable[[Quote], None]] = []
+        now = clock()
+        for symbol, (price, change) in (instruments or DEFAULT_INSTRUMENTS).items():
+            # Seed history so the reported 24h change starts at the configured value
+            opening = price / (1 + change / 100)
+            self._quotes[symbol] = Quote(symbol, price, now, deque([(now - DAY_SECONDS + 1, opening)]))
+
+    def add_listener(self, listener: Callable[[Quote], None]) -> None:
+        """Call ``listener`` synchronously with every updated quote."""
+        self._listeners.append(listener)
+
+    @property
+    def symbols(self) -> List[str]:
+        return list(self._quotes)
+
+    def get(self, symbol: str) -> Optional[Quote]:
+        return self._quotes.get(symbol)
+
+    def price(self, symbol: str) -> Optional[float]:
+        quote = self._quotes.get(symbol)
+        return quote.price if quote else None
+
+    def update(self, symbol: str, price: float, timestamp: Optional[float] = None) -> Quote:
+        timestamp = self._clock() if timestamp is None else timestamp
+        quote = self._quotes.get(symbol)
+        if quote is None:
+            quote = self._quotes[symbol] = Quote(symbol, price, timestamp)
+        history = quote.history
+        if not history or timestamp - history[-1][0] >= HISTORY_RESOLUTION_SECONDS:
+            history.append((timestamp, price))
+        # Keep the last point at or before the 24h cutoff as the reference price
+        while len(history) > 1 and history[1][0] <= timestamp - DAY_SECONDS:
+            history.popleft()
+        quote.price = price
+        quote.updated_at = timestamp
+        self._snapshot = None
+        for listener in self._listeners:
+            listener(quote)
+        return quote
+
+    def snapshot(self) -> List[dict]:
+        """Latest quotes for every symbol, rebuilt only after an update."""
+        if self._snapshot is None:
+            self._snapshot = [quote.as_dict() for quote in self._quotes.values()]
+        return self._snapshot
+
+
+class PriceSource(ABC):
+    """A feed of (symbol, price) ticks applied to the book as they arrive."""
+
+    @abstractmethod
+    def ticks(self, book: PriceBook) -> AsyncIterator[Tuple[str, float]]:
+        """Yield ticks until cancelled; implemented as an async generator."""
+
+    async def run(self, book: PriceBook) -> None:
+        async for symbol, price in self.ticks(book):
+            book.update(symbol, price)
+
+
+class SimulatedPriceSource(PriceSource):
+    """Seeded mean-reverting random walk around each symbol's starting price."""
+
+    def __init__(self, seed: int = 42, interval: float = 1.0, volatility: float = 0.0005,
+                 reversion: float = 0.05):
+        self.seed = seed
+        self.interval = interval
+        self.volatility = volatility
+        self.reversion = reversion
+
+    async def ticks(self, book: PriceBook) -> AsyncIterator[Tuple[str, float]]:
+        rng = random.Random(self.seed)
+        anchors = {symbol: book.price(symbol) for symbol in book.symbols}
+        while True:
+            for symbol, anchor in anchors.items():
+                price = book.price(symbol)
+                drift = self.reversion * (anchor - price) / anchor
+                price *= 1 + drift + rng.gauss(0, self.volatility)
+                yield symbol, round(price, 6 if anchor < 10 else 2)
+            await asyncio.sleep(self.interval)
+
+
+class SharedPriceSource(PriceSource):
+    """Follows the quotes the trading leader writes with ``save_quotes``."""
+
+    def __init__(self, get_collection: Callable[[], Any], interval: float = 1.0):
+        self._get_collection = get_collection
+        self.interval = interval
+
+    async def ticks(self, book: PriceBook) -> AsyncIterator[Tuple[str, float]]:
+        seen: Dict[str, float] = {}
+        while True:
+            async for quote in self._get_collection().find({}, {"_id": 1, "price": 1, "updated_at": 1}):
+                if seen.get(quote["_id"]) != quote["updated_at"]:
+                    seen[quote["_id"]] = quote["updated_at"]
+                    yield quote["_id"], quote["price"]
+            await asyncio.sleep(self.interval)
+
+
+async def save_quotes(collection, book: PriceBook, since: float = 0.0) -> float:
+    """Write the quotes updated after ``since``; returns the newest update time written."""
+    quotes = [quote for quote in map(book.get, book.symbols) if quote.updated_at > since]
+    if quotes:
+        await collection.bulk_write([
+            UpdateOne({"_id": quote.symbol}, {"$set": {"price": quote.price, "updated_at": quote.updated_at}},
+                      upsert=True)
+            for quote in quotes
+        ], ordered=False)
+    return max((quote.updated_at for quote in quotes), default=since)
+
+
+PRICE_SOURCES = {
+    "simulated": SimulatedPriceSource,
+}
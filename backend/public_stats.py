@@ -0,0 +1,74 @@
+"""Live public platform stats served from an in-memory snapshot.
+
+The stats come from Mongo aggregations run by a background refresher, never
+from the request path. A request only computes them itself when the
+snapshot is older than ``max_staleness``. Concurrent refreshes share one
+in-flight computation, so a burst of requests cannot stampede the database.
+"""
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+
+class SnapshotCache:
+    def __init__(self, compute: Callable[[], Awaitable[Any]], max_staleness: float,
+                 clock: Callable[[], float] = time.monotonic):
+        self._compute = compute
+        self.max_staleness = max_staleness
+        self._clock = clock
+        self._value: Any = None
+        self._computed_at: Optional[float] = None
+        self._inflight: Optional[asyncio.Future] = None
+
+    @property
+    def age(self) -> Optional[float]:
+        return None if self._computed_at is None else self._clock() - self._computed_at
+
+    async def refresh(self) -> Any:
+        """Recompute the snapshot, joining a refresh that is already running."""
+        if self._inflight is None:
+            self._inflight = asyncio.ensure_future(self._run())
+        # Shield so a cancelled caller does not cancel the shared computation
+        return await asyncio.shield(self._inflight)
+
+    async def _run(self) -> Any:
+        try:
+            value = await self._compute()
+            self._value, self._computed_at = value, self._clock()
+            return value
+        finally:
+            self._inflight = None
+
+    async def get(self) -> Any:
+        age = self.age
+        if age is None or age > self.max_staleness:
+            return await self.refresh()
+        return self._value
+
+
+def format_usd(value: float) -> str:
+    for threshold, suffix in ((1e9, "B"), (1e6, "M"), (1e3, "K")):
+        if value >= threshold:
+            return f"${value / threshold:.1f}{suffix}"
+    return f"${value:,.2f}"
+
+
+async def compute_public_stats(db, tft_price: float) -> Dict[str, Any]:
+    # portfolio_summary holds one small document per user, so one $group over
+    # it replaces scanning every stake and trade
+    totals_pipeline = [{"$group": {
+        "_id": None,
+        "active_stakes": {"$sum": "$active_stakes"},
+        "trade_volume": {"$sum": "$trade_volume"},
+    }}]
+    total_traders, totals = await asyncio.gather(
+        db.users.estimated_document_count(),
+        db.portfolio_summary.aggregate(totals_pipeline).to_list(length=1),
+    )
+    totals = totals[0] if totals else {"active_stakes": 0, "trade_volume": 0.0}
+    return {
+        "total_traders": total_traders,
+        "total_volume": format_usd(totals["trade_volume"] * tft_price),
+        "active_stakes": totals["active_stakes"],
+        "tft_price": format_usd(tft_price),
+    }
@@ -0,0 +1,171 @@
+"""Per-user token-bucket rate limiting for write endpoints.
+
+Each (route, user) pair owns a bucket that holds up to ``capacity`` tokens
+and refills continuously at ``capacity / period`` tokens per second. A
+request spends one token, and a request that finds the bucket empty is
+told how long to wait.
+
+Buckets live behind a ``BucketStore`` so the state can move out of the
+process. ``MemoryBucketStore`` needs no locks: all of its work happens on
+the event loop thread between awaits. Buckets that have refilled completely
+hold no information, so they are swept lazily, in the order they refill,
+and memory stays bounded by the number of recently active users. With
+several workers each would grant the full limit, so they share
+``MongoBucketStore`` instead.
+"""
+import heapq
+import math
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from pymongo import ReturnDocument
+
+
+@dataclass(frozen=True)
+class RateLimit:
+    capacity: float
+    period: float
+
+    @property
+    def rate(self) -> float:
+        return self.capacity / self.period
+
+    @classmethod
+    def parse(cls, spec: str) -> "RateLimit":
+        """Parse ``"<requests>/<seconds>"``, e.g. ``"20/10"`` for 20 requests per 10 seconds."""
+        capacity, _, period = spec.partition("/")
+        limit = cls(float(capacity), float(period or 1))
+        if limit.capacity <= 0 or limit.period <= 0:
+            raise ValueError(f"Invalid rate limit {spec!r}")
+        return limit
+
+
+class BucketStore(ABC):
+    @abstractmethod
+    async def acquire(self, key: str, limit: RateLimit, cost: float = 1) -> float:
+        """Spend ``cost`` tokens from ``key``'s bucket.
+
+        Returns 0 when the request may proceed, otherwise the number of seconds
+        until enough tokens will have refilled.
+        """
+
+
+class MemoryBucketStore(BucketStore):
+    def __init__(self, max_buckets: int = 100000, sweep_interval: float = 1.0,
+                 clock: Callable[[], float] = time.monotonic):
+        self.max_buckets = max_buckets
+        self.sweep_interval = sweep_interval
+        self._clock = clock
+        # key -> (tokens, updated_at, full_at), least recently used first
+        self._buckets: "OrderedDict[str, Tuple[float, float, float]]" = OrderedDict()
+        # (full_at, key) for the sweep; entries of buckets touched since are skipped
+        self._refills: List[Tuple[float, str]] = []
+        self._last_sweep = clock()
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    async def acquire(self, key: str, limit: RateLimit, cost: float = 1) -> float:
+        return self.acquire_nowait(key, limit, cost)
+
+    def acquire_nowait(self, key: str, limit: RateLimit, cost: float = 1) -> float:
+        now = self._clock()
+        if now - self._last_sweep >= self.sweep_interval:
+            self.sweep(now)
+
+        bucket = self._buckets.pop(key, None)
+        if bucket is None:
+            tokens = limit.capacity
+        else:
+            tokens, updated_at, _ = bucket
+            tokens = min(limit.capacity, tokens + (now - updated_at) * limit.rate)
+
+        retry_after = 0.0
+        if tokens >= cost:
+            tokens -= cost
+        else:
+            retry_after = (cost - tokens) / limit.rate
+
+        full_at = now + (limit.capacity - tokens) / limit.rate
+        self._buckets[key] = (tokens, now, full_at)
+        heapq.heappush(self._refills, (full_at, key))
+        if len(self._buckets) > self.max_buckets:
+            self._buckets.popitem(last=False)
+        if len(self._refills) > 2 * len(self._buckets) + 1024:
+            # Mostly stale entries; rebuild from the live buckets
+            self._refills = [(full_at, key) for key, (_, _, full_at) in self._buckets.items()]
+            heapq.heapify(self._refills)
+        return retry_after
+
+    def sweep(self, now: Optional[float] = None) -> int:
+        """Drop buckets that have refilled completely; returns how many were dropped."""
+        now = self._clock() if now is None else now
+        self._last_sweep = now
+        evicted = 0
+        while self._refills and self._refills[0][0] <= now:
+            full_at, key = heapq.heappop(self._refills)
+            bucket = self._buckets.get(key)
+            if bucket is not None and bucket[2] == full_at:
+                del self._buckets[key]
+                evicted += 1
+        return evicted
+
+
+class MongoBucketStore(BucketStore):
+    """Buckets in the ``rate_limits`` collection, shared by every worker.
+
+    Refilling and spending happen in one pipeline update, so concurrent
+    requests from different workers never spend the same token. A bucket
+    is full again one period after it was last touched; a TTL index on
+    ``expires_at`` removes it then. Workers' clocks should agree to within
+    a fraction of the shortest period.
+    """
+
+    def __init__(self, get_db: Callable[[], Any], clock: Callable[[], float] = time.time):
+        self._get_db = get_db
+        self._clock = clock
+
+    async def acquire(self, key: str, limit: RateLimit, cost: float = 1) -> float:
+        now = self._clock()
+        refill = {"$multiply": [{"$max": [0, {"$subtract": [now, {"$ifNull": ["$updated_at", now]}]}]}, limit.rate]}
+        bucket = await self._get_db().rate_limits.find_one_and_update(
+            {"_id": key},
+            [
+                {"$set": {
+                    "tokens": {"$min": [limit.capacity, {"$add": [{"$ifNull": ["$tokens", limit.capacity]}, refill]}]},
+                    "updated_at": now,
+                    "expires_at": datetime.fromtimestamp(now + limit.period, timezone.utc),
+                }},
+                {"$set": {
+                    "granted": {"$gte": ["$tokens", cost]},
+                    "tokens": {"$cond": [{"$gte": ["$tokens", cost]}, {"$subtract": ["$tokens", cost]}, "$tokens"]},
+                }},
+            ],
+            projection={"_id": 0, "tokens": 1, "granted": 1}, upsert=True, return_document=ReturnDocument.AFTER,
+        )
+        return 0.0 if bucket["granted"] else (cost - bucket["tokens"]) / limit.rate
+
+
+# name -> factory taking a callable that returns the database
+BUCKET_STORES: Dict[str, Callable[[Callable[[], Any]], BucketStore]] = {
+    "memory": lambda get_db: MemoryBucketStore(),
+    "mongo": MongoBucketStore,
+}
+
+
+class RateLimiter:
+    def __init__(self, store: BucketStore, limits: Dict[str, RateLimit]):
+        self.store = store
+        self.limits = limits
+
+    async def check(self, route: str, user_id: str) -> int:
+        """Return 0 if ``user_id`` may call ``route`` now, else whole seconds to wait."""
+        limit = self.limits.get(route)
+        if limit is None:
+            return 0
+        retry_after = await self.store.acquire(f"{route}:{user_id}", limit)
+        return math.ceil(retry_after) if retry_after > 0 else 0
@@ -0,0 +1,598 @@
+"""Repositories for users, stakes and trades.
+
+Request handlers and the settlement path reach these collections only
+through the interfaces below, never with inline query dicts. There are two
+implementations:
+
+* ``Motor*`` repositories issue the Mongo queries the indexes in
+  ``indexes.py`` were designed for.
+* ``Memory*`` repositories keep documents in dicts with the same lookups
+  indexed: users by id and email, and each user's stakes and trades in
+  ``SortedList`` indexes ordered like the Mongo pagination indexes. Every
+  method finishes without awaiting, so each call is atomic on the event
+  loop, just as a single-document Mongo write is. Documents come back as
+  copies with naive UTC datetimes, as Motor returns them.
+
+``REPOSITORY_BACKENDS`` maps a backend name to a factory taking the Motor
+database. Batch jobs that stream or aggregate whole collections (rewards
+accrual, maturity, ledger reconciliation, summary rebuilds) still use the
+database directly.
+"""
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError
+from sortedcontainers import SortedList
+
+from pagination import date_range, decode_cursor, encode_cursor, fetch_page
+
+Projection = Optional[Dict[str, int]]
+Page = Tuple[List[dict], Optional[str]]
+
+# Internal bookkeeping fields never leave the repository in listings
+STAKE_PROJECTION = {"_id": 0, "maturity_claim": 0, "maturity_claimed_at": 0}
+TRADE_PROJECTION = {"_id": 0, "close_id": 0}
+
+# Only the fields the dashboard renders cross the wire
+RECENT_TRADE_PROJECTION = {
+    "_id": 0, "id": 1, "symbol": 1, "side": 1, "amount": 1,
+    "price": 1, "status": 1, "pnl": 1, "created_at": 1,
+}
+
+
+class UserRepository(ABC):
+    @abstractmethod
+    async def get(self, user_id: str, projection: Projection = None) -> Optional[dict]:
+        ...
+
+    @abstractmethod
+    async def get_by_email(self, email: str) -> Optional[dict]:
+        ...
+
+    @abstractmethod
+    async def find_many(self, user_ids: Iterable[str], projection: Projection = None) -> List[dict]:
+        ...
+
+    @abstractmethod
+    async def insert(self, user: dict) -> None:
+        """Insert a new user; raises ``DuplicateKeyError`` if the id or email is taken."""
+
+    @abstractmethod
+    async def delete(self, user_id: str) -> None:
+        ...
+
+    @abstractmethod
+    async def update(self, user_id: str, fields: Dict[str, Any],
+                     expected: Optional[Dict[str, Any]] = None) -> Optional[dict]:
+        """Set ``fields`` if the user's current values match ``expected``; returns the updated user."""
+
+    @abstractmethod
+    async def increment(self, user_id: str, inc: Dict[str, float],
+                        min_balance: Optional[float] = None) -> Optional[dict]:
+        """Add ``inc`` to the user's counters in one atomic write.
+
+        With ``min_balance``, the write only applies while ``tft_balance`` is
+        at least that much. Returns the updated user, or None if nothing matched.
+        """
+
+    @abstractmethod
+    async def increment_many(self, incs: Dict[str, Dict[str, float]]) -> None:
+        """Apply one ``increment`` per user, as a single batch."""
+
+
+class StakeRepository(ABC):
+    @abstractmethod
+    async def insert(self, stake: dict) -> None:
+        ...
+
+    @abstractmethod
+    async def delete(self, stake_id: str) -> None:
+        ...
+
+    @abstractmethod
+    async def page(self, user_id: str, cursor: Optional[str], limit: int, is_active: Optional[bool] = None,
+                   start: Optional[datetime] = None, end: Optional[datetime] = None) -> Page:
+        """A user's stakes, newest ``start_date`` first; raises ``InvalidCursor``."""
+
+
+class TradeRepository(ABC):
+    @abstractmethod
+    async def insert_many(self, trades: List[dict]) -> None:
+        ...
+
+    @abstractmethod
+    async def stored_ids(self, trade_ids: Iterable[str]) -> Set[str]:
+        """Which of ``trade_ids`` are stored, e.g. after an ``insert_many`` that failed partway."""
+
+    @abstractmethod
+    async def recent(self, user_id: str, limit: int) -> List[dict]:
+        ...
+
+    @abstractmethod
+    async def page(self, user_id: str, cursor: Optional[str], limit: int, symbol: Optional[str] = None,
+                   status: Optional[str] = None, start: Optional[datetime] = None,
+                   end: Optional[datetime] = None) -> Page:
+        """A user's trades, newest ``created_at`` first; raises ``InvalidCursor``."""
+
+    @abstractmethod
+    def batches(self, user_id: str, batch_size: int, projection: Projection = None, symbol: Optional[str] = None,
+                status: Optional[str] = None, start: Optional[datetime] = None,
+                end: Optional[datetime] = None) -> AsyncIterator[List[dict]]:
+        """All of a user's matching trades, oldest first, ``batch_size`` at a time."""
+
+    @abstractmethod
+    async def open_for_user(self, user_id: str, limit: int) -> List[dict]:
+        ...
+
+    @abstractmethod
+    async def open_positions(self, projection: Projection = None) -> List[dict]:
+        """Every open trade, for rebuilding the matching engine."""
+
+    @abstractmethod
+    async def open_since(self, since: datetime, projection: Projection = None) -> List[dict]:
+        """Open trades created at or after ``since``, for picking up positions other workers opened."""
+
+    @abstractmethod
+    async def get_open(self, user_id: str, trade_id: str, projection: Projection = None) -> Optional[dict]:
+        """The user's trade, if it is still open."""
+
+    @abstractmethod
+    async def close(self, updates: List[Tuple[str, dict]]) -> Set[str]:
+        """Apply ``(trade id, update)`` pairs to trades that are still open.
+
+        Each update carries a ``close_id``. Returns the ids of the trades
+        that hold their update afterwards, including ones that landed in an
+        earlier attempt of the same batch.
+        """
+
+    @abstractmethod
+    async def closed_count(self, user_id: str) -> int:
+        """How many of the user's trades are closed; trades never reopen, so every close changes it."""
+
+    @abstractmethod
+    async def closed(self, user_id: str, projection: Projection = None) -> List[dict]:
+        ...
+
+
+@dataclass
+class Repositories:
+    users: UserRepository
+    stakes: StakeRepository
+    trades: TradeRepository
+
+
+# Motor
+
+class MotorUserRepository(UserRepository):
+    def __init__(self, db):
+        self._users = db.users
+
+    async def get(self, user_id: str, projection: Projection = None) -> Optional[dict]:
+        return await self._users.find_one({"id": user_id}, projection or {"_id": 0})
+
+    async def get_by_email(self, email: str) -> Optional[dict]:
+        return await self._users.find_one({"email": email}, {"_id": 0})
+
+    async def find_many(self, user_ids: Iterable[str], projection: Projection = None) -> List[dict]:
+        return await self._users.find({"id": {"$in": list(user_ids)}}, projection or {"_id": 0}).to_list(length=None)
+
+    async def insert(self, user: dict) -> None:
+        await self._users.insert_one(dict(user))
+
+    async def delete(self, user_id: str) -> None:
+        await self._users.delete_one({"id": user_id})
+
+    async def update(self, user_id: str, fields: Dict[str, Any],
+                     expected: Optional[Dict[str, Any]] = None) -> Optional[dict]:
+        return await self._users.find_one_and_update(
+            {"id": user_id, **(expected or {})}, {"$set": fields},
+            projection={"_id": 0}, return_document=ReturnDocument.AFTER,
+        )
+
+    async def increment(self, user_id: str, inc: Dict[str, float],
+                        min_balance: Optional[float] = None) -> Optional[dict]:
+        query: Dict[str, Any] = {"id": user_id}
+        if min_balance is not None:
+            query["tft_balance"] = {"$gte": min_balance}
+        return await self._users.find_one_and_update(
+            query, {"$inc": inc}, projection={"_id": 0}, return_document=ReturnDocument.AFTER,
+        )
+
+    async def increment_many(self, incs: Dict[str, Dict[str, float]]) -> None:
+        if incs:
+            await self._users.bulk_write(
+                [UpdateOne({"id": user_id}, {"$inc": inc}) for user_id, inc in incs.items()], ordered=False
+            )
+
+
+class MotorStakeRepository(StakeRepository):
+    def __init__(self, db):
+        self._stakes = db.stakes
+
+    async def insert(self, stake: dict) -> None:
+        await self._stakes.insert_one(dict(stake))
+
+    async def delete(self, stake_id: str) -> None:
+        await self._stakes.delete_one({"id": stake_id})
+
+    async def page(self, user_id: str, cursor: Optional[str], limit: int, is_active: Optional[bool] = None,
+                   start: Optional[datetime] = None, end: Optional[datetime] = None) -> Page:
+        query: Dict[str, Any] = {"user_id": user_id}
+        if is_active is not None:
+            query["is_active"] = is_active
+        started = date_range(start, end)
+        if started:
+            query["start_date"] = started
+        return await fetch_page(self._stakes, query, "start_date", cursor, limit, STAKE_PROJECTION)
+
+
+class MotorTradeRepository(TradeRepository):
+    def __init__(self, db):
+        self._trades = db.trades
+
+    async def insert_many(self, trades: List[dict]) -> None:
+        await self._trades.insert_many([dict(trade) for trade in trades])
+
+    async def stored_ids(self, trade_ids: Iterable[str]) -> Set[str]:
+        return {doc["id"] async for doc in self._trades.find({"id": {"$in": list(trade_ids)}}, {"_id": 0, "id": 1})}
+
+    async def recent(self, user_id: str, limit: int) -> List[dict]:
+        cursor = self._trades.find(
+            {"user_id": user_id}, RECENT_TRADE_PROJECTION
+        ).sort([("created_at", -1), ("id", -1)]).limit(limit)
+        return await cursor.to_list(length=limit)
+
+    async def page(self, user_id: str, cursor: Optional[str], limit: int, symbol: Optional[str] = None,
+                   status: Optional[str] = None, start: Optional[datetime] = None,
+                   end: Optional[datetime] = None) -> Page:
+        query = self._query(user_id, symbol, status, start, end)
+        return await fetch_page(self._trades, query, "created_at", cursor, limit, TRADE_PROJECTION)
+
+    async def batches(self, user_id: str, batch_size: int, projection: Projection = None, symbol: Optional[str] = None,
+                      status: Optional[str] = None, start: Optional[datetime] = None,
+                      end: Optional[datetime] = None) -> AsyncIterator[List[dict]]:
+        cursor = self._trades.find(
+            self._query(user_id, symbol, status, start, end), projection or TRADE_PROJECTION, batch_size=batch_size
+        ).sort([("created_at", 1), ("id", 1)])
+        batch = []
+        try:
+            async for trade in cursor:
+                batch.append(trade)
+                if len(batch) == batch_size:
+                    yield batch
+                    batch = []
+            if batch:
+                yield batch
+        finally:
+            await cursor.close()
+
+    @staticmethod
+    def _query(user_id: str, symbol: Optional[str], status: Optional[str], start: Optional[datetime],
+               end: Optional[datetime]) -> Dict[str, Any]:
+        query: Dict[str, Any] = {"user_id": user_id}
+        if symbol:
+            query["symbol"] = symbol
+        if status:
+            query["status"] = status
+        created = date_range(start, end)
+        if created:
+            query["created_at"] = created
+        return query
+
+    async def open_for_user(self, user_id: str, limit: int) -> List[dict]:
+        return await self._trades.find(
+            {"user_id": user_id, "status": "open"}, TRADE_PROJECTION
+        ).sort([("created_at", -1), ("id", -1)]).limit(limit).to_list(length=limit)
+
+    async def open_positions(self, projection: Projection = None) -> List[dict]:
+        cursor = self._trades.find({"status": "open"}, projection or TRADE_PROJECTION, batch_size=10000)
+        return await cursor.to_list(length=None)
+
+    async def open_since(self, since: datetime, projection: Projection = None) -> List[dict]:
+        cursor = self._trades.find({"status": "open", "created_at": {"$gte": since}}, projection or TRADE_PROJECTION)
+        return await cursor.to_list(length=None)
+
+    async def get_open(self, user_id: str, trade_id: str, projection: Projection = None) -> Optional[dict]:
+        return await self._trades.find_one(
+            {"id": trade_id, "user_id": user_id, "status": "open"}, projection or TRADE_PROJECTION
+        )
+
+    async def close(self, updates: List[Tuple[str, dict]]) -> Set[str]:
+        if not updates:
+            return set()
+        result = await self._trades.bulk_write([
+            UpdateOne({"id": trade_id, "status": "open"}, {"$set": update}) for trade_id, update in updates
+        ], ordered=False)
+        if result.modified_count == len(updates):
+            return {trade_id for trade_id, _ in updates}
+        return {
+            trade["id"] async for trade in self._trades.find(
+                {"id": {"$in": [trade_id for trade_id, _ in updates]},
+                 "close_id": {"$in": [update["close_id"] for _, update in updates]}},
+                {"_id": 0, "id": 1},
+            )
+        }
+
+    async def closed_count(self, user_id: str) -> int:
+        return await self._trades.count_documents({"user_id": user_id, "status": "closed"})
+
+    async def closed(self, user_id: str, projection: Projection = None) -> List[dict]:
+        cursor = self._trades.find({"user_id": user_id, "status": "closed"}, projection or TRADE_PROJECTION,
+                                   batch_size=10000)
+        return await cursor.to_list(length=None)
+
+
+def motor_repositories(db) -> Repositories:
+    return Repositories(MotorUserRepository(db), MotorStakeRepository(db), MotorTradeRepository(db))
+
+
+# In memory
+
+def _naive_utc(value: Any) -> Any:
+    if isinstance(value, datetime) and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def _stored(doc: Dict[str, Any]) -> Dict[str, Any]:
+    return {field: _naive_utc(value) for field, value in doc.items() if field != "_id"}
+
+
+def _project(doc: dict, projection: Projection) -> dict:
+    fields = {field: keep for field, keep in (projection or {}).items() if field != "_id"}
+    if any(fields.values()):
+        return {field: doc[field] for field, keep in fields.items() if keep and field in doc}
+    return {field: value for field, value in doc.items() if field not in fields}
+
+
+def _page(index: SortedList, docs: Dict[str, dict], sort_field: str, cursor: Optional[str], limit: int,
+          start: Optional[datetime], end: Optional[datetime], match: Callable[[dict], bool],
+          projection: Projection) -> Page:
+    """Walk a ``(timestamp, id)`` index newest first, like ``fetch_page`` does in Mongo."""
+    stop = len(index)
+    if end is not None:
+        stop = index.bisect_left((_naive_utc(end), ""))
+    if cursor:
+        timestamp, row_id = decode_cursor(cursor)
+        stop = min(stop, index.bisect_left((_naive_utc(timestamp), row_id)))
+    start = _naive_utc(start)
+    rows: List[dict] = []
+    for timestamp, row_id in index.islice(0, stop, reverse=True):
+        if start is not None and timestamp < start:
+            break
+        doc = docs[row_id]
+        if match(doc):
+            rows.append(doc)
+            if len(rows) > limit:
+                break
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1][sort_field], rows[-1]["id"])
+    return [_project(row, projection) for row in rows], next_cursor
+
+
+def _trade_filter(symbol: Optional[str], status: Optional[str]) -> Callable[[dict], bool]:
+    def match(trade: dict) -> bool:
+        return (not symbol or trade["symbol"] == symbol) and (not status or trade.get("status") == status)
+    return match
+
+
+def _duplicate(field: str, value: Any) -> DuplicateKeyError:
+    return DuplicateKeyError(f"E11000 duplicate key error dup key: {{ {field}: {value!r} }}", 11000)
+
+
+class MemoryUserRepository(UserRepository):
+    def __init__(self):
+        self._users: Dict[str, dict] = {}
+        self._ids_by_email: Dict[str, str] = {}
+
+    def __len__(self) -> int:
+        return len(self._users)
+
+    async def get(self, user_id: str, projection: Projection = None) -> Optional[dict]:
+        user = self._users.get(user_id)
+        return None if user is None else _project(user, projection)
+
+    async def get_by_email(self, email: str) -> Optional[dict]:
+        user_id = self._ids_by_email.get(email)
+        return None if user_id is None else dict(self._users[user_id])
+
+    async def find_many(self, user_ids: Iterable[str], projection: Projection = None) -> List[dict]:
+        return [_project(self._users[user_id], projection) for user_id in user_ids if user_id in self._users]
+
+    async def insert(self, user: dict) -> None:
+        if user["id"] in self._users:
+            raise _duplicate("id", user["id"])
+        if user["email"] in self._ids_by_email:
+            raise _duplicate("email", user["email"])
+        self._users[user["id"]] = _stored(user)
+        self._ids_by_email[user["email"]] = user["id"]
+
+    async def delete(self, user_id: str) -> None:
+        user = self._users.pop(user_id, None)
+        if user is not None:
+            self._ids_by_email.pop(user["email"], None)
+
+    async def update(self, user_id: str, fields: Dict[str, Any],
+                     expected: Optional[Dict[str, Any]] = None) -> Optional[dict]:
+        user = self._users.get(user_id)
+        if user is None or any(user.get(field) != value for field, value in (expected or {}).items()):
+            return None
+        if "email" in fields and fields["email"] != user["email"]:
+            if fields["email"] in self._ids_by_email:
+                raise _duplicate("email", fields["email"])
+            del self._ids_by_email[user["email"]]
+            self._ids_by_email[fields["email"]] = user_id
+        user.update(_stored(fields))
+        return dict(user)
+
+    async def increment(self, user_id: str, inc: Dict[str, float],
+                        min_balance: Optional[float] = None) -> Optional[dict]:
+        user = self._users.get(user_id)
+        if user is None or (min_balance is not None and user.get("tft_balance", 0.0) < min_balance):
+            return None
+        for field, amount in inc.items():
+            user[field] = user.get(field, 0) + amount
+        return dict(user)
+
+    async def increment_many(self, incs: Dict[str, Dict[str, float]]) -> None:
+        for user_id, inc in incs.items():
+            await self.increment(user_id, inc)
+
+
+class MemoryStakeRepository(StakeRepository):
+    def __init__(self):
+        self._stakes: Dict[str, dict] = {}
+        # user_id -> (start_date, id)
+        self._by_user: Dict[str, SortedList] = {}
+
+    def __len__(self) -> int:
+        return len(self._stakes)
+
+    async def insert(self, stake: dict) -> None:
+        if stake["id"] in self._stakes:
+            raise _duplicate("id", stake["id"])
+        stored = _stored(stake)
+        self._stakes[stake["id"]] = stored
+        self._by_user.setdefault(stored["user_id"], SortedList()).add((stored["start_date"], stored["id"]))
+
+    async def delete(self, stake_id: str) -> None:
+        stake = self._stakes.pop(stake_id, None)
+        if stake is not None:
+            self._by_user[stake["user_id"]].discard((stake["start_date"], stake_id))
+
+    async def page(self, user_id: str, cursor: Optional[str], limit: int, is_active: Optional[bool] = None,
+                   start: Optional[datetime] = None, end: Optional[datetime] = None) -> Page:
+        return _page(
+            self._by_user.get(user_id, SortedList()), self._stakes, "start_date", cursor, limit, start, end,
+            lambda stake: is_active is None or stake.get("is_active") == is_active, STAKE_PROJECTION,
+        )
+
+
+class MemoryTradeRepository(TradeRepository):
+    def __init__(self):
+        self._trades: Dict[str, dict] = {}
+        # user_id -> (created_at, id), for all trades and for open ones
+        self._by_user: Dict[str, SortedList] = {}
+        self._open_by_user: Dict[str, SortedList] = {}
+
+    def __len__(self) -> int:
+        return len(self._trades)
+
+    async def insert_many(self, trades: List[dict]) -> None:
+        ids = [trade["id"] for trade in trades]
+        duplicate = next((trade_id for trade_id in ids if trade_id in self._trades), None)
+        if duplicate is not None or len(set(ids)) != len(ids):
+            raise _duplicate("id", duplicate)
+        for trade in trades:
+            stored = _stored(trade)
+            self._trades[stored["id"]] = stored
+            key = (stored["created_at"], stored["id"])
+            self._by_user.setdefault(stored["user_id"], SortedList()).add(key)
+            if stored.get("status") == "open":
+                self._open_by_user.setdefault(stored["user_id"], SortedList()).add(key)
+
+    async def stored_ids(self, trade_ids: Iterable[str]) -> Set[str]:
+        return {trade_id for trade_id in trade_ids if trade_id in self._trades}
+
+    async def recent(self, user_id: str, limit: int) -> List[dict]:
+        index = self._by_user.get(user_id, SortedList())
+        return [
+            _project(self._trades[trade_id], RECENT_TRADE_PROJECTION)
+            for _, trade_id in index.islice(max(0, len(index) - limit), len(index), reverse=True)
+        ]
+
+    async def page(self, user_id: str, cursor: Optional[str], limit: int, symbol: Optional[str] = None,
+                   status: Optional[str] = None, start: Optional[datetime] = None,
+                   end: Optional[datetime] = None) -> Page:
+        return _page(self._by_user.get(user_id, SortedList()), self._trades, "created_at", cursor, limit,
+                     start, end, _trade_filter(symbol, status), TRADE_PROJECTION)
+
+    async def batches(self, user_id: str, batch_size: int, projection: Projection = None, symbol: Optional[str] = None,
+                      status: Optional[str] = None, start: Optional[datetime] = None,
+                      end: Optional[datetime] = None) -> AsyncIterator[List[dict]]:
+        match = _trade_filter(symbol, status)
+        index = self._by_user.get(user_id, SortedList())
+        # Each batch re-seeks past the last key it scanned, so trades inserted
+        # while the consumer is busy never invalidate the walk
+        position = 0 if start is None else index.bisect_left((_naive_utc(start), ""))
+        while True:
+            stop = len(index) if end is None else index.bisect_left((_naive_utc(end), ""))
+            batch, scanned = [], None
+            for scanned in index.islice(position, stop):
+                trade = self._trades[scanned[1]]
+                if match(trade):
+                    batch.append(_project(trade, projection or TRADE_PROJECTION))
+                    if len(batch) == batch_size:
+                        break
+            if batch:
+                yield batch
+            if scanned is None or len(batch) < batch_size:
+                return
+            position = index.bisect_right(scanned)
+
+    async def open_for_user(self, user_id: str, limit: int) -> List[dict]:
+        index = self._open_by_user.get(user_id, SortedList())
+        return [
+            _project(self._trades[trade_id], TRADE_PROJECTION)
+            for _, trade_id in index.islice(max(0, len(index) - limit), len(index), reverse=True)
+        ]
+
+    async def open_positions(self, projection: Projection = None) -> List[dict]:
+        return [
+            _project(self._trades[trade_id], projection or TRADE_PROJECTION)
+            for index in self._open_by_user.values() for _, trade_id in index
+        ]
+
+    async def open_since(self, since: datetime, projection: Projection = None) -> List[dict]:
+        key = (_naive_utc(since), "")
+        return [
+            _project(self._trades[trade_id], projection or TRADE_PROJECTION)
+            for index in self._open_by_user.values() for _, trade_id in index.irange(minimum=key)
+        ]
+
+    async def get_open(self, user_id: str, trade_id: str, projection: Projection = None) -> Optional[dict]:
+        trade = self._trades.get(trade_id)
+        if trade is None or trade["user_id"] != user_id or trade.get("status") != "open":
+            return None
+        return _project(trade, projection or TRADE_PROJECTION)
+
+    async def close(self, updates: List[Tuple[str, dict]]) -> Set[str]:
+        landed = set()
+        for trade_id, update in updates:
+            trade = self._trades.get(trade_id)
+            if trade is None:
+                continue
+            if trade.get("status") == "open":
+                self._open_by_user[trade["user_id"]].discard((trade["created_at"], trade_id))
+                trade.update(_stored(update))
+                landed.add(trade_id)
+            elif trade.get("close_id") == update["close_id"]:
+                landed.add(trade_id)
+        return landed
+
+    async def closed_count(self, user_id: str) -> int:
+        return sum(
+            self._trades[trade_id].get("status") == "closed" for _, trade_id in self._by_user.get(user_id, ())
+        )
+
+    async def closed(self, user_id: str, projection: Projection = None) -> List[dict]:
+        return [
+            _project(self._trades[trade_id], projection or TRADE_PROJECTION)
+            for _, trade_id in self._by_user.get(user_id, SortedList())
+            if self._trades[trade_id].get("status") == "closed"
+        ]
+
+
+def memory_repositories(db=None) -> Repositories:
+    return Repositories(MemoryUserRepository(), MemoryStakeRepository(), MemoryTradeRepository())
+
+
+REPOSITORY_BACKENDS: Dict[str, Callable[[Any], Repositories]] = {
+    "motor": motor_repositories,
+    "memory": memory_repositories,
+}
@@ -0,0 +1,144 @@
+"""Staking rewards accrual.
+
+Rewards accrue as simple interest on the staked amount at the annual rate of
+the stake's duration tier, from ``start_date`` up to ``end_date``. The job
+streams active stakes in large batches, computes every stake's
+``rewards_earned`` as of one instant with NumPy, and writes the results back
+with unordered bulk writes. Because it recomputes absolute values, re-running
+it is always safe.
+
+Run ``python rewards.py`` from the backend directory for a one-off pass.
+"""
+import argparse
+import asyncio
+import os
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import UpdateOne
+
+from portfolio import rebuild_summaries
+
+# duration_days -> annual reward rate
+STAKING_APR: Dict[int, float] = {14: 0.02, 30: 0.04, 90: 0.07, 180: 0.10, 360: 0.15}
+
+ACCRUAL_BATCH_SIZE = 10000
+
+ACCRUAL_PROJECTION = {
+    "_id": 0, "id": 1, "user_id": 1, "amount": 1, "duration_days": 1,
+    "start_date": 1, "end_date": 1, "rewards_earned": 1,
+}
+
+_TIERS = np.array(sorted(STAKING_APR), dtype=np.int64)
+_TIER_RATES = np.array([STAKING_APR[tier] for tier in _TIERS], dtype=np.float64)
+_DAY = np.timedelta64(1, "D")
+
+
+def tier_rates(duration_days: np.ndarray) -> np.ndarray:
+    """Annual rate for each stake; unknown durations earn nothing."""
+    index = np.clip(np.searchsorted(_TIERS, duration_days), 0, len(_TIERS) - 1)
+    return np.where(_TIERS[index] == duration_days, _TIER_RATES[index], 0.0)
+
+
+def accrued_rewards(amount: np.ndarray, duration_days: np.ndarray, start_date: np.ndarray,
+                    end_date: np.ndarray, as_of: np.datetime64) -> np.ndarray:
+    elapsed_days = (np.minimum(end_date, as_of) - start_date) / _DAY
+    return np.round(amount * tier_rates(duration_days) * np.clip(elapsed_days, 0, None) / 365.0, 8)
+
+
+def _datetime_column(values: List[datetime]) -> np.ndarray:
+    # Mongo hands back naive UTC datetimes; NumPy datetime64 has no timezone
+    return pd.to_datetime(values, utc=True).tz_convert(None).values.astype("datetime64[ms]")
+
+
+def compute_batch(docs: List[dict], as_of: datetime) -> Dict[str, np.ndarray]:
+    """Column-convert one batch of stake documents and compute its rewards."""
+    amount = np.fromiter((doc["amount"] for doc in docs), dtype=np.float64, count=len(docs))
+    duration_days = np.fromiter((doc["duration_days"] for doc in docs), dtype=np.int64, count=len(docs))
+    previous = np.fromiter((doc.get("rewards_earned", 0.0) for doc in docs), dtype=np.float64, count=len(docs))
+    start_date = _datetime_column([doc["start_date"] for doc in docs])
+    end_date = _datetime_column([doc["end_date"] for doc in docs])
+    rewards = accrued_rewards(amount, duration_days, start_date, end_date, _datetime_column([as_of])[0])
+    return {"rewards": rewards, "previous": previous, "changed": np.abs(rewards - previous) > 1e-9}
+
+
+async def _write_batch(db, docs: List[dict], as_of: datetime) -> int:
+    batch = compute_batch(docs, as_of)
+    changed = np.flatnonzero(batch["changed"])
+    if len(changed) == 0:
+        return 0
+
+    rewards, previous = batch["rewards"], batch["previous"]
+    # Only overwrite the value this batch read, so concurrent runs or maturity
+    # settlement never have their result clobbered
+    stake_writes = [
+        UpdateOne(
+            {"id": docs[i]["id"], "is_active": True, "rewards_earned": docs[i].get("rewards_earned", 0.0)},
+            {"$set": {"rewards_earned": float(rewards[i]), "rewards_accrued_at": as_of}},
+        )
+        for i in changed.tolist()
+    ]
+    result = await db.stakes.bulk_write(stake_writes, ordered=False)
+
+    user_ids = np.array([docs[i]["user_id"] for i in changed.tolist()], dtype=object)
+    users, inverse = np.unique(user_ids, return_inverse=True)
+    if result.modified_count == len(stake_writes):
+        deltas = np.bincount(inverse, weights=rewards[changed] - previous[changed])
+        await db.portfolio_summary.bulk_write([
+            UpdateOne({"user_id": user_id}, {"$inc": {"total_rewards": float(delta)}}, upsert=True)
+            for user_id, delta in zip(users.tolist(), deltas.tolist())
+        ], ordered=False)
+    else:
+        for user_id in users.tolist():
+            await rebuild_summaries(db, user_id)
+    return result.modified_count
+
+
+async def run_accrual(db, as_of: Optional[datetime] = None,
+                      batch_size: int = ACCRUAL_BATCH_SIZE) -> Dict[str, float]:
+    """Accrue rewards on every active stake as of ``as_of`` (default: now)."""
+    as_of = as_of or datetime.now(timezone.utc)
+    started = time.perf_counter()
+    processed = updated = 0
+    docs: List[dict] = []
+    async for doc in db.stakes.find({"is_active": True}, ACCRUAL_PROJECTION).batch_size(batch_size):
+        docs.append(doc)
+        if len(docs) >= batch_size:
+            updated += await _write_batch(db, docs, as_of)
+            processed += len(docs)
+            docs = []
+    if docs:
+        updated += await _write_batch(db, docs, as_of)
+        processed += len(docs)
+
+    elapsed = time.perf_counter() - started
+    return {
+        "processed": processed,
+        "updated": updated,
+        "seconds": elapsed,
+        "stakes_per_second": processed / elapsed if elapsed else 0.0,
+    }
+
+
+async def main(batch_size: int) -> None:
+    load_dotenv(Path(__file__).parent / ".env")
+    client = AsyncIOMotorClient(os.environ["MONGO_URL"])
+    try:
+        stats = await run_accrual(client[os.environ["DB_NAME"]], batch_size=batch_size)
+        print(f"Accrued {stats['processed']} stakes ({stats['updated']} updated) "
+              f"in {stats['seconds']:.2f}s, {stats['stakes_per_second']:.0f} stakes/s")
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Accrue staking rewards on all active stakes")
+    parser.add_argument("--batch-size", type=int, default=ACCRUAL_BATCH_SIZE)
+    args = parser.parse_args()
+    asyncio.run(main(args.batch_size))
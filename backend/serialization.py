@@ -0,0 +1,60 @@
+"""Fast JSON response path.
+
+FastAPI normally runs every return value through ``jsonable_encoder`` and
+re-validates it against ``response_model`` before the response class encodes
+it again. Routes built with ``FastJSONRoute`` skip both steps. Plain
+dicts and lists from Mongo go straight to orjson, which encodes datetimes
+natively. Pydantic models are written by their compiled pydantic-core
+serializer.
+"""
+import asyncio
+import functools
+from typing import Any, Callable
+
+import orjson
+from fastapi.responses import JSONResponse, Response
+from fastapi.routing import APIRoute
+from pydantic import BaseModel
+
+ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, BaseModel):
+        return value.model_dump()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def dumps(content: Any) -> bytes:
+    if isinstance(content, BaseModel):
+        return content.__pydantic_serializer__.to_json(content)
+    return orjson.dumps(content, default=_default, option=ORJSON_OPTIONS)
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+class FastJSONRoute(APIRoute):
+    """APIRoute that encodes endpoint results directly with FastJSONResponse.
+
+    ``response_model`` still documents the response in OpenAPI, but is not
+    used to re-validate what the endpoint already built from typed models.
+    """
+
+    def __init__(self, path: str, endpoint: Callable[..., Any], **kwargs: Any):
+        if asyncio.iscoroutinefunction(endpoint):
+            endpoint = self._wrap(endpoint, kwargs.get("status_code") or 200)
+        super().__init__(path, endpoint, **kwargs)
+
+    @staticmethod
+    def _wrap(endpoint: Callable[..., Any], status_code: int) -> Callable[..., Any]:
+        @functools.wraps(endpoint)
+        async def encode_result(*args: Any, **kwargs: Any) -> Response:
+            content = await endpoint(*args, **kwargs)
+            if isinstance(content, Response):
+                return content
+            return FastJSONResponse(content, status_code=status_code)
+
+        return encode_result
@@ -0,0 +1,48 @@
+"""Multi-worker entry point for the API.
+
+Run ``python serve.py --workers 4`` from the backend directory. Each worker
+is a separate process that imports ``server`` and calls ``create_app()``,
+so every worker opens its own Mongo connection pool in its startup hook.
+``--workers`` defaults to ``WEB_CONCURRENCY``, or one per CPU core, and is
+passed on to the workers as ``WEB_CONCURRENCY``.
+
+The same factory works under gunicorn, with or without ``--preload``. Set
+the worker count through ``WEB_CONCURRENCY`` so the workers see it too::
+
+    WEB_CONCURRENCY=4 gunicorn -k uvicorn.workers.UvicornWorker -b 0.0.0.0:8001 'server:create_app()'
+
+The price feed and the matching engine run in the one worker that holds
+the trading lease (see ``leader.py``); the others follow its quotes and
+hand it the positions they open through Mongo. The remaining background
+jobs run in every worker and are safe to overlap. With more than one
+worker, rate-limit buckets move to Mongo and the authenticated user cache
+is turned off; the README lists the state that stays per process.
+
+Connection settings come from the environment and are described in
+``settings.py``. Keep ``MONGO_MAX_POOL_SIZE`` times the worker count within
+what the Mongo deployment accepts.
+"""
+import argparse
+import os
+
+import uvicorn
+
+
+def default_workers() -> int:
+    return int(os.getenv("WEB_CONCURRENCY", "0")) or os.cpu_count() or 1
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Serve the Averix API with several worker processes")
+    parser.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8001")))
+    parser.add_argument("--workers", type=int, default=default_workers())
+    args = parser.parse_args()
+    # Workers size their per-process state from it
+    os.environ["WEB_CONCURRENCY"] = str(args.workers)
+    uvicorn.run("server:create_app", factory=True, host=args.host, port=args.port, workers=args.workers,
+                app_dir=os.path.dirname(os.path.abspath(__file__)))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,13 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, status
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, Header, Query, WebSocket, WebSocketDisconnect, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo.errors import DuplicateKeyError
 import os
+import asyncio
+import json
 import logging
 from pathlib import Path
 from pydantic import BaseModel, Field, EmailStr
@@ -11,9 +15,30 @@ from typing import List, Optional
 import uuid
 from datetime import datetime, timedelta, timezone
 import jwt
-import hashlib
 import secrets
 # Removed passlib
+from user_cache import UserCache
+from passwords import PasswordHasher
+from indexes import ensure_indexes
+from portfolio import create_summary, get_summary, rebuild_summaries, record_stake, record_trades
+from rewards import run_accrual
+from maturity import MaturityProcessor
+from price_book import PRICE_SOURCES, PriceBook, SharedPriceSource, save_quotes
+from matching import OPEN_POSITION_PROJECTION, ClosedPosition, MatchingEngine, SettlementIncomplete, close_trades, credit_closes, load_open_positions, pnl_by_user, position_from_trade
+from leader import LeaderLease
+from streaming import StreamHub, price_message
+from public_stats import SnapshotCache, compute_public_stats
+from serialization import FastJSONResponse, FastJSONRoute, dumps
+from pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, InvalidCursor
+from analytics import INTERVALS, AnalyticsCache, TooManyBuckets, pnl_report
+from leaderboard import METRICS, Leaderboard, display_name, is_promotion, metric_value, reconcile, trading_level, win_rate
+from ledger import LedgerWriter, ledger_balance, ledger_entry, reconcile_ledger
+from rate_limit import BUCKET_STORES, RateLimit, RateLimiter
+from metrics import CallbackGauge, Counter, MetricsMiddleware, MetricsRegistry, MongoCommandMetrics, RequestMetrics
+from settings import Settings
+from repositories import REPOSITORY_BACKENDS, Repositories
+from export import EXPORT_BATCH_SIZE, EXPORT_FORMATS, EXPORT_PROJECTION
+from idempotency import MAX_KEY_LENGTH, IdempotencyInProgress, IdempotencyMismatch, IdempotencyStore, StoredResponse, fingerprint
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
@@ -23,14 +48,165 @@ security = HTTPBearer()
 SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-here")
 ALGORITHM = "HS256"
 
-# MongoDB connection
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
+# Metrics
+metrics_registry = MetricsRegistry()
+request_metrics = RequestMetrics(metrics_registry)
+mongo_metrics = MongoCommandMetrics(metrics_registry)
 
-# Create the main app
-app = FastAPI(title="Averix API", version="1.0.0")
-api_router = APIRouter(prefix="/api")
+# Worker processes serving the API; serve.py sets it for its workers, and
+# gunicorn takes its worker count from it too
+WORKERS = int(os.getenv("WEB_CONCURRENCY", "1"))
+
+# MongoDB connection, opened by each worker's startup hook (see create_app)
+settings: Optional[Settings] = None
+client: Optional[AsyncIOMotorClient] = None
+db = None
+# Users, stakes and trades, as the request handlers see them
+repos: Optional[Repositories] = None
+# Set once every startup hook has run; gates the readiness probe
+startup_complete = False
+
+# Market data
+price_book = PriceBook()
+price_source = PRICE_SOURCES[os.getenv("PRICE_SOURCE", "simulated")]()
+stream_hub = StreamHub(max_pending_fills=int(os.getenv("STREAM_MAX_PENDING_FILLS", "100")))
+price_book.add_listener(stream_hub.publish_price)
+
+# Open positions, closed by price ticks crossing their stop loss or take profit
+matching_engine = MatchingEngine()
+settlement_wakeup = asyncio.Event()
+settlement_stopping = asyncio.Event()
+SETTLEMENT_BATCH_SIZE = int(os.getenv("SETTLEMENT_BATCH_SIZE", "1000"))
+# Closes from one burst of ticks are settled together
+SETTLEMENT_DELAY_SECONDS = float(os.getenv("SETTLEMENT_DELAY_SECONDS", "0.05"))
+
+# Trading runs in the one worker holding this lease: it runs the price feed
+# and the matching engine, and writes its quotes for the other workers to follow
+trading_lease = LeaderLease(lambda: db.leases, "trading", ttl=float(os.getenv("TRADING_LEASE_SECONDS", "15")))
+shared_prices = SharedPriceSource(lambda: db.prices, interval=float(os.getenv("SHARED_PRICES_INTERVAL_SECONDS", "1")))
+# How often, and how far back, the leader looks for positions other workers opened
+POSITION_SYNC_SECONDS = float(os.getenv("POSITION_SYNC_SECONDS", "1"))
+POSITION_SYNC_WINDOW = timedelta(seconds=float(os.getenv("POSITION_SYNC_WINDOW_SECONDS", "300")))
+
+def match_quote(quote):
+    if trading_lease.is_leader and matching_engine.on_quote(quote):
+        settlement_wakeup.set()
+
+price_book.add_listener(match_quote)
+
+# Balance ledger; entries from concurrent requests are written together
+ledger_writer = LedgerWriter(
+    lambda: db,
+    max_batch=int(os.getenv("LEDGER_BATCH_SIZE", "500")),
+    max_delay=float(os.getenv("LEDGER_FLUSH_DELAY_SECONDS", "0.002")),
+)
+LEDGER_RECONCILE_SECONDS = float(os.getenv("LEDGER_RECONCILE_SECONDS", "3600"))
+WELCOME_BONUS = 1000.0
+
+# Public stats snapshot, refreshed in the background
+TFT_PRICE = float(os.getenv("TFT_PRICE", "0.45"))
+PUBLIC_STATS_REFRESH_SECONDS = float(os.getenv("PUBLIC_STATS_REFRESH_SECONDS", "30"))
+public_stats = SnapshotCache(
+    lambda: compute_public_stats(db, TFT_PRICE),
+    max_staleness=float(os.getenv("PUBLIC_STATS_MAX_STALENESS_SECONDS", "120")),
+)
+
+# Password hashing runs in its own thread pool, off the event loop
+password_hasher = PasswordHasher(
+    rounds=int(os.getenv("BCRYPT_ROUNDS", "12")),
+    max_workers=int(os.getenv("PASSWORD_HASH_WORKERS", "4")),
+)
+
+# Authenticated user cache, filled by lookups only; every write to a user
+# invalidates it. That only reaches the worker that made the write, so with
+# several workers it is off rather than stale
+user_cache = UserCache(
+    max_size=int(os.getenv("USER_CACHE_MAX_SIZE", "10000")) if WORKERS == 1 else 0,
+    ttl_seconds=float(os.getenv("USER_CACHE_TTL_SECONDS", "30")),
+)
+
+# Stakes past their end date return principal and rewards to the balance
+def invalidate_users(user_ids):
+    for user_id in user_ids:
+        user_cache.invalidate(user_id)
+
+maturity_processor = MaturityProcessor(
+    batch_size=int(os.getenv("MATURITY_BATCH_SIZE", "1000")),
+    claim_timeout=float(os.getenv("MATURITY_CLAIM_TIMEOUT_SECONDS", "300")),
+    on_matured=invalidate_users,
+)
+MATURITY_INTERVAL_SECONDS = float(os.getenv("MATURITY_INTERVAL_SECONDS", "30"))
+
+# Trader rankings, rebuilt from portfolio_summary in the background
+leaderboard = Leaderboard()
+LEADERBOARD_RECONCILE_SECONDS = float(os.getenv("LEADERBOARD_RECONCILE_SECONDS", "300"))
+MAX_LEADERBOARD_SIZE = 100
+
+# Dashboard totals in portfolio_summary, rebuilt from stakes and trades in
+# the background to repair updates that failed
+PORTFOLIO_REBUILD_SECONDS = float(os.getenv("PORTFOLIO_REBUILD_SECONDS", "3600"))
+
+# Per-user trade columns for analytics, reused until the user trades again
+analytics_cache = AnalyticsCache(
+    max_size=int(os.getenv("ANALYTICS_CACHE_MAX_SIZE", "1000")),
+    ttl_seconds=float(os.getenv("ANALYTICS_CACHE_TTL_SECONDS", "600")),
+)
+
+# Per-user write limits, as "<requests>/<seconds>"; workers share their buckets in Mongo
+rate_limiter = RateLimiter(
+    BUCKET_STORES[os.getenv("RATE_LIMIT_STORE", "memory" if WORKERS == 1 else "mongo")](lambda: db),
+    {
+        "place-order": RateLimit.parse(os.getenv("RATE_LIMIT_PLACE_ORDER", "20/10")),
+        "place-orders": RateLimit.parse(os.getenv("RATE_LIMIT_PLACE_ORDERS", "5/10")),
+        "stake": RateLimit.parse(os.getenv("RATE_LIMIT_STAKE", "10/60")),
+        "export": RateLimit.parse(os.getenv("RATE_LIMIT_EXPORT", "5/60")),
+    },
+)
+rate_limited_requests = metrics_registry.register(Counter(
+    "averix_rate_limited_total", "Requests rejected by the per-user rate limiter.", ("route",)))
+
+# Responses to write requests, replayed to retries carrying the same Idempotency-Key
+idempotency_store = IdempotencyStore(
+    lambda: db,
+    ttl_seconds=float(os.getenv("IDEMPOTENCY_TTL_SECONDS", "86400")),
+    pending_timeout=float(os.getenv("IDEMPOTENCY_PENDING_TIMEOUT_SECONDS", "60")),
+    pending_ttl=float(os.getenv("IDEMPOTENCY_PENDING_TTL_SECONDS", "3600")),
+    cache_size=int(os.getenv("IDEMPOTENCY_CACHE_MAX_SIZE", "10000")),
+)
+idempotent_replays = metrics_registry.register(Counter(
+    "averix_idempotent_replays_total", "Stored responses returned to retried requests.", ("route",)))
+
+metrics_registry.register(CallbackGauge(
+    "averix_stream_connections", "Open WebSocket stream connections.", lambda: stream_hub.connections))
+metrics_registry.register(CallbackGauge(
+    "averix_open_positions", "Positions held by the matching engine.", lambda: len(matching_engine)))
+metrics_registry.register(CallbackGauge(
+    "averix_trading_leader", "1 if this worker holds the trading lease.", lambda: int(trading_lease.is_leader)))
+metrics_registry.register(CallbackGauge(
+    "averix_pending_settlements", "Closed positions waiting to be written.", lambda: len(matching_engine.pending)))
+metrics_registry.register(CallbackGauge(
+    "averix_stake_maturity_backlog", "Due stakes still active after the last maturity pass.",
+    lambda: maturity_processor.backlog))
+metrics_registry.register(CallbackGauge(
+    "averix_stake_maturity_lag_seconds", "How overdue the oldest unsettled stake was after the last maturity pass.",
+    lambda: maturity_processor.lag_seconds))
+# Cache statistics; the scrape endpoint is the only place they are exposed
+metrics_registry.register(CallbackGauge(
+    "averix_user_cache_hit_rate", "Authenticated user cache hit rate.", lambda: user_cache.stats()["hit_rate"]))
+metrics_registry.register(CallbackGauge(
+    "averix_user_cache_entries", "Users in the authenticated user cache.", lambda: user_cache.stats()["size"]))
+metrics_registry.register(CallbackGauge(
+    "averix_analytics_cache_hit_rate", "Analytics column cache hit rate.", lambda: analytics_cache.stats()["hit_rate"]))
+metrics_registry.register(CallbackGauge(
+    "averix_analytics_cache_entries", "Users in the analytics column cache.", lambda: analytics_cache.stats()["size"]))
+metrics_registry.register(CallbackGauge(
+    "averix_idempotency_in_flight", "Idempotent requests running in this worker.", lambda: idempotency_store.in_flight))
+metrics_registry.register(CallbackGauge(
+    "averix_idempotency_store_failures", "Completed idempotent requests whose response could not be stored.",
+    lambda: idempotency_store.store_failures))
+
+# Routes; create_app mounts them on a new app
+api_router = APIRouter(prefix="/api", route_class=FastJSONRoute)
 
 # Models
 class UserCreate(BaseModel):
@@ -52,6 +228,7 @@ class User(BaseModel):
     is_active: bool = True
     tft_balance: float = 0.0
     staked_amount: float = 0.0
+    open_margin: float = 0.0
     trading_level: str = "Bronze"
     total_trades: int = 0
     successful_trades: int = 0
@@ -69,12 +246,13 @@ class Stake(BaseModel):
     end_date: datetime
     is_active: bool = True
     rewards_earned: float = 0.0
+    matured_at: Optional[datetime] = None
 
 class TradeRequest(BaseModel):
     symbol: str
     side: str  # "buy" or "sell"
     amount: float
-    price: float
+    price: Optional[float] = None  # expected price; orders fill at the book price
     stop_loss: Optional[float] = None
     take_profit: Optional[float] = None
 
@@ -90,7 +268,10 @@ class Trade(BaseModel):
     status: str = "open"  # "open", "closed", "cancelled"
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     closed_at: Optional[datetime] = None
+    close_price: Optional[float] = None
+    close_reason: Optional[str] = None  # "stop_loss", "take_profit" or "manual"
     pnl: float = 0.0
+    margin: float = 0.0  # balance locked while the position is open
 
 class TokenResponse(BaseModel):
     access_token: str
@@ -98,14 +279,6 @@ class TokenResponse(BaseModel):
     user: dict
 
 # Utility functions  
-def hash_password(password: str) -> str:
-    # Simple SHA-256 hashing with salt for demo
-    salt = "averix_salt_2025"
-    return hashlib.sha256((password + salt).encode()).hexdigest()
-
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return hash_password(plain_password) == hashed_password
-
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     if expires_delta:
@@ -117,40 +290,109 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     return encoded_jwt
 
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    return await authenticate_token(credentials.credentials)
+
+def token_subject(token: str) -> str:
     try:
-        payload = jwt.decode(credentials.credentials, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id: str = payload.get("sub")
-        if user_id is None:
-            raise HTTPException(status_code=401, detail="Invalid token")
-        
-        user = await db.users.find_one({"id": user_id})
-        if user is None:
-            raise HTTPException(status_code=401, detail="User not found")
-        return User(**user)
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
     except jwt.PyJWTError:
         raise HTTPException(status_code=401, detail="Invalid token")
+    user_id = payload.get("sub")
+    if user_id is None:
+        raise HTTPException(status_code=401, detail="Invalid token")
+    return user_id
+
+async def authenticate_token(token: str) -> User:
+    user_id = token_subject(token)
+    cached_user = user_cache.get(user_id)
+    if cached_user is not None:
+        return cached_user
+    
+    # Taken before the read, so a write that lands during it keeps this copy out
+    version = user_cache.version()
+    user = await repos.users.get(user_id)
+    if user is None:
+        raise HTTPException(status_code=401, detail="User not found")
+    current_user = User(**user)
+    user_cache.set(user_id, current_user, version=version)
+    return current_user
+
+async def idempotent(route: str, user_id: str, key: Optional[str], payload, handler):
+    """Run a write handler at most once per Idempotency-Key, replaying its response to retries.
+
+    Client errors are stored and replayed like successes, except those a
+    retry can get past, such as the 409 for a balance that changed while
+    placing orders. Those, and anything else, release the key so a retry
+    runs the handler again, so a handler may only raise or answer with them
+    before its debit commits.
+    """
+    if key is None:
+        return await handler()
+    if not 0 < len(key) <= MAX_KEY_LENGTH:
+        raise HTTPException(status_code=400, detail=f"Idempotency-Key must be 1 to {MAX_KEY_LENGTH} characters")
+
+    async def run():
+        try:
+            return StoredResponse(200, dumps(await handler()))
+        except HTTPException as e:
+            if e.status_code >= 500:
+                raise
+            return StoredResponse(e.status_code, dumps({"detail": e.detail}))
+
+    try:
+        response, replayed = await idempotency_store.run(f"{user_id}:{route}", key, fingerprint(payload), run)
+    except IdempotencyMismatch:
+        raise HTTPException(status_code=422, detail="Idempotency-Key was already used for a different request")
+    except IdempotencyInProgress:
+        raise HTTPException(status_code=409, detail="A request with this Idempotency-Key is still in progress")
+    if replayed:
+        idempotent_replays.inc((route,))
+    return Response(response.body, status_code=response.status_code, media_type="application/json",
+                    headers={"Idempotent-Replayed": "true"} if replayed else None)
+
+def rate_limit(route: str):
+    """Dependency that throttles ``route`` per user before the user is even loaded."""
+    async def check_rate_limit(credentials: HTTPAuthorizationCredentials = Depends(security)):
+        retry_after = await rate_limiter.check(route, token_subject(credentials.credentials))
+        if retry_after:
+            rate_limited_requests.inc((route,))
+            raise HTTPException(
+                status_code=429,
+                detail="Too many requests",
+                headers={"Retry-After": str(retry_after)},
+            )
+    return check_rate_limit
 
 # Auth endpoints
 @api_router.post("/auth/register", response_model=TokenResponse)
 async def register(user_data: UserCreate):
     # Check if user exists
-    existing_user = await db.users.find_one({"email": user_data.email})
+    existing_user = await repos.users.get_by_email(user_data.email)
     if existing_user:
         raise HTTPException(status_code=400, detail="Email already registered")
     
     # Create new user
-    hashed_password = hash_password(user_data.password)
+    hashed_password = await password_hasher.hash(user_data.password)
     user = User(
         email=user_data.email,
         first_name=user_data.first_name,
         last_name=user_data.last_name,
-        tft_balance=1000.0  # Welcome bonus
+        tft_balance=WELCOME_BONUS
     )
     
-    user_dict = user.dict()
+    user_dict = user.model_dump()
     user_dict["password"] = hashed_password
     
-    await db.users.insert_one(user_dict)
+    try:
+        await repos.users.insert(user_dict)
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail="Email already registered")
+    try:
+        await ledger_writer.append(ledger_entry("welcome_bonus", user.id, WELCOME_BONUS, user.id))
+    except Exception:
+        await repos.users.delete(user.id)
+        raise
+    await create_summary(db, user.id)
     
     # Create access token
     access_token = create_access_token(
@@ -159,16 +401,29 @@ async def register(user_data: UserCreate):
     
     return TokenResponse(
         access_token=access_token,
-        user=user.dict()
+        user=user.model_dump()
     )
 
 @api_router.post("/auth/login", response_model=TokenResponse)
 async def login(user_data: UserLogin):
     # Find user
-    user_doc = await db.users.find_one({"email": user_data.email})
-    if not user_doc or not verify_password(user_data.password, user_doc["password"]):
+    user_doc = await repos.users.get_by_email(user_data.email)
+    if not user_doc:
+        # Take as long as a wrong password would, so the response time does not reveal the account
+        await password_hasher.verify_missing(user_data.password)
+        raise HTTPException(status_code=401, detail="Invalid email or password")
+    password_valid, needs_rehash = await password_hasher.verify(user_data.password, user_doc["password"])
+    if not password_valid:
         raise HTTPException(status_code=401, detail="Invalid email or password")
     
+    # Upgrade legacy or outdated hashes now that the plain password is known
+    if needs_rehash:
+        await repos.users.update(
+            user_doc["id"],
+            {"password": await password_hasher.hash(user_data.password)},
+            expected={"password": user_doc["password"]}
+        )
+    
     user = User(**user_doc)
     
     # Create access token
@@ -178,7 +433,7 @@ async def login(user_data: UserLogin):
     
     return TokenResponse(
         access_token=access_token,
-        user=user.dict()
+        user=user.model_dump()
     )
 
 # User endpoints
@@ -186,47 +441,53 @@ async def login(user_data: UserLogin):
 async def get_profile(current_user: User = Depends(get_current_user)):
     return current_user
 
+@api_router.get("/user/balance")
+async def get_balance(current_user: User = Depends(get_current_user)):
+    # Read from the ledger, not the cached user document, unless the user
+    # predates the ledger and has no entries yet
+    balance = await ledger_balance(db, current_user.id)
+    return {"tft_balance": current_user.tft_balance if balance is None else balance}
+
 @api_router.get("/user/dashboard")
 async def get_dashboard(current_user: User = Depends(get_current_user)):
-    # Get user's stakes
-    stakes_cursor = db.stakes.find({"user_id": current_user.id, "is_active": True})
-    stakes = []
-    async for stake_doc in stakes_cursor:
-        if "_id" in stake_doc:
-            del stake_doc["_id"]
-        stakes.append(stake_doc)
-    
-    # Get recent trades
-    trades_cursor = db.trades.find({"user_id": current_user.id}).sort("created_at", -1).limit(10)
-    trades = []
-    async for trade_doc in trades_cursor:
-        if "_id" in trade_doc:
-            del trade_doc["_id"]
-        trades.append(trade_doc)
-    
-    # Calculate total staked and rewards
-    total_staked = sum(stake["amount"] for stake in stakes)
-    total_rewards = sum(stake.get("rewards_earned", 0) for stake in stakes)
+    # Totals come from the materialized summary; recent trades are fetched alongside
+    summary, trades = await asyncio.gather(
+        get_summary(db, current_user.id),
+        repos.trades.recent(current_user.id, limit=10),
+    )
     
     return {
-        "user": current_user.dict(),
-        "total_staked": total_staked,
-        "total_rewards": total_rewards,
-        "active_stakes": len(stakes),
+        "user": current_user.model_dump(),
+        "total_staked": summary["total_staked"],
+        "total_rewards": summary["total_rewards"],
+        "active_stakes": summary["active_stakes"],
+        "trade_stats": {
+            "total_trades": summary["total_trades"],
+            "successful_trades": summary["successful_trades"],
+            "total_pnl": summary["total_pnl"],
+            "trade_volume": summary["trade_volume"],
+        },
         "recent_trades": trades
     }
 
 # Staking endpoints
-@api_router.post("/staking/stake")
-async def create_stake(stake_request: StakeRequest, current_user: User = Depends(get_current_user)):
+@api_router.post("/staking/stake", dependencies=[Depends(rate_limit("stake"))])
+async def create_stake(
+    stake_request: StakeRequest,
+    current_user: User = Depends(get_current_user),
+    idempotency_key: Optional[str] = Header(None)
+):
+    return await idempotent("stake", current_user.id, idempotency_key, stake_request,
+                            lambda: open_stake(stake_request, current_user))
+
+async def open_stake(stake_request: StakeRequest, current_user: User):
     # Validate duration
     valid_durations = [14, 30, 90, 180, 360]
     if stake_request.duration_days not in valid_durations:
         raise HTTPException(status_code=400, detail="Invalid staking duration")
     
-    # Check balance
-    if current_user.tft_balance < stake_request.amount:
-        raise HTTPException(status_code=400, detail="Insufficient TFT balance")
+    if stake_request.amount <= 0:
+        raise HTTPException(status_code=400, detail="Stake amount must be positive")
     
     # Create stake
     end_date = datetime.now(timezone.utc) + timedelta(days=stake_request.duration_days)
@@ -237,116 +498,531 @@ async def create_stake(stake_request: StakeRequest, current_user: User = Depends
         end_date=end_date
     )
     
-    # Update user balance
-    new_balance = current_user.tft_balance - stake_request.amount
-    new_staked = current_user.staked_amount + stake_request.amount
-    
-    await db.users.update_one(
-        {"id": current_user.id},
-        {"$set": {"tft_balance": new_balance, "staked_amount": new_staked}}
+    # Debit the balance only if it still covers the stake, in one atomic write
+    user_doc = await repos.users.increment(
+        current_user.id,
+        {"tft_balance": -stake_request.amount, "staked_amount": stake_request.amount},
+        min_balance=stake_request.amount
     )
+    if user_doc is None:
+        raise HTTPException(status_code=400, detail="Insufficient TFT balance")
+    user_cache.invalidate(current_user.id)
     
-    await db.stakes.insert_one(stake.dict())
+    try:
+        await repos.stakes.insert(stake.model_dump())
+        try:
+            await ledger_writer.append(ledger_entry("stake_lock", current_user.id, -stake.amount, stake.id))
+        except Exception:
+            await repos.stakes.delete(stake.id)
+            raise
+    except Exception:
+        await repos.users.increment(
+            current_user.id, {"tft_balance": stake_request.amount, "staked_amount": -stake_request.amount}
+        )
+        user_cache.invalidate(current_user.id)
+        raise
+    try:
+        await record_stake(db, current_user.id, stake.amount)
+    except Exception:
+        # The summary is eventually consistent; the periodic rebuild repairs it
+        logger.exception("Updating the portfolio summary of user %s failed", current_user.id)
     
-    return {"message": "Stake created successfully", "stake": stake.dict()}
+    return {"message": "Stake created successfully", "stake": stake.model_dump()}
 
 @api_router.get("/staking/stakes")
-async def get_user_stakes(current_user: User = Depends(get_current_user)):
-    stakes_cursor = db.stakes.find({"user_id": current_user.id})
-    stakes = []
-    async for stake_doc in stakes_cursor:
-        if "_id" in stake_doc:
-            del stake_doc["_id"]
-        stakes.append(stake_doc)
-    return {"stakes": stakes}
+async def get_user_stakes(
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    is_active: Optional[bool] = None,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    current_user: User = Depends(get_current_user)
+):
+    try:
+        stakes, next_cursor = await repos.stakes.page(
+            current_user.id, cursor, limit, is_active=is_active, start=start_date, end=end_date
+        )
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"stakes": stakes, "next_cursor": next_cursor}
 
 # Trading endpoints
+MAX_ORDER_BALANCE_FRACTION = 0.05
+MAX_PRICE_SLIPPAGE = float(os.getenv("MAX_PRICE_SLIPPAGE", "0.02"))
+MAX_BATCH_ORDERS = int(os.getenv("MAX_BATCH_ORDERS", "100"))
+BATCH_ORDER_ATTEMPTS = 3
+
 @api_router.get("/trading/instruments")
 async def get_trading_instruments():
-    return {
-        "instruments": [
-            {"symbol": "BTC/USDT", "price": 45000.00, "change": 2.5},
-            {"symbol": "ETH/USDT", "price": 2800.00, "change": 1.8},
-            {"symbol": "EUR/USD", "price": 1.1200, "change": -0.2},
-            {"symbol": "XAU/USD", "price": 1950.00, "change": 0.8}
-        ]
-    }
+    return {"instruments": price_book.snapshot()}
 
-@api_router.post("/trading/place-order")
-async def place_order(trade_request: TradeRequest, current_user: User = Depends(get_current_user)):
-    # Risk validation (basic)
-    if trade_request.amount > (current_user.tft_balance * 0.05):  # Max 5% of balance
-        raise HTTPException(status_code=400, detail="Order exceeds 5% of balance limit")
-    
+def validate_order(trade_request: TradeRequest) -> Optional[str]:
+    if trade_request.amount <= 0:
+        return "Order amount must be positive"
     if not trade_request.stop_loss or not trade_request.take_profit:
-        raise HTTPException(status_code=400, detail="Stop loss and take profit are mandatory")
+        return "Stop loss and take profit are mandatory"
+    if trade_request.side not in ("buy", "sell"):
+        return "Side must be buy or sell"
     
-    # Create trade object
-    trade = Trade(
-        user_id=current_user.id,
+    # Validate against the book, never the client's price
+    market_price = price_book.price(trade_request.symbol)
+    if market_price is None:
+        return "Unknown trading instrument"
+    if trade_request.price and abs(market_price - trade_request.price) > market_price * MAX_PRICE_SLIPPAGE:
+        return "Price moved beyond slippage tolerance"
+    if trade_request.side == "buy":
+        levels_valid = trade_request.stop_loss < market_price < trade_request.take_profit
+    else:
+        levels_valid = trade_request.take_profit < market_price < trade_request.stop_loss
+    if not levels_valid:
+        return "Stop loss and take profit must be on opposite sides of the market price"
+    return None
+
+def exceeds_balance_limit(amount: float, balance: float) -> bool:
+    return balance < amount / MAX_ORDER_BALANCE_FRACTION
+
+def execute_order(trade_request: TradeRequest, user_id: str) -> Trade:
+    return Trade(
+        user_id=user_id,
         symbol=trade_request.symbol,
         side=trade_request.side,
         amount=trade_request.amount,
-        price=trade_request.price,
+        price=price_book.price(trade_request.symbol),
         stop_loss=trade_request.stop_loss,
         take_profit=trade_request.take_profit,
-        status="closed",
-        closed_at=datetime.now(timezone.utc),
-        pnl=trade_request.amount * 0.02  # Mock 2% profit
+        status="open",
+        margin=trade_request.amount
     )
+
+def trade_stats_increment(trades: List[Trade]) -> dict:
+    return {
+        "total_trades": len(trades),
+        "successful_trades": sum(1 for trade in trades if trade.pnl > 0)
+    }
+
+def margin_increment(trades: List[Trade]) -> dict:
+    margin = round(sum(trade.margin for trade in trades), 8)
+    return {"tft_balance": -margin, "open_margin": margin}
+
+async def apply_trades(user_id: str, trades: List[Trade]) -> Optional[dict]:
+    # Risk validation, margin lock and stats update as one guarded write:
+    # every order must be within 5% of the balance the write is applied to,
+    # and the balance must cover the margin of all of them
+    margin = margin_increment(trades)
+    user_doc = await repos.users.increment(
+        user_id, {**trade_stats_increment(trades), **margin},
+        min_balance=max(max(trade.amount for trade in trades) / MAX_ORDER_BALANCE_FRACTION, margin["open_margin"])
+    )
+    if user_doc is not None:
+        user_cache.invalidate(user_id)
+    return user_doc
+
+async def revert_trades(user_id: str, trades: List[Trade]) -> Optional[dict]:
+    # Undo what apply_trades added for trades that were never stored
+    applied = {**trade_stats_increment(trades), **margin_increment(trades)}
+    user_doc = await repos.users.increment(user_id, {field: -value for field, value in applied.items()})
+    user_cache.invalidate(user_id)
+    return user_doc
+
+async def persist_trades(user_doc: dict, trades: List[Trade]) -> List[Trade]:
+    """Store trades whose margin ``apply_trades`` locked; returns the ones stored.
+
+    If the insert fails partway, only the trades that did not land get their
+    margin back; the rest are open positions and stay filled. The error is
+    raised only if none of them landed.
+    """
+    user_id = user_doc["id"]
+    try:
+        await ledger_writer.append(*(ledger_entry("trade_margin", user_id, -trade.margin, trade.id) for trade in trades))
+    except Exception:
+        await revert_trades(user_id, trades)
+        raise
+    try:
+        await repos.trades.insert_many([trade.model_dump() for trade in trades])
+        stored = trades
+    except Exception:
+        stored_ids = await repos.trades.stored_ids(trade.id for trade in trades)
+        stored = [trade for trade in trades if trade.id in stored_ids]
+        lost = [trade for trade in trades if trade.id not in stored_ids]
+        if lost:
+            try:
+                # The ledger is append-only; give the locked margin back with a release entry
+                await ledger_writer.append(*(ledger_entry("margin_release", user_id, trade.margin, trade.id)
+                                             for trade in lost))
+            finally:
+                user_doc = await revert_trades(user_id, lost) or user_doc
+        if not stored:
+            raise
+        logger.exception("Storing %d of %d trades of user %s failed", len(lost), len(trades), user_id)
+    await announce_fills(user_doc, stored)
+    return stored
+
+async def announce_fills(user_doc: dict, trades: List[Trade]):
+    """Update the summary, rankings, streams and trading level for persisted trades.
+
+    The margin is locked and the trades are stored by now, so a failure
+    here is logged and never fails the order: that would release its
+    Idempotency-Key and let a retry fill it again.
+    """
+    user_id = user_doc["id"]
+    fills = [(trade.amount, trade.pnl) for trade in trades]
+    try:
+        await record_trades(db, user_id, fills)
+    except Exception:
+        # The summary is eventually consistent; the periodic rebuild repairs it
+        logger.exception("Updating the portfolio summary of user %s failed", user_id)
+    try:
+        leaderboard.record(user_id, fills)
+        await promote_trading_level(user_doc)
+        for trade in trades:
+            trade_doc = trade.model_dump()
+            # On other workers the leader picks the position up from Mongo
+            if trading_lease.is_leader:
+                matching_engine.open(position_from_trade(trade_doc))
+            stream_hub.publish_fill(user_id, trade_doc)
+    except Exception:
+        logger.exception("Announcing %d fills of user %s failed", len(trades), user_id)
+
+async def settle_closes(closes):
+    """Persist closed positions and credit their realized PnL; safe to retry with the same batch.
+
+    Returns the closes that landed. The rest of what a close changes is
+    done once the batch has settled, by ``announce_closes``.
+    """
+    landed = await close_trades(repos.trades, closes)
+    try:
+        await credit_closes(db, repos.users, landed)
+    except SettlementIncomplete as e:
+        logger.exception("Crediting closed positions failed, repair with ledger.py --repair: %s", e.args[0])
+        raise
+    finally:
+        for user_id in {close.position.user_id for close in landed}:
+            user_cache.invalidate(user_id)
+            analytics_cache.invalidate(user_id)
+    return landed
+
+async def announce_closes(landed):
+    """Update rankings, streams and trading levels for settled closes.
+
+    Runs outside the retry boundary of ``settle_closes``: the PnL is already
+    credited, so a failure here is logged and never re-settles the batch.
+    """
+    by_user = pnl_by_user(landed)
+    try:
+        for user_id, pnls in by_user.items():
+            leaderboard.record_closes(user_id, pnls)
+        for close in landed:
+            stream_hub.publish_fill(close.position.user_id, close.as_dict(), message_type="close")
+        if by_user:
+            for user_doc in await repos.users.find_many(by_user):
+                await promote_trading_level(user_doc)
+    except Exception:
+        logger.exception("Announcing %d settled closes failed", len(landed))
+
+async def promote_trading_level(user_doc: dict):
+    # user_doc already carries the counters including the trades just filled.
+    # Levels only go up, so a bad streak does not flap a trader's badge.
+    current = user_doc.get("trading_level", "Bronze")
+    level = trading_level(user_doc.get("total_trades", 0), user_doc.get("successful_trades", 0))
+    if not is_promotion(current, level):
+        return
+    promoted = await repos.users.update(user_doc["id"], {"trading_level": level}, expected={"trading_level": current})
+    if promoted is not None:
+        user_cache.invalidate(promoted["id"])
+
+@api_router.post("/trading/place-order", dependencies=[Depends(rate_limit("place-order"))])
+async def place_order(
+    trade_request: TradeRequest,
+    current_user: User = Depends(get_current_user),
+    idempotency_key: Optional[str] = Header(None)
+):
+    return await idempotent("place-order", current_user.id, idempotency_key, trade_request,
+                            lambda: fill_order(trade_request, current_user))
+
+async def fill_order(trade_request: TradeRequest, current_user: User):
+    error = validate_order(trade_request)
+    if error:
+        raise HTTPException(status_code=400, detail=error)
     
-    await db.trades.insert_one(trade.dict())
+    trade = execute_order(trade_request, current_user.id)
+    user_doc = await apply_trades(current_user.id, [trade])
+    if user_doc is None:
+        raise HTTPException(status_code=400, detail="Order exceeds 5% of balance limit")
+    await persist_trades(user_doc, [trade])
     
-    # Update user stats
-    await db.users.update_one(
-        {"id": current_user.id},
-        {
-            "$inc": {
-                "total_trades": 1,
-                "successful_trades": 1 if trade.pnl > 0 else 0,
-                "tft_balance": trade.pnl
-            }
-        }
-    )
+    return {"message": "Order placed successfully", "trade": trade.model_dump()}
+
+@api_router.post("/trading/place-orders", dependencies=[Depends(rate_limit("place-orders"))])
+async def place_orders(
+    trade_requests: List[TradeRequest],
+    current_user: User = Depends(get_current_user),
+    idempotency_key: Optional[str] = Header(None)
+):
+    return await idempotent("place-orders", current_user.id, idempotency_key, trade_requests,
+                            lambda: fill_orders(trade_requests, current_user))
+
+async def fill_orders(trade_requests: List[TradeRequest], current_user: User):
+    if not 1 <= len(trade_requests) <= MAX_BATCH_ORDERS:
+        raise HTTPException(status_code=400, detail=f"Batch must contain 1 to {MAX_BATCH_ORDERS} orders")
+    
+    balance = current_user.tft_balance
+    for _ in range(BATCH_ORDER_ATTEMPTS):
+        results = []
+        trades = []
+        available = balance
+        for index, trade_request in enumerate(trade_requests):
+            error = validate_order(trade_request)
+            if not error and exceeds_balance_limit(trade_request.amount, balance):
+                error = "Order exceeds 5% of balance limit"
+            elif not error and trade_request.amount > available:
+                error = "Insufficient TFT balance for margin"
+            if error:
+                results.append({"index": index, "status": "rejected", "detail": error})
+                continue
+            available -= trade_request.amount
+            trade = execute_order(trade_request, current_user.id)
+            trades.append(trade)
+            results.append({"index": index, "status": "filled", "trade": trade})
+        
+        if not trades:
+            break
+        user_doc = await apply_trades(current_user.id, trades)
+        if user_doc is not None:
+            break
+        # The balance moved since it was read; revalidate against the fresh value
+        balance_doc = await repos.users.get(current_user.id, {"_id": 0, "tft_balance": 1})
+        if balance_doc is None:
+            raise HTTPException(status_code=401, detail="User not found")
+        balance = balance_doc["tft_balance"]
+    else:
+        raise HTTPException(status_code=409, detail="Balance changed while placing orders, please retry")
     
-    return {"message": "Order placed successfully", "trade": trade.dict()}
+    stored = {trade.id for trade in await persist_trades(user_doc, trades)} if trades else set()
+    trades = [trade for trade in trades if trade.id in stored]
+    
+    for result in results:
+        if "trade" not in result:
+            continue
+        if result["trade"].id in stored:
+            result["trade"] = result["trade"].model_dump()
+        else:
+            del result["trade"]
+            result.update(status="rejected", detail="Order could not be stored, please retry")
+    return {
+        "message": f"{len(trades)} of {len(trade_requests)} orders placed",
+        "filled": len(trades),
+        "rejected": len(trade_requests) - len(trades),
+        "results": results
+    }
 
 @api_router.get("/trading/history")
-async def get_trading_history(current_user: User = Depends(get_current_user)):
-    trades_cursor = db.trades.find({"user_id": current_user.id}).sort("created_at", -1).limit(50)
-    trades = []
-    async for trade_doc in trades_cursor:
-        # Remove MongoDB ObjectId and convert to dict
-        if "_id" in trade_doc:
-            del trade_doc["_id"]
-        trades.append(trade_doc)
-    return {"trades": trades}
+async def get_trading_history(
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    symbol: Optional[str] = None,
+    trade_status: Optional[str] = Query(None, alias="status"),
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    current_user: User = Depends(get_current_user)
+):
+    try:
+        trades, next_cursor = await repos.trades.page(
+            current_user.id, cursor, limit, symbol=symbol, status=trade_status, start=start_date, end=end_date
+        )
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"trades": trades, "next_cursor": next_cursor}
+
+@api_router.get("/trading/history/export", dependencies=[Depends(rate_limit("export"))])
+async def export_trading_history(
+    export_format: str = Query("csv", alias="format"),
+    symbol: Optional[str] = None,
+    trade_status: Optional[str] = Query(None, alias="status"),
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    current_user: User = Depends(get_current_user)
+):
+    # The whole history, streamed batch by batch rather than paged
+    export = EXPORT_FORMATS.get(export_format)
+    if export is None:
+        raise HTTPException(status_code=400, detail=f"Format must be one of: {', '.join(EXPORT_FORMATS)}")
+    batches = repos.trades.batches(
+        current_user.id, EXPORT_BATCH_SIZE, EXPORT_PROJECTION,
+        symbol=symbol, status=trade_status, start=start_date, end=end_date
+    )
+    filename = f"averix-trades-{datetime.now(timezone.utc):%Y%m%d}.{export.extension}"
+    return StreamingResponse(export.encode(batches), media_type=export.media_type,
+                             headers={"Content-Disposition": f'attachment; filename="{filename}"'})
+
+@api_router.get("/trading/positions")
+async def get_open_positions(current_user: User = Depends(get_current_user)):
+    positions = await repos.trades.open_for_user(current_user.id, MAX_PAGE_SIZE)
+    for position in positions:
+        market_price = price_book.price(position["symbol"])
+        position["market_price"] = market_price
+        position["unrealized_pnl"] = position_from_trade(position).pnl_at(market_price) if market_price else None
+    return {"positions": positions}
+
+@api_router.post("/trading/positions/{trade_id}/close")
+async def close_position(trade_id: str, current_user: User = Depends(get_current_user)):
+    trade = await repos.trades.get_open(current_user.id, trade_id, OPEN_POSITION_PROJECTION)
+    if trade is None:
+        raise HTTPException(status_code=404, detail="Open position not found")
+    position = position_from_trade(trade)
+    price = price_book.price(position.symbol)
+    if price is None:
+        raise HTTPException(status_code=503, detail="No price for this instrument yet")
+    
+    # Only the leader's engine holds the position; whichever close settles first wins
+    close = matching_engine.close(trade_id, price) or ClosedPosition(position, price, "manual")
+    try:
+        landed = await settle_closes([close])
+    except SettlementIncomplete:
+        raise HTTPException(status_code=500, detail="Position closed, but crediting its PnL failed")
+    except Exception:
+        # Settlement retries it; the position is closed at this price either way
+        matching_engine.pending.append(close)
+        settlement_wakeup.set()
+        logger.exception("Settling manual close of %s failed, queued for retry", trade_id)
+        raise HTTPException(status_code=503, detail="Position closed, settlement pending")
+    if not landed:
+        raise HTTPException(status_code=409, detail="Position was already closed")
+    await announce_closes(landed)
+    return {"message": "Position closed", "trade": close.as_dict()}
+
+# Streaming endpoints
+async def send_stream(websocket: WebSocket, subscriber):
+    while True:
+        for message in await subscriber.next_batch():
+            await websocket.send_text(message)
+
+@api_router.websocket("/ws/stream")
+async def stream(websocket: WebSocket, token: str = Query(...)):
+    # Browsers cannot set headers on WebSocket requests, so the JWT comes in the query
+    try:
+        current_user = await authenticate_token(token)
+    except HTTPException:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    
+    await websocket.accept()
+    subscriber = stream_hub.connect(current_user.id)
+    sender = asyncio.create_task(send_stream(websocket, subscriber))
+    try:
+        while True:
+            try:
+                request = json.loads(await websocket.receive_text())
+                action = request["action"]
+                symbols = [symbol for symbol in request.get("symbols", []) if price_book.get(symbol)]
+            except (ValueError, KeyError, TypeError):
+                continue
+            if action == "subscribe":
+                stream_hub.subscribe(subscriber, symbols)
+                for symbol in symbols:
+                    subscriber.offer_price(symbol, price_message(price_book.get(symbol)))
+            elif action == "unsubscribe":
+                stream_hub.unsubscribe(subscriber, symbols)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        sender.cancel()
+        stream_hub.disconnect(subscriber)
+        await asyncio.wait([sender])
+        error = None if sender.cancelled() else sender.exception()
+        if error is not None and not isinstance(error, WebSocketDisconnect):
+            logger.error("Streaming to user %s failed", current_user.id, exc_info=error)
+
+# Analytics endpoints
+@api_router.get("/analytics/pnl")
+async def get_pnl_analytics(
+    interval: str = "day",
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    current_user: User = Depends(get_current_user)
+):
+    if interval not in INTERVALS:
+        raise HTTPException(status_code=400, detail=f"Interval must be one of: {', '.join(INTERVALS)}")
+    columns = await analytics_cache.get(repos.trades, current_user.id)
+    try:
+        return pnl_report(columns, interval, start_date, end_date)
+    except TooManyBuckets as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+# Leaderboard endpoints
+def leaderboard_metric(metric: str) -> str:
+    if metric not in METRICS:
+        raise HTTPException(status_code=400, detail=f"Metric must be one of: {', '.join(METRICS)}")
+    return metric
+
+@api_router.get("/leaderboard")
+async def get_leaderboard(
+    metric: str = "pnl",
+    limit: int = Query(MAX_LEADERBOARD_SIZE, ge=1, le=MAX_LEADERBOARD_SIZE)
+):
+    metric = leaderboard_metric(metric)
+    top = leaderboard.top(metric, limit)
+    users = {}
+    if top:
+        for user in await repos.users.find_many(
+            [user_id for _, user_id, _ in top],
+            {"_id": 0, "id": 1, "first_name": 1, "last_name": 1, "trading_level": 1}
+        ):
+            users[user["id"]] = user
+    
+    entries = []
+    for rank, user_id, stats in top:
+        user = users.get(user_id, {})
+        entries.append({
+            "rank": rank,
+            "name": display_name(user),
+            "trading_level": user.get("trading_level", "Bronze"),
+            "value": metric_value(metric, stats),
+            "total_trades": stats[0],
+            "win_rate": win_rate(stats),
+        })
+    return {"metric": metric, "ranked": leaderboard.ranked(metric), "entries": entries}
+
+@api_router.get("/leaderboard/me")
+async def get_my_rank(current_user: User = Depends(get_current_user)):
+    stats = leaderboard.stats(current_user.id)
+    return {
+        "trading_level": current_user.trading_level,
+        "ranks": {
+            metric: {
+                "rank": leaderboard.rank(metric, current_user.id),
+                "value": metric_value(metric, stats),
+                "ranked": leaderboard.ranked(metric),
+            }
+            for metric in METRICS
+        }
+    }
 
 # Public endpoints
 @api_router.get("/public/stats")
 async def get_public_stats():
-    return {
-        "total_traders": 1250,
-        "total_volume": "$2.5M",
-        "active_stakes": 890,
-        "tft_price": "$0.45"
-    }
+    try:
+        return await public_stats.get()
+    except Exception:
+        logger.exception("Public stats refresh failed")
+        raise HTTPException(status_code=503, detail="Stats temporarily unavailable")
 
 @api_router.get("/")
 async def root():
     return {"message": "Averix API is running", "version": "1.0.0"}
 
-# Include router
-app.include_router(api_router)
+@api_router.get("/health/ready")
+async def readiness():
+    if not startup_complete or db is None:
+        raise HTTPException(status_code=503, detail="Starting up")
+    try:
+        await asyncio.wait_for(db.command("ping"), timeout=settings.ready_timeout_seconds if settings else 2.0)
+    except Exception:
+        raise HTTPException(status_code=503, detail="Database unavailable")
+    return {"status": "ready"}
 
-# CORS
-app.add_middleware(
-    CORSMiddleware,
-    allow_credentials=True,
-    allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+# Prometheus scrape endpoint
+async def get_metrics():
+    return PlainTextResponse(metrics_registry.render(), media_type="text/plain; version=0.0.4")
 
 # Logging
 logging.basicConfig(
@@ -355,10 +1031,240 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-@app.on_event("shutdown")
+# Background jobs
+REWARDS_ACCRUAL_INTERVAL_SECONDS = float(os.getenv("REWARDS_ACCRUAL_INTERVAL_SECONDS", "0"))
+background_tasks: List[asyncio.Task] = []
+settlement_tasks: List[asyncio.Task] = []
+
+async def run_periodically(name: str, interval: float, job):
+    while True:
+        try:
+            result = await job()
+            logger.info("%s finished: %s", name, result)
+        except Exception:
+            logger.exception("%s failed", name)
+        await asyncio.sleep(interval)
+
+async def run_price_feed(source):
+    while True:
+        try:
+            await source.run(price_book)
+        except Exception:
+            logger.exception("Price feed failed, restarting")
+        await asyncio.sleep(1)
+
+async def share_quotes():
+    since = 0.0
+    while True:
+        try:
+            since = await save_quotes(db.prices, price_book, since)
+        except Exception:
+            logger.exception("Sharing quotes failed")
+        await asyncio.sleep(shared_prices.interval)
+
+async def sync_open_positions():
+    # The engine skips positions it already holds or closed recently
+    while True:
+        await asyncio.sleep(POSITION_SYNC_SECONDS)
+        try:
+            opened = await repos.trades.open_since(
+                datetime.now(timezone.utc) - POSITION_SYNC_WINDOW, OPEN_POSITION_PROJECTION
+            )
+            matching_engine.load(position_from_trade(trade) for trade in opened)
+        except Exception:
+            logger.exception("Syncing open positions failed")
+
+async def lead_trading() -> bool:
+    # A new leader loads every open position before it matches; one that
+    # cannot gives the lease up rather than miss closes
+    matching_engine.clear()
+    try:
+        logger.info("Holding the trading lease, recovered %d open positions",
+                    await load_open_positions(repos.trades, matching_engine))
+        return True
+    except Exception:
+        logger.exception("Recovering open positions failed, giving up the trading lease")
+        try:
+            await trading_lease.release()
+        except Exception:
+            logger.exception("Releasing the trading lease failed")
+        return False
+
+def start_trading_jobs(leading: bool) -> List[asyncio.Task]:
+    if not leading:
+        return [asyncio.create_task(run_price_feed(shared_prices))]
+    return [
+        asyncio.create_task(run_price_feed(price_source)),
+        asyncio.create_task(share_quotes()),
+        asyncio.create_task(sync_open_positions()),
+    ]
+
+async def cancel_tasks(tasks: List[asyncio.Task]):
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+async def run_trading():
+    """Renew the trading lease and run the jobs for this worker's role.
+
+    The leader runs the price feed, shares its quotes and picks up positions
+    opened on other workers; everyone else follows the leader's quotes.
+    """
+    leading = trading_lease.is_leader
+    jobs = start_trading_jobs(leading)
+    try:
+        while True:
+            await asyncio.sleep(trading_lease.renew_interval)
+            try:
+                await trading_lease.acquire()
+            except Exception:
+                logger.exception("Renewing the trading lease failed")
+            if trading_lease.is_leader == leading:
+                continue
+            await cancel_tasks(jobs)
+            if trading_lease.is_leader:
+                leading = await lead_trading()
+            else:
+                logger.warning("Lost the trading lease, following the leader's prices")
+                matching_engine.clear()
+                leading = False
+            jobs = start_trading_jobs(leading)
+    finally:
+        await cancel_tasks(jobs)
+
+async def run_settlement():
+    # Never cancelled: shutdown sets settlement_stopping and waits, so a batch
+    # is not abandoned halfway through crediting
+    while not settlement_stopping.is_set():
+        await settlement_wakeup.wait()
+        settlement_wakeup.clear()
+        await asyncio.sleep(SETTLEMENT_DELAY_SECONDS)
+        await settle_pending()
+
+async def settle_pending():
+    while matching_engine.pending:
+        batch = matching_engine.drain(SETTLEMENT_BATCH_SIZE)
+        try:
+            landed = await settle_closes(batch)
+        except SettlementIncomplete:
+            continue  # already logged with the affected trade ids
+        except Exception:
+            # Safe to retry as a whole: closes whose PnL was already credited are skipped
+            logger.exception("Settling %d closed positions failed", len(batch))
+            matching_engine.pending[:0] = batch
+            if settlement_stopping.is_set():
+                return
+            await asyncio.sleep(1)
+            continue
+        await announce_closes(landed)
+
+async def accrue_rewards():
+    return await run_accrual(db)
+
+async def open_db_client():
+    global settings, client, db, repos
+    # Tests and the load test attach their own client and repositories before startup
+    if client is None:
+        settings = settings or Settings.from_env()
+        client = AsyncIOMotorClient(settings.mongo_url, event_listeners=[mongo_metrics], **settings.client_options())
+        db = client[settings.db_name]
+    if repos is None:
+        repos = REPOSITORY_BACKENDS[settings.repository_backend if settings else "motor"](db)
+
+async def create_db_indexes():
+    await ensure_indexes(db)
+
+async def take_trading_lease():
+    # The first worker to start leads; run_trading keeps renewing the lease
+    if await trading_lease.acquire():
+        await lead_trading()
+
+async def start_background_jobs():
+    global startup_complete
+    background_tasks.append(asyncio.create_task(run_trading()))
+    settlement_tasks.append(asyncio.create_task(run_settlement()))
+    background_tasks.append(asyncio.create_task(
+        run_periodically("Public stats refresh", PUBLIC_STATS_REFRESH_SECONDS, public_stats.refresh)
+    ))
+    background_tasks.append(asyncio.create_task(
+        run_periodically("Leaderboard reconcile", LEADERBOARD_RECONCILE_SECONDS, lambda: reconcile(db, leaderboard))
+    ))
+    background_tasks.append(asyncio.create_task(
+        run_periodically("Portfolio rebuild", PORTFOLIO_REBUILD_SECONDS, lambda: rebuild_summaries(db))
+    ))
+    background_tasks.append(asyncio.create_task(
+        run_periodically("Ledger reconcile", LEDGER_RECONCILE_SECONDS, lambda: reconcile_ledger(db))
+    ))
+    background_tasks.append(asyncio.create_task(
+        run_periodically("Stake maturity", MATURITY_INTERVAL_SECONDS, lambda: maturity_processor.run(db))
+    ))
+    if REWARDS_ACCRUAL_INTERVAL_SECONDS > 0:
+        background_tasks.append(asyncio.create_task(
+            run_periodically("Rewards accrual", REWARDS_ACCRUAL_INTERVAL_SECONDS, accrue_rewards)
+        ))
+    startup_complete = True
+
+async def stop_background_jobs():
+    global startup_complete
+    startup_complete = False
+    for task in background_tasks:
+        task.cancel()
+    await asyncio.gather(*background_tasks, return_exceptions=True)
+    background_tasks.clear()
+    # Closes the last ticks triggered still need to reach Mongo
+    settlement_stopping.set()
+    settlement_wakeup.set()
+    await asyncio.gather(*settlement_tasks, return_exceptions=True)
+    settlement_tasks.clear()
+    await ledger_writer.flush()
+    # Hand trading over now rather than when the lease expires
+    try:
+        await trading_lease.release()
+    except Exception:
+        logger.exception("Releasing the trading lease failed")
+
 async def shutdown_db_client():
-    client.close()
+    global client, db, repos
+    if client is not None:
+        client.close()
+    client = db = repos = None
+    password_hasher.shutdown()
 
-@app.get("/")
-def root():
+def service_status():
     return {"status": "ok", "service": "averix-backend"}
+
+def create_app(app_settings: Optional[Settings] = None) -> FastAPI:
+    """Application factory for ``uvicorn --factory`` and gunicorn workers.
+
+    Every call builds a new app with the routes, middleware and lifecycle
+    hooks. The Mongo client is created by the startup hook, inside the
+    worker, so no connection pool is ever shared across a fork. Without
+    ``app_settings`` the hook reads them from the environment.
+
+    The handlers share this module's state (the Mongo client, caches, price
+    book and matching engine), so a process serves one app at a time.
+    """
+    global settings
+    if app_settings is not None:
+        settings = app_settings
+    app = FastAPI(title="Averix API", version="1.0.0", default_response_class=FastJSONResponse)
+    app.include_router(api_router)
+    app.add_api_route("/metrics", get_metrics, methods=["GET"], include_in_schema=False)
+    app.add_api_route("/", service_status, methods=["GET"])
+    app.add_middleware(
+        CORSMiddleware,
+        allow_credentials=True,
+        allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+    # Added last so it wraps every other middleware
+    app.add_middleware(MetricsMiddleware, metrics=request_metrics)
+    for hook in (open_db_client, create_db_indexes, take_trading_lease, start_background_jobs):
+        app.add_event_handler("startup", hook)
+    for hook in (stop_background_jobs, shutdown_db_client):
+        app.add_event_handler("shutdown", hook)
+    return app
+
+# For ``uvicorn server:app`` and the tests
+app = create_app()
@@ -0,0 +1,91 @@
+"""Deployment settings for the API process.
+
+``Settings.from_env()`` reads the Mongo connection and pool settings from
+the environment (and ``backend/.env``). Pool options left unset keep the
+driver's defaults. ``server.create_app`` takes a ``Settings`` and builds the
+Mongo client from it in each worker's startup hook, after any fork.
+"""
+import os
+from dataclasses import dataclass, field
+from typing import Any, Dict, Mapping, Optional, Tuple
+
+from repositories import REPOSITORY_BACKENDS
+
+# Compressors the driver supports, in order of preference; snappy and zstd
+# need the python-snappy and zstandard packages
+COMPRESSORS = ("zstd", "snappy", "zlib")
+
+
+def _optional_int(environ: Mapping[str, str], name: str) -> Optional[int]:
+    value = environ.get(name, "").strip()
+    return int(value) if value else None
+
+
+@dataclass(frozen=True)
+class Settings:
+    mongo_url: str
+    db_name: str
+    max_pool_size: Optional[int] = None
+    min_pool_size: Optional[int] = None
+    max_idle_time_ms: Optional[int] = None
+    wait_queue_timeout_ms: Optional[int] = None
+    connect_timeout_ms: Optional[int] = None
+    server_selection_timeout_ms: Optional[int] = None
+    socket_timeout_ms: Optional[int] = None
+    compressors: Tuple[str, ...] = ()
+    zlib_compression_level: Optional[int] = None
+    # How long /api/health/ready waits for a Mongo ping
+    ready_timeout_seconds: float = 2.0
+    app_name: str = field(default="averix-backend")
+    # A name from REPOSITORY_BACKENDS. "memory" keeps users, stakes and
+    # trades in process, where the background jobs that read Mongo directly
+    # cannot see them, so REPOSITORY_BACKEND refuses it; tests and the load
+    # suite attach it themselves
+    repository_backend: str = "motor"
+
+    def __post_init__(self):
+        unknown = set(self.compressors) - set(COMPRESSORS)
+        if unknown:
+            raise ValueError(f"Unknown Mongo compressors {sorted(unknown)}; choose from {list(COMPRESSORS)}")
+        if self.repository_backend not in REPOSITORY_BACKENDS:
+            raise ValueError(f"Unknown repository backend {self.repository_backend!r}; "
+                             f"choose from {sorted(REPOSITORY_BACKENDS)}")
+
+    @classmethod
+    def from_env(cls, environ: Mapping[str, str] = os.environ) -> "Settings":
+        compressors = environ.get("MONGO_COMPRESSORS", "")
+        repository_backend = environ.get("REPOSITORY_BACKEND", "motor").strip()
+        if repository_backend == "memory":
+            raise ValueError("REPOSITORY_BACKEND=memory is for tests and benchmarks only; "
+                             "maturity, rewards, the ledger and summary jobs read Mongo directly")
+        return cls(
+            mongo_url=environ["MONGO_URL"],
+            db_name=environ["DB_NAME"],
+            max_pool_size=_optional_int(environ, "MONGO_MAX_POOL_SIZE"),
+            min_pool_size=_optional_int(environ, "MONGO_MIN_POOL_SIZE"),
+            max_idle_time_ms=_optional_int(environ, "MONGO_MAX_IDLE_TIME_MS"),
+            wait_queue_timeout_ms=_optional_int(environ, "MONGO_WAIT_QUEUE_TIMEOUT_MS"),
+            connect_timeout_ms=_optional_int(environ, "MONGO_CONNECT_TIMEOUT_MS"),
+            server_selection_timeout_ms=_optional_int(environ, "MONGO_SERVER_SELECTION_TIMEOUT_MS"),
+            socket_timeout_ms=_optional_int(environ, "MONGO_SOCKET_TIMEOUT_MS"),
+            compressors=tuple(name.strip() for name in compressors.split(",") if name.strip()),
+            zlib_compression_level=_optional_int(environ, "MONGO_ZLIB_COMPRESSION_LEVEL"),
+            ready_timeout_seconds=float(environ.get("READY_TIMEOUT_SECONDS", "2")),
+            repository_backend=repository_backend,
+        )
+
+    def client_options(self) -> Dict[str, Any]:
+        """Keyword arguments for ``AsyncIOMotorClient``, leaving unset options at the driver default."""
+        options = {
+            "maxPoolSize": self.max_pool_size,
+            "minPoolSize": self.min_pool_size,
+            "maxIdleTimeMS": self.max_idle_time_ms,
+            "waitQueueTimeoutMS": self.wait_queue_timeout_ms,
+            "connectTimeoutMS": self.connect_timeout_ms,
+            "serverSelectionTimeoutMS": self.server_selection_timeout_ms,
+            "socketTimeoutMS": self.socket_timeout_ms,
+            "zlibCompressionLevel": self.zlib_compression_level,
+            "compressors": ",".join(self.compressors) or None,
+            "appname": self.app_name,
+        }
+        return {name: value for name, value in options.items() if value is not None}
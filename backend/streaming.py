@@ -0,0 +1,118 @@
+"""WebSocket fan-out of price ticks and order fills.
+
+Each message is serialized once and offered to every interested subscriber
+without awaiting it. Subscribers buffer per connection: price ticks coalesce
+to the latest one per symbol, and fills go to a bounded queue that drops
+the oldest entries and tells the client to resync. A slow consumer
+therefore costs constant memory and never stalls the broadcaster.
+"""
+import asyncio
+from collections import deque
+from typing import Deque, Dict, Iterable, Set
+
+import orjson
+
+from price_book import Quote
+
+DEFAULT_MAX_PENDING_FILLS = 100
+
+
+def encode(message: dict) -> str:
+    return orjson.dumps(message).decode()
+
+
+def price_message(quote: Quote) -> str:
+    return encode({"type": "price", **quote.as_dict(), "timestamp": quote.updated_at})
+
+
+class Subscriber:
+    def __init__(self, user_id: str, max_pending_fills: int = DEFAULT_MAX_PENDING_FILLS):
+        self.user_id = user_id
+        self.symbols: Set[str] = set()
+        self._prices: Dict[str, str] = {}
+        self._fills: Deque[str] = deque(maxlen=max_pending_fills)
+        self._ready = asyncio.Event()
+        self.dropped_fills = 0
+        self.coalesced_prices = 0
+        self._resync_pending = False
+
+    def offer_price(self, symbol: str, message: str) -> None:
+        if symbol in self._prices:
+            self.coalesced_prices += 1
+        self._prices[symbol] = message
+        self._ready.set()
+
+    def offer_fill(self, message: str) -> None:
+        if len(self._fills) == self._fills.maxlen:
+            self.dropped_fills += 1
+            self._resync_pending = True
+        self._fills.append(message)
+        self._ready.set()
+
+    async def next_batch(self) -> Iterable[str]:
+        """Wait for pending messages and hand them all over, fills first."""
+        await self._ready.wait()
+        self._ready.clear()
+        batch = list(self._fills)
+        self._fills.clear()
+        if self._resync_pending:
+            # The client missed fills and should refetch /trading/history
+            batch.insert(0, encode({"type": "resync", "dropped_fills": self.dropped_fills}))
+            self._resync_pending = False
+        batch.extend(self._prices.values())
+        self._prices.clear()
+        return batch
+
+
+class StreamHub:
+    def __init__(self, max_pending_fills: int = DEFAULT_MAX_PENDING_FILLS):
+        self.max_pending_fills = max_pending_fills
+        self._by_symbol: Dict[str, Set[Subscriber]] = {}
+        self._by_user: Dict[str, Set[Subscriber]] = {}
+
+    @property
+    def connections(self) -> int:
+        return sum(len(subscribers) for subscribers in self._by_user.values())
+
+    def connect(self, user_id: str) -> Subscriber:
+        subscriber = Subscriber(user_id, self.max_pending_fills)
+        self._by_user.setdefault(user_id, set()).add(subscriber)
+        return subscriber
+
+    def disconnect(self, subscriber: Subscriber) -> None:
+        self.unsubscribe(subscriber, list(subscriber.symbols))
+        subscribers = self._by_user.get(subscriber.user_id)
+        if subscribers is not None:
+            subscribers.discard(subscriber)
+            if not subscribers:
+                del self._by_user[subscriber.user_id]
+
+    def subscribe(self, subscriber: Subscriber, symbols: Iterable[str]) -> None:
+        for symbol in symbols:
+            subscriber.symbols.add(symbol)
+            self._by_symbol.setdefault(symbol, set()).add(subscriber)
+
+    def unsubscribe(self, subscriber: Subscriber, symbols: Iterable[str]) -> None:
+        for symbol in symbols:
+            subscriber.symbols.discard(symbol)
+            subscribers = self._by_symbol.get(symbol)
+            if subscribers is not None:
+                subscribers.discard(subscriber)
+                if not subscribers:
+                    del self._by_symbol[symbol]
+
+    def publish_price(self, quote: Quote) -> None:
+        subscribers = self._by_symbol.get(quote.symbol)
+        if not subscribers:
+            return
+        message = price_message(quote)
+        for subscriber in subscribers:
+            subscriber.offer_price(quote.symbol, message)
+
+    def publish_fill(self, user_id: str, trade: dict, message_type: str = "fill") -> None:
+        subscribers = self._by_user.get(user_id)
+        if not subscribers:
+            return
+        message = encode({"type": message_type, "trade": trade})
+        for subscriber in subscribers:
+            subscriber.offer_fill(message)
@@ -0,0 +1,104 @@
+"""In-process LRU/TTL cache for authenticated user lookups.
+
+Writes never put a user in the cache; they invalidate it, and the next
+lookup reads the user again. A lookup that read the user before an
+invalidation could otherwise fill the cache with the old document after
+it, so lookups take a ``version()`` before reading and ``set`` refuses a
+value read before the user's latest invalidation.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+
+class UserCache:
+    """Size-capped LRU cache with a per-entry TTL, keyed by user id.
+
+    Entries are evicted least-recently-used first once ``max_size`` is
+    reached, and treated as misses once older than ``ttl_seconds``.
+    """
+
+    def __init__(self, max_size: int = 10000, ttl_seconds: float = 30.0,
+                 clock: Callable[[], float] = time.monotonic):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.stale_fills = 0
+        # Counts invalidations; user_id -> count at the user's latest one
+        self._version = 0
+        self._invalidated: "OrderedDict[str, int]" = OrderedDict()
+        # Latest version dropped from _invalidated; older reads of any user are refused
+        self._forgotten = 0
+
+    def get(self, user_id: str) -> Optional[Any]:
+        now = self._clock()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, value = entry
+            if expires_at <= now:
+                del self._entries[user_id]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(user_id)
+            self.hits += 1
+            return value
+
+    def version(self) -> int:
+        """Take before reading a user; pass to ``set`` with what was read."""
+        with self._lock:
+            return self._version
+
+    def set(self, user_id: str, value: Any, version: Optional[int] = None) -> None:
+        if self.max_size <= 0:
+            return
+        expires_at = self._clock() + self.ttl_seconds
+        with self._lock:
+            if version is not None and version < self._invalidated.get(user_id, self._forgotten):
+                self.stale_fills += 1
+                return
+            self._entries[user_id] = (expires_at, value)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, user_id: str) -> None:
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            if self._entries.pop(user_id, None) is not None:
+                self.invalidations += 1
+            self._version += 1
+            self._invalidated[user_id] = self._version
+            self._invalidated.move_to_end(user_id)
+            if len(self._invalidated) > self.max_size:
+                _, self._forgotten = self._invalidated.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "stale_fills": self.stale_fills,
+            }
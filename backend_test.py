@@ -211,7 +211,7 @@ class AverixAPITester:
         # Test dashboard
         dashboard = self.run_test("User Dashboard", "GET", "user/dashboard", 200)
         if dashboard:
-            required_fields = ['user', 'total_staked', 'total_rewards', 'active_stakes', 'recent_trades']
+            required_fields = ['user', 'total_staked', 'total_rewards', 'active_stakes', 'trade_stats', 'recent_trades']
             for field in required_fields:
                 if field in dashboard:
                     self.log_test(f"Dashboard - {field} field", True)
@@ -222,6 +222,7 @@ class AverixAPITester:
         stakes = self.run_test("User Stakes", "GET", "staking/stakes", 200)
         if stakes and 'stakes' in stakes:
             self.log_test("Staking - Get Stakes", True)
+            self.log_test("Staking - Pagination Cursor", 'next_cursor' in stakes, "Missing field: next_cursor")
 
     def test_staking_system(self):
         """Test staking functionality"""
@@ -253,6 +254,13 @@ class AverixAPITester:
             else:
                 self.log_test("Staking - Response Structure", False, "Missing message or stake in response")
 
+            # The ledger records the welcome bonus and the stake lock
+            profile = self.run_test("Profile After Stake", "GET", "user/profile", 200)
+            ledger = self.run_test("Ledger Balance", "GET", "user/balance", 200)
+            if profile and ledger:
+                self.log_test("Ledger - Balance Matches Profile", ledger.get('tft_balance') == profile['tft_balance'],
+                              f"Ledger {ledger.get('tft_balance')} vs profile {profile['tft_balance']}")
+
         # Test staking with invalid duration
         invalid_stake = {
             "amount": 50.0,
@@ -299,12 +307,24 @@ class AverixAPITester:
                     else:
                         self.log_test(f"Trade - {field} field", False, f"Missing field: {field}")
                 
-                # Check mock profit (should be 2% of amount)
-                expected_pnl = trade_data['amount'] * 0.02
-                if abs(trade['pnl'] - expected_pnl) < 0.01:
-                    self.log_test("Trading - Mock 2% Profit", True)
+                # Orders open a position; PnL is realized when it closes
+                if trade.get('status') == 'open' and trade.get('pnl') == 0:
+                    self.log_test("Trading - Opens Position", True)
+                else:
+                    self.log_test("Trading - Opens Position", False, f"Got status {trade.get('status')}, pnl {trade.get('pnl')}")
+                
+                positions = self.run_test("Open Positions", "GET", "trading/positions", 200)
+                if positions and any(p['id'] == trade['id'] for p in positions.get('positions', [])):
+                    self.log_test("Trading - Position Listed", True)
+                else:
+                    self.log_test("Trading - Position Listed", False, "Placed trade not among open positions")
+                
+                closed = self.run_test("Close Position", "POST", f"trading/positions/{trade['id']}/close", 200)
+                if closed and closed['trade']['status'] == 'closed' and closed['trade']['close_reason'] == 'manual':
+                    self.log_test("Trading - Manual Close", True)
                 else:
-                    self.log_test("Trading - Mock 2% Profit", False, f"Expected {expected_pnl}, got {trade['pnl']}")
+                    self.log_test("Trading - Manual Close", False, f"Got {closed}")
+                self.run_test("Close Position Twice", "POST", f"trading/positions/{trade['id']}/close", 404)
 
         # Test trade without stop loss
         invalid_trade = {
@@ -328,11 +348,36 @@ class AverixAPITester:
         }
         self.run_test("Excessive Trade Amount", "POST", "trading/place-order", 400, excessive_trade)
 
+        # Test trade on an instrument the price book does not quote
+        unknown_trade = dict(trade_data, symbol="DOGE/USDT")
+        self.run_test("Trade Unknown Instrument", "POST", "trading/place-order", 400, unknown_trade)
+
+        # Test batch order placement with one valid and one invalid order
+        batch = self.run_test("Place Batch Orders", "POST", "trading/place-orders", 200, [trade_data, invalid_trade])
+        if batch and 'results' in batch:
+            statuses = [result['status'] for result in batch['results']]
+            if statuses == ['filled', 'rejected']:
+                self.log_test("Batch Orders - Per-Order Results", True)
+            else:
+                self.log_test("Batch Orders - Per-Order Results", False, f"Got {statuses}")
+        self.run_test("Empty Batch Orders", "POST", "trading/place-orders", 400, [])
+
         # Test trading history
         history = self.run_test("Trading History", "GET", "trading/history", 200)
         if history and 'trades' in history:
             self.log_test("Trading - History Structure", True)
 
+        # Test keyset pagination and filters
+        page = self.run_test("Trading History - First Page", "GET", "trading/history?limit=1&symbol=BTC/USDT", 200)
+        if page and page.get('next_cursor'):
+            next_page = self.run_test("Trading History - Next Page", "GET", f"trading/history?limit=1&symbol=BTC/USDT&cursor={page['next_cursor']}", 200)
+            if next_page and next_page['trades'] and page['trades']:
+                if next_page['trades'][0]['id'] != page['trades'][0]['id']:
+                    self.log_test("Trading History - Cursor Advances", True)
+                else:
+                    self.log_test("Trading History - Cursor Advances", False, "Next page repeated the first row")
+        self.run_test("Trading History - Invalid Cursor", "GET", "trading/history?cursor=not-a-cursor", 400)
+
     def test_error_handling(self):
         """Test error handling and edge cases"""
         print("\n🔍 Testing Error Handling...")
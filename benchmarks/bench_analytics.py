@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+PnL analytics benchmark.
+
+Times the two halves of the analytics endpoint for one user with many
+closed trades (100k by default, spread over a year): converting trade
+documents into cached NumPy columns, which happens once per new trade,
+and building daily, weekly and monthly reports from those columns, which
+happens on every request.
+"""
+
+import argparse
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from analytics import INTERVALS, build_columns, pnl_report  # noqa: E402
+
+SYMBOLS = ("BTC/USDT", "ETH/USDT", "EUR/USD", "XAU/USD")
+
+
+def synthetic_trades(count, seed=42):
+    rng = np.random.default_rng(seed)
+    start = datetime(2025, 1, 1)
+    offsets = rng.integers(0, 365 * 24 * 3600, size=count)
+    pnl = rng.normal(0.1, 5, size=count).round(2)
+    amounts = rng.uniform(1, 100, size=count).round(2)
+    symbols = rng.integers(0, len(SYMBOLS), size=count)
+    docs = []
+    for i in range(count):
+        closed_at = start + timedelta(seconds=int(offsets[i]))
+        docs.append({"closed_at": closed_at, "created_at": closed_at, "symbol": SYMBOLS[symbols[i]],
+                     "amount": float(amounts[i]), "pnl": float(pnl[i])})
+    return docs
+
+
+def best_ms(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return min(timings) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="PnL analytics benchmark")
+    parser.add_argument("--trades", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    docs = synthetic_trades(args.trades)
+    build = best_ms(lambda: build_columns(len(docs), docs), max(1, args.repeat // 5))
+    columns = build_columns(len(docs), docs)
+    print(f"🔧 Column build for {args.trades:,} trades: {build:.1f} ms (once per new trade)\n")
+
+    print(f"{'interval':<10}{'periods':>9}{'report ms':>11}")
+    for interval in INTERVALS:
+        report = pnl_report(columns, interval)
+        elapsed = best_ms(lambda: pnl_report(columns, interval), args.repeat)
+        print(f"{interval:<10}{len(report['periods']):>9}{elapsed:>11.2f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
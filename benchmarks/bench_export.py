@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Trade-history export benchmark.
+
+Seeds one user with a long trade history (1M trades by default) and
+streams it through each export format. Reports the time to the first
+chunk, total time, throughput and output size. A second, traced pass
+reports the peak memory the export allocated, which should stay flat as
+--rows grows.
+
+Runs against the in-memory trade repository by default; --mongo seeds a
+scratch database on MONGO_URL instead.
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+import tracemalloc
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from export import EXPORT_BATCH_SIZE, EXPORT_FORMATS, EXPORT_PROJECTION  # noqa: E402
+from indexes import ensure_indexes  # noqa: E402
+from repositories import MemoryTradeRepository, MotorTradeRepository  # noqa: E402
+
+USER_ID = "export-user"
+
+
+def synthetic_trades(start, count):
+    opened = datetime(2024, 1, 1)
+    for i in range(start, start + count):
+        created = opened + timedelta(seconds=30 * i)
+        yield {
+            "id": f"trade-{i:08d}", "user_id": USER_ID, "symbol": ("BTC/USDT", "ETH/USDT", "SOL/USDT")[i % 3],
+            "side": "buy" if i % 2 else "sell", "amount": 10.0 + i % 90, "price": 100.0 + i % 7,
+            "stop_loss": 90.0, "take_profit": 110.0, "status": "closed", "created_at": created,
+            "closed_at": created + timedelta(minutes=5), "close_price": 101.0, "close_reason": "take_profit",
+            "pnl": 0.1 * (i % 11 - 5), "close_id": "seed",
+        }
+
+
+async def seed(trades, rows, chunk=50_000):
+    for start in range(0, rows, chunk):
+        await trades.insert_many(list(synthetic_trades(start, min(chunk, rows - start))))
+
+
+async def stream(trades, export, batch_size):
+    started = time.perf_counter()
+    first = None
+    size = 0
+    async for chunk in export.encode(trades.batches(USER_ID, batch_size, EXPORT_PROJECTION)):
+        if first is None and chunk:
+            first = time.perf_counter() - started
+        size += len(chunk)
+    return first, time.perf_counter() - started, size
+
+
+async def run(args):
+    client = db = None
+    if args.mongo:
+        from motor.motor_asyncio import AsyncIOMotorClient
+
+        client = AsyncIOMotorClient(os.getenv("MONGO_URL", "mongodb://127.0.0.1:27017"))
+        db = client[f"averix_bench_{uuid.uuid4().hex[:8]}"]
+        await ensure_indexes(db)
+        trades = MotorTradeRepository(db)
+    else:
+        trades = MemoryTradeRepository()
+    try:
+        started = time.perf_counter()
+        await seed(trades, args.rows)
+        print(f"🔧 Seeded {args.rows:,} trades in {time.perf_counter() - started:.1f}s "
+              f"({'MongoDB' if args.mongo else 'in memory'}), batches of {args.batch_size:,}\n")
+        print(f"{'format':>8}{'first ms':>10}{'total s':>9}{'rows/s':>11}{'MiB out':>9}{'peak MiB':>10}")
+        for name, export in EXPORT_FORMATS.items():
+            first, total, size = await stream(trades, export, args.batch_size)
+            tracemalloc.start()
+            await stream(trades, export, args.batch_size)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            print(f"{name:>8}{first * 1000:>10.1f}{total:>9.2f}{args.rows / total:>11,.0f}"
+                  f"{size / 2**20:>9.1f}{peak / 2**20:>10.1f}")
+    finally:
+        if client is not None:
+            await client.drop_database(db.name)
+            client.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--batch-size", type=int, default=EXPORT_BATCH_SIZE)
+    parser.add_argument("--mongo", action="store_true", help="seed a scratch database on MONGO_URL")
+    asyncio.run(run(parser.parse_args()))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Leaderboard index benchmark.
+
+Builds the in-memory ranking index over synthetic trader stats (1M users by
+default) the way a reconcile does, then times the hot operations: a top-100
+page, one user's rank, and an incremental update after a fill.
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from leaderboard import METRICS, Leaderboard  # noqa: E402
+
+
+def synthetic_stats(count, seed=42):
+    rng = np.random.default_rng(seed)
+    trades = rng.integers(1, 1000, size=count)
+    successful = (trades * rng.uniform(0.2, 0.8, size=count)).astype(int)
+    pnl = rng.normal(0, 500, size=count).round(2)
+    volume = (trades * rng.uniform(10, 100, size=count)).round(2)
+    return [
+        (f"user-{i}", (int(trades[i]), int(successful[i]), float(pnl[i]), float(volume[i])))
+        for i in range(count)
+    ]
+
+
+def per_call_us(fn, calls):
+    started = time.perf_counter()
+    for n in range(calls):
+        fn(n)
+    return (time.perf_counter() - started) / calls * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Leaderboard index benchmark")
+    parser.add_argument("--users", type=int, default=1_000_000)
+    parser.add_argument("--calls", type=int, default=10_000)
+    args = parser.parse_args()
+
+    rows = synthetic_stats(args.users)
+    board = Leaderboard()
+    started = time.perf_counter()
+    board.replace(dict(rows))
+    print(f"🔧 Initial index build for {args.users:,} users: {time.perf_counter() - started:.2f}s\n")
+
+    rng = np.random.default_rng(7)
+    users = [f"user-{n}" for n in rng.integers(0, args.users, size=args.calls)]
+    print(f"{'metric':<10}{'top 100 µs':>12}{'rank µs':>10}")
+    for metric in METRICS:
+        top = per_call_us(lambda n: board.top(metric, 100), min(args.calls, 1000))
+        rank = per_call_us(lambda n: board.rank(metric, users[n]), args.calls)
+        print(f"{metric:<10}{top:>12.1f}{rank:>10.2f}")
+
+    update = per_call_us(lambda n: board.record(users[n], [(25.0, 1.5)]), args.calls)
+    print(f"\nIncremental update (all metrics): {update:.2f} µs")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
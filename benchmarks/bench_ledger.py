@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Ledger replay benchmark.
+
+Times the in-process half of a full snapshot rebuild: summing ledger
+entries per user, batch by batch as they arrive from the cursor, for many
+entries (2M by default) spread over many users. The per-user cutoff mode
+is what a run resuming after an interrupted one pays.
+"""
+
+import argparse
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from ledger import REPLAY_BATCH_SIZE, cutoff_column, merge_sums, sum_batch  # noqa: E402
+
+
+def synthetic_batches(count, users, batch_size, seed=42):
+    rng = np.random.default_rng(seed)
+    start = datetime(2025, 1, 1)
+    user_ids = [f"user-{i}" for i in range(users)]
+    owners = rng.integers(0, users, size=count)
+    amounts = rng.normal(0, 10, size=count).round(8)
+    offsets = rng.integers(0, 365 * 24 * 3600, size=count)
+    batches = []
+    for offset in range(0, count, batch_size):
+        batches.append([
+            {"user_id": user_ids[owners[i]], "amount": float(amounts[i]),
+             "at": start + timedelta(seconds=int(offsets[i]))}
+            for i in range(offset, min(count, offset + batch_size))
+        ])
+    since = cutoff_column({user_id: start + timedelta(days=180) for user_id in user_ids})
+    return batches, since
+
+
+def replay_seconds(batches, since=None):
+    started = time.perf_counter()
+    totals = merge_sums([sum_batch(batch, since) for batch in batches])
+    return time.perf_counter() - started, totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ledger replay benchmark")
+    parser.add_argument("--entries", type=int, default=2_000_000)
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--batch-size", type=int, default=REPLAY_BATCH_SIZE)
+    args = parser.parse_args()
+
+    batches, since = synthetic_batches(args.entries, args.users, args.batch_size)
+    for label, cutoffs in (("shared cutoff", None), ("per-user cutoff", since)):
+        elapsed, totals = replay_seconds(batches, cutoffs)
+        print(f"🔧 {label:<16} {args.entries:,} entries, {len(totals):,} users: "
+              f"{elapsed:.2f}s, {args.entries / elapsed:,.0f} entries/s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
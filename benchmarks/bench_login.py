@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Password hashing benchmark.
+
+Runs a burst of concurrent login verifications and, in parallel, a probe task
+that measures how late the event loop wakes it up. It compares bcrypt run
+inline on the event loop with the thread-pool PasswordHasher used by
+/auth/login, and reports logins per second plus event-loop lag percentiles.
+"""
+
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from passwords import PasswordHasher  # noqa: E402
+
+PROBE_INTERVAL = 0.005
+
+
+async def probe_lag(samples, stop):
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        expected = loop.time() + PROBE_INTERVAL
+        await asyncio.sleep(PROBE_INTERVAL)
+        samples.append(max(0.0, loop.time() - expected))
+
+
+async def run_scenario(verify, logins, concurrency):
+    samples, stop = [], asyncio.Event()
+    probe = asyncio.create_task(probe_lag(samples, stop))
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def login():
+        async with semaphore:
+            matches, _ = await verify()
+            assert matches
+
+    started = time.perf_counter()
+    await asyncio.gather(*(login() for _ in range(logins)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await probe
+    return elapsed, samples
+
+
+def percentile(samples, pct):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def report(name, logins, elapsed, samples):
+    print(f"\n📊 {name}:")
+    print(f"Logins: {logins} in {elapsed:.2f} seconds ({logins / elapsed:.1f}/s)")
+    print(f"Event-loop lag p50: {percentile(samples, 50) * 1000:.1f} ms")
+    print(f"Event-loop lag p99: {percentile(samples, 99) * 1000:.1f} ms")
+    print(f"Event-loop lag max: {max(samples, default=0.0) * 1000:.1f} ms")
+    print(f"Lag samples: {len(samples)} (mean {statistics.fmean(samples or [0.0]) * 1000:.1f} ms)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--logins", type=int, default=64)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--rounds", type=int, default=12)
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+
+    hasher = PasswordHasher(rounds=args.rounds, max_workers=args.workers)
+    stored = hasher.hash_sync("TestPass123!")
+
+    async def inline_verify():
+        return hasher.verify_sync("TestPass123!", stored)
+
+    async def pooled_verify():
+        return await hasher.verify("TestPass123!", stored)
+
+    print(f"🚀 bcrypt cost {args.rounds}, {args.logins} logins, concurrency {args.concurrency}")
+    elapsed, samples = asyncio.run(run_scenario(inline_verify, args.logins, args.concurrency))
+    report("Inline on the event loop", args.logins, elapsed, samples)
+    elapsed, samples = asyncio.run(run_scenario(pooled_verify, args.logins, args.concurrency))
+    report(f"Thread pool ({args.workers} workers)", args.logins, elapsed, samples)
+    hasher.shutdown()
+
+
+if __name__ == "__main__":
+    main()
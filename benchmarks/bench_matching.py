@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Matching engine benchmark.
+
+Opens many positions (100k by default) on one symbol with stop-loss and
+take-profit levels spread around the market, then times price ticks:
+ticks that cross no level, and a random walk in which each tick closes
+the positions whose levels it crosses.
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from matching import MatchingEngine, Position  # noqa: E402
+from price_book import Quote  # noqa: E402
+
+
+def open_positions(engine, count, price, seed=42):
+    rng = np.random.default_rng(seed)
+    sides = rng.integers(0, 2, size=count)
+    below = price * (1 - rng.uniform(0.005, 0.05, size=count))
+    above = price * (1 + rng.uniform(0.005, 0.05, size=count))
+    for i in range(count):
+        buy = sides[i] == 0
+        engine.open(Position(
+            id=f"p{i}", user_id=f"u{i % 1000}", symbol="BTC/USDT", side="buy" if buy else "sell",
+            amount=10.0, price=price,
+            stop_loss=float(below[i] if buy else above[i]), take_profit=float(above[i] if buy else below[i]),
+        ))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Matching engine benchmark")
+    parser.add_argument("--positions", type=int, default=100_000)
+    parser.add_argument("--ticks", type=int, default=10_000)
+    args = parser.parse_args()
+
+    price = 45000.0
+    engine = MatchingEngine()
+    started = time.perf_counter()
+    open_positions(engine, args.positions, price)
+    print(f"🔧 Opened {args.positions:,} positions in {time.perf_counter() - started:.2f}s\n")
+
+    quiet = [Quote("BTC/USDT", price * (1 + d), 0.0) for d in np.random.default_rng(1).uniform(-0.004, 0.004, args.ticks)]
+    started = time.perf_counter()
+    for quote in quiet:
+        engine.on_quote(quote)
+    print(f"Tick crossing no level:  {(time.perf_counter() - started) / args.ticks * 1e6:.2f} µs")
+
+    walk = price * np.exp(np.cumsum(np.random.default_rng(2).normal(0, 0.0005, args.ticks)))
+    started = time.perf_counter()
+    for value in walk:
+        engine.on_quote(Quote("BTC/USDT", float(value), 0.0))
+    elapsed = time.perf_counter() - started
+    closed = len(engine.pending)
+    print(f"Random walk: {closed:,} closes over {args.ticks:,} ticks, "
+          f"{elapsed / args.ticks * 1e6:.2f} µs per tick, {elapsed / max(closed, 1) * 1e6:.2f} µs per close")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Stake maturity benchmark.
+
+Seeds a month-end peak of stakes that all fall due at once (50k by
+default, spread over 10k users) into a scratch database on MONGO_URL, then
+times several maturity workers draining them concurrently. Reports
+throughput in stakes per minute and checks every stake matured once.
+--memory runs against mongomock-motor instead, which exercises the claim
+protocol but says nothing about MongoDB throughput.
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from indexes import ensure_indexes  # noqa: E402
+from maturity import MATURITY_BATCH_SIZE, MaturityProcessor  # noqa: E402
+from rewards import STAKING_APR  # noqa: E402
+
+
+def synthetic_due_stakes(count, users, now, seed=42):
+    rng = np.random.default_rng(seed)
+    durations = rng.choice(sorted(STAKING_APR), size=count)
+    overdue = rng.integers(0, 3600, size=count)
+    amounts = rng.uniform(10, 10000, size=count).round(2)
+    owners = rng.integers(0, users, size=count)
+    docs = []
+    for i in range(count):
+        end = now - timedelta(seconds=int(overdue[i]))
+        docs.append({
+            "id": str(uuid.UUID(int=i)),
+            "user_id": f"user-{owners[i]}",
+            "amount": float(amounts[i]),
+            "duration_days": int(durations[i]),
+            "start_date": end - timedelta(days=int(durations[i])),
+            "end_date": end,
+            "is_active": True,
+            "rewards_earned": 0.0,
+        })
+    return docs
+
+
+async def bench(client, stakes, users, workers, batch_size):
+    db = client[f"averix_bench_{uuid.uuid4().hex[:8]}"]
+    now = datetime(2025, 6, 1)
+    try:
+        await ensure_indexes(db)
+        await db.users.insert_many([
+            {"id": f"user-{i}", "email": f"user-{i}@example.com", "tft_balance": 0.0, "staked_amount": 0.0}
+            for i in range(users)
+        ])
+        docs = synthetic_due_stakes(stakes, users, now)
+        for offset in range(0, len(docs), 50000):
+            await db.stakes.insert_many(docs[offset:offset + 50000], ordered=False)
+
+        processors = [MaturityProcessor(batch_size) for _ in range(workers)]
+        started = asyncio.get_running_loop().time()
+        results = await asyncio.gather(*(processor.run(db, now) for processor in processors))
+        elapsed = asyncio.get_running_loop().time() - started
+        released = await db.ledger.count_documents({"type": "stake_release"})
+        return results, elapsed, released
+    finally:
+        await client.drop_database(db.name)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--stakes", type=int, default=50_000)
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--batch-size", type=int, default=MATURITY_BATCH_SIZE)
+    parser.add_argument("--memory", action="store_true", help="use mongomock-motor instead of MONGO_URL")
+    args = parser.parse_args()
+
+    if args.memory:
+        from mongomock_motor import AsyncMongoMockClient
+        client = AsyncMongoMockClient()
+    else:
+        from motor.motor_asyncio import AsyncIOMotorClient
+        client = AsyncIOMotorClient(os.environ.get("MONGO_URL", "mongodb://127.0.0.1:27017"))
+
+    results, elapsed, released = asyncio.run(bench(client, args.stakes, args.users, args.workers, args.batch_size))
+    matured = sum(result["matured"] for result in results)
+    print(f"\n📊 Stake maturity ({args.workers} workers, batch size {args.batch_size:,}):")
+    print(f"Stakes matured: {matured:,} of {args.stakes:,} ({released:,} ledger releases)")
+    print(f"Batches: {sum(result['batches'] for result in results):,}")
+    print(f"Duration: {elapsed:.2f} seconds")
+    print(f"Throughput: {matured / elapsed * 60:,.0f} stakes/min")
+    return 0 if matured == released == args.stakes else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
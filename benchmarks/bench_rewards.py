@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Staking rewards accrual benchmark.
+
+Measures accrual throughput in stakes per second over synthetic active
+stakes (1M by default). Without --mongo only the in-process part is timed:
+column conversion of the stake documents plus the vectorized reward kernel.
+With --mongo the stakes are seeded into a scratch database on MONGO_URL and
+the full streaming job, including bulk writes, is timed end to end.
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from rewards import ACCRUAL_BATCH_SIZE, STAKING_APR, compute_batch, run_accrual  # noqa: E402
+
+
+def synthetic_stakes(count, seed=42):
+    rng = np.random.default_rng(seed)
+    now = datetime(2025, 6, 1)
+    durations = rng.choice(sorted(STAKING_APR), size=count)
+    ages = rng.integers(0, 360 * 24 * 3600, size=count)
+    amounts = rng.uniform(10, 10000, size=count).round(2)
+    user_ids = [f"user-{n}" for n in rng.integers(0, count // 10 + 1, size=count)]
+    docs = []
+    for i in range(count):
+        start = now - timedelta(seconds=int(ages[i]))
+        docs.append({
+            "id": str(uuid.UUID(int=i)),
+            "user_id": user_ids[i],
+            "amount": float(amounts[i]),
+            "duration_days": int(durations[i]),
+            "start_date": start,
+            "end_date": start + timedelta(days=int(durations[i])),
+            "is_active": True,
+            "rewards_earned": 0.0,
+        })
+    return docs, now
+
+
+def bench_in_process(docs, as_of, batch_size):
+    started = time.perf_counter()
+    total = 0.0
+    for offset in range(0, len(docs), batch_size):
+        total += float(compute_batch(docs[offset:offset + batch_size], as_of)["rewards"].sum())
+    elapsed = time.perf_counter() - started
+    return elapsed, total
+
+
+async def bench_mongo(docs, as_of, batch_size):
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    client = AsyncIOMotorClient(os.environ.get("MONGO_URL", "mongodb://127.0.0.1:27017"))
+    db = client[f"averix_bench_{uuid.uuid4().hex[:8]}"]
+    try:
+        for offset in range(0, len(docs), 50000):
+            await db.stakes.insert_many([dict(doc) for doc in docs[offset:offset + 50000]], ordered=False)
+        await db.stakes.create_index("id", unique=True)
+        return await run_accrual(db, as_of=as_of, batch_size=batch_size)
+    finally:
+        await client.drop_database(db.name)
+        client.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--stakes", type=int, default=1_000_000)
+    parser.add_argument("--batch-size", type=int, default=ACCRUAL_BATCH_SIZE)
+    parser.add_argument("--mongo", action="store_true", help="also run the full job against MONGO_URL")
+    args = parser.parse_args()
+
+    print(f"🔧 Generating {args.stakes:,} synthetic active stakes...")
+    docs, as_of = synthetic_stakes(args.stakes)
+
+    elapsed, total = bench_in_process(docs, as_of, args.batch_size)
+    print(f"\n📊 In-process accrual (batch size {args.batch_size:,}):")
+    print(f"Stakes: {len(docs):,}")
+    print(f"Duration: {elapsed:.2f} seconds")
+    print(f"Throughput: {len(docs) / elapsed:,.0f} stakes/s")
+    print(f"Total rewards: {total:,.2f} TFT")
+
+    if args.mongo:
+        stats = asyncio.run(bench_mongo(docs, as_of, args.batch_size))
+        print("\n📊 End-to-end accrual against MongoDB:")
+        print(f"Stakes: {stats['processed']:,} ({stats['updated']:,} updated)")
+        print(f"Duration: {stats['seconds']:.2f} seconds")
+        print(f"Throughput: {stats['stakes_per_second']:,.0f} stakes/s")
+
+
+if __name__ == "__main__":
+    main()
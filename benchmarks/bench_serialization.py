@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Response serialization microbenchmark.
+
+For a representative payload of each endpoint, compares the stock FastAPI
+path (response_model validation + jsonable_encoder + json.dumps) with the
+FastJSONResponse path used by the API router, and reports CPU time per
+response in microseconds.
+"""
+
+import argparse
+import asyncio
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from fastapi.responses import JSONResponse  # noqa: E402
+from fastapi.routing import serialize_response  # noqa: E402
+from fastapi.utils import create_response_field  # noqa: E402
+
+from price_book import PriceBook  # noqa: E402
+from serialization import FastJSONResponse  # noqa: E402
+from server import Stake, TokenResponse, Trade, User  # noqa: E402
+
+
+def mongo_doc(model):
+    # Documents read back from Mongo carry naive UTC datetimes
+    return {
+        key: value.replace(tzinfo=None) if isinstance(value, datetime) else value
+        for key, value in model.model_dump().items()
+    }
+
+
+def payloads():
+    user = User(email="bench@example.com", first_name="Bench", last_name="User", tft_balance=1000.0)
+    now = datetime.now(timezone.utc)
+    trades = [
+        mongo_doc(Trade(user_id=user.id, symbol="BTC/USDT", side="buy", amount=10.0, price=45000.0,
+                        stop_loss=44000.0, take_profit=46000.0, status="closed", closed_at=now, pnl=0.2))
+        for _ in range(50)
+    ]
+    stakes = [
+        mongo_doc(Stake(user_id=user.id, amount=100.0, duration_days=30, end_date=now + timedelta(days=30)))
+        for _ in range(50)
+    ]
+    token = TokenResponse(access_token="x" * 180, user=user.model_dump())
+    return {
+        # name: (response_model or None, content)
+        "auth/register, auth/login": (TokenResponse, token),
+        "user/profile": (User, user),
+        "user/dashboard": (None, {
+            "user": user.model_dump(), "total_staked": 100.0, "total_rewards": 1.5, "active_stakes": 1,
+            "trade_stats": {"total_trades": 10, "successful_trades": 7, "total_pnl": 2.0, "trade_volume": 100.0},
+            "recent_trades": trades[:10],
+        }),
+        "staking/stakes (50)": (None, {"stakes": stakes, "next_cursor": "abc"}),
+        "trading/history (50)": (None, {"trades": trades, "next_cursor": "abc"}),
+        "trading/place-order": (None, {"message": "Order placed successfully", "trade": trades[0]}),
+        "trading/instruments": (None, {"instruments": PriceBook().snapshot()}),
+    }
+
+
+def time_per_call(func, iterations):
+    started = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return (time.perf_counter() - started) / iterations * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+
+    loop = asyncio.new_event_loop()
+
+    async def noop():
+        return None
+
+    # serialize_response is a coroutine; do not charge the event-loop round trip to it
+    loop_overhead = time_per_call(lambda: loop.run_until_complete(noop()), args.iterations)
+    print(f"{'endpoint':<28}{'before µs':>12}{'after µs':>12}{'speedup':>10}")
+    for name, (response_model, content) in payloads().items():
+        field = create_response_field(name="bench", type_=response_model) if response_model else None
+
+        def before():
+            encoded = loop.run_until_complete(serialize_response(field=field, response_content=content))
+            return JSONResponse(encoded).body
+
+        def after():
+            return FastJSONResponse(content).body
+
+        before_us = time_per_call(before, args.iterations) - loop_overhead
+        after_us = time_per_call(after, args.iterations)
+        print(f"{name:<28}{before_us:>12.1f}{after_us:>12.1f}{before_us / after_us:>9.1f}x")
+    loop.close()
+
+
+if __name__ == "__main__":
+    main()
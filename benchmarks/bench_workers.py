@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Multi-worker scaling benchmark.
+
+Starts ``backend/serve.py`` with each worker count in turn (1, 2 and 4 by
+default) against MONGO_URL, waits for /api/health/ready, then drives it
+from several client processes for a fixed duration. Reports throughput and
+latency per worker count, and the speedup over one worker.
+
+The client processes compete with the server for CPU. Run the benchmark on
+a machine with more cores than the largest worker count plus --clients, or
+the numbers measure the load generator instead of the API.
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import os
+import platform
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import httpx
+
+BACKEND = Path(__file__).resolve().parent.parent / "backend"
+PATHS = ("/api/trading/instruments", "/api/health/ready", "/api/public/stats")
+
+
+def percentile(ordered, pct):
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))] if ordered else 0.0
+
+
+async def drive(base_url, paths, concurrency, duration):
+    latencies = []
+    errors = 0
+    deadline = time.perf_counter() + duration
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async def virtual_user(client, offset):
+        nonlocal errors
+        i = offset
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                response = await client.get(paths[i % len(paths)])
+                if response.status_code != 200:
+                    errors += 1
+            except httpx.HTTPError:
+                errors += 1
+            latencies.append(time.perf_counter() - started)
+            i += 1
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=10) as client:
+        await asyncio.gather(*(virtual_user(client, n) for n in range(concurrency)))
+    return latencies, errors
+
+
+def client_process(args):
+    return asyncio.run(drive(*args))
+
+
+def wait_ready(base_url, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if httpx.get(f"{base_url}/api/health/ready", timeout=1).status_code == 200:
+                return True
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.5)
+    return False
+
+
+def run_level(workers, args):
+    server = subprocess.Popen(
+        [sys.executable, str(BACKEND / "serve.py"), "--host", "127.0.0.1", "--port", str(args.port),
+         "--workers", str(workers)],
+        cwd=BACKEND, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    base_url = f"http://127.0.0.1:{args.port}"
+    try:
+        if not wait_ready(base_url):
+            sys.exit(f"Server with {workers} workers did not become ready; is MongoDB running at MONGO_URL?")
+        paths = tuple(args.path) if args.path else PATHS
+        with multiprocessing.Pool(args.clients) as pool:
+            results = pool.map(client_process, [(base_url, paths, args.concurrency, args.duration)] * args.clients)
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+    latencies = sorted(latency for result in results for latency in result[0])
+    errors = sum(result[1] for result in results)
+    return {
+        "workers": workers,
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": len(latencies) / args.duration,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--clients", type=int, default=4, help="load generator processes")
+    parser.add_argument("--concurrency", type=int, default=32, help="connections per client process")
+    parser.add_argument("--duration", type=float, default=15.0, help="seconds per worker count")
+    parser.add_argument("--port", type=int, default=8011)
+    parser.add_argument("--path", action="append", help="endpoint to hit (repeatable)")
+    args = parser.parse_args()
+
+    print(f"🔧 {platform.python_version()} on {os.cpu_count()} cores, "
+          f"{args.clients} client processes x {args.concurrency} connections\n")
+    needed = max(args.workers) + args.clients
+    if (os.cpu_count() or 1) < needed:
+        print(f"⚠️  {needed} cores are needed for {max(args.workers)} workers and {args.clients} clients; "
+              f"the speedups below are not a scaling result\n")
+    print(f"{'workers':>8}{'req/s':>10}{'speedup':>9}{'p50 ms':>9}{'p99 ms':>9}{'errors':>8}")
+    baseline = None
+    for workers in args.workers:
+        result = run_level(workers, args)
+        baseline = baseline or result["rps"]
+        print(f"{workers:>8}{result['rps']:>10.0f}{result['rps'] / baseline:>9.2f}"
+              f"{result['p50_ms']:>9.1f}{result['p99_ms']:>9.1f}{result['errors']:>8}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
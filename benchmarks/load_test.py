@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+"""
+Averix in-process load and latency benchmark.
+
+Drives the FastAPI app in-process through an ASGI client (no network, no
+uvicorn) with concurrent virtual users, and reports throughput plus
+p50/p95/p99 latency per scenario. The app's startup and shutdown hooks run
+around the scenarios, so the trading lease, price feed, matching engine,
+settlement and periodic jobs are live while they do.
+
+Backends:
+  --backend memory   users, stakes and trades in the in-memory repositories,
+                     the remaining collections in mongomock-motor. Neither
+                     waits on I/O, so every repository call first sleeps
+                     --round-trip-ms to let concurrent requests interleave
+                     as they would against Mongo
+  --backend mongo    a scratch database on MONGO_URL, dropped afterwards
+
+Baselines:
+  --save-baseline base.json   record this run
+  --compare base.json         exit 1 if any scenario's throughput drops or
+                              p95 grows by more than --tolerance (default
+                              20%); only meaningful for a baseline taken on
+                              the same machine, as CI does
+"""
+
+import argparse
+import asyncio
+import inspect
+import json
+import logging
+import os
+import platform
+import sys
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+
+import httpx
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+# Scenarios measure the API, not bcrypt; override with --bcrypt-rounds
+os.environ.setdefault("BCRYPT_ROUNDS", "4")
+# A handful of virtual users hammer the write endpoints far past the per-user limits
+for limit in ("RATE_LIMIT_PLACE_ORDER", "RATE_LIMIT_PLACE_ORDERS", "RATE_LIMIT_STAKE"):
+    os.environ.setdefault(limit, "1000000/1")
+
+SCENARIOS = ("register", "login", "dashboard", "place_order", "history")
+
+# Each order locks its amount as margin; small enough that the seeded trades
+# and the place_order scenario fit in the welcome bonus
+ORDER = {
+    "symbol": "BTC/USDT",
+    "side": "buy",
+    "amount": 1.0,
+    "stop_loss": 40000.0,
+    "take_profit": 50000.0,
+}
+
+
+def percentile(ordered, pct):
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))] if ordered else 0.0
+
+
+class RoundTrip:
+    """A repository whose coroutine methods wait ``delay`` seconds first, like a database round trip."""
+
+    def __init__(self, repository, delay):
+        self._repository = repository
+        self._delay = delay
+
+    def __getattr__(self, name):
+        attr = getattr(self._repository, name)
+        if not inspect.iscoroutinefunction(attr):
+            return attr
+
+        async def call(*args, **kwargs):
+            await asyncio.sleep(self._delay)
+            return await attr(*args, **kwargs)
+        return call
+
+
+class LoadTester:
+    def __init__(self, backend="memory", concurrency=32, requests_per_scenario=1000,
+                 users=32, seed_trades=100, round_trip_ms=0.5):
+        self.backend = backend
+        self.round_trip_ms = round_trip_ms
+        self.concurrency = concurrency
+        self.requests_per_scenario = requests_per_scenario
+        self.users = users
+        self.seed_trades = seed_trades
+        self.accounts = []
+        self.results = {}
+
+    async def setup(self):
+        import server
+        from repositories import REPOSITORY_BACKENDS
+
+        if self.backend == "memory":
+            try:
+                from mongomock_motor import AsyncMongoMockClient
+            except ImportError:
+                sys.exit("The memory backend needs mongomock-motor (pip install mongomock-motor)")
+            server.client = AsyncMongoMockClient()
+        else:
+            from motor.motor_asyncio import AsyncIOMotorClient
+            from settings import Settings
+
+            settings = Settings.from_env()
+            server.client = AsyncIOMotorClient(settings.mongo_url, **settings.client_options())
+        server.db = server.client[f"averix_load_{uuid.uuid4().hex[:8]}"]
+        if self.backend == "memory":
+            repos = REPOSITORY_BACKENDS["memory"](server.db)
+            delay = self.round_trip_ms / 1000
+            for name in ("users", "stakes", "trades"):
+                setattr(repos, name, RoundTrip(getattr(repos, name), delay))
+            server.repos = repos
+        else:
+            server.repos = REPOSITORY_BACKENDS["motor"](server.db)
+        self.server = server
+        self.db_name = server.db.name
+        # As uvicorn would; keeps the client and repositories attached above
+        await server.app.router.startup()
+        self.client = httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=server.app), base_url="http://averix.test"
+        )
+
+    async def teardown(self):
+        await self.client.aclose()
+        # Stops the background jobs, then closes the client
+        await self.server.app.router.shutdown()
+        if self.backend == "mongo":
+            from motor.motor_asyncio import AsyncIOMotorClient
+            from settings import Settings
+
+            settings = Settings.from_env()
+            client = AsyncIOMotorClient(settings.mongo_url, **settings.client_options())
+            try:
+                await client.drop_database(self.db_name)
+            finally:
+                client.close()
+
+    async def register(self, email):
+        response = await self.client.post("/api/auth/register", json={
+            "email": email, "password": "LoadTest123!", "first_name": "Load", "last_name": "Test",
+        })
+        response.raise_for_status()
+        return {"email": email, "headers": {"Authorization": f"Bearer {response.json()['access_token']}"}}
+
+    async def seed(self):
+        print(f"🔧 Seeding {self.users} users with {self.seed_trades} trades each...")
+        self.accounts = await asyncio.gather(*(
+            self.register(f"load_{uuid.uuid4().hex}@example.com") for _ in range(self.users)
+        ))
+        for account in self.accounts:
+            for offset in range(0, self.seed_trades, 50):
+                batch = [ORDER] * min(50, self.seed_trades - offset)
+                response = await self.client.post("/api/trading/place-orders", json=batch,
+                                                  headers=account["headers"])
+                response.raise_for_status()
+                if response.json()["rejected"]:
+                    sys.exit(f"Seeding trades failed: {response.json()['results'][-1]['detail']}")
+            response = await self.client.post("/api/staking/stake", json={"amount": 100.0, "duration_days": 30},
+                                              headers=account["headers"])
+            response.raise_for_status()
+
+    def request_for(self, scenario, n):
+        account = self.accounts[n % len(self.accounts)]
+        if scenario == "register":
+            return "POST", "/api/auth/register", {
+                "email": f"load_{uuid.uuid4().hex}@example.com", "password": "LoadTest123!",
+                "first_name": "Load", "last_name": "Test",
+            }, None
+        if scenario == "login":
+            return "POST", "/api/auth/login", {"email": account["email"], "password": "LoadTest123!"}, None
+        if scenario == "dashboard":
+            return "GET", "/api/user/dashboard", None, account["headers"]
+        if scenario == "place_order":
+            return "POST", "/api/trading/place-order", ORDER, account["headers"]
+        if scenario == "history":
+            return "GET", "/api/trading/history?limit=50", None, account["headers"]
+        raise ValueError(scenario)
+
+    async def run_scenario(self, scenario):
+        latencies, errors = [], 0
+        counter = iter(range(self.requests_per_scenario))
+
+        async def worker():
+            nonlocal errors
+            for n in counter:
+                method, path, body, headers = self.request_for(scenario, n)
+                started = time.perf_counter()
+                response = await self.client.request(method, path, json=body, headers=headers)
+                latencies.append(time.perf_counter() - started)
+                if response.status_code != 200:
+                    errors += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(self.concurrency)))
+        elapsed = time.perf_counter() - started
+
+        latencies.sort()
+        result = {
+            "requests": len(latencies),
+            "errors": errors,
+            "seconds": round(elapsed, 3),
+            "throughput": round(len(latencies) / elapsed, 1),
+            "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+            "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+            "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        }
+        self.results[scenario] = result
+        return result
+
+    async def run(self, scenarios):
+        await self.setup()
+        try:
+            await self.seed()
+            print(f"🚀 Running {self.requests_per_scenario} requests per scenario "
+                  f"at concurrency {self.concurrency} ({self.backend} backend)\n")
+            print(f"{'scenario':<14}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}")
+            for scenario in scenarios:
+                result = await self.run_scenario(scenario)
+                print(f"{scenario:<14}{result['throughput']:>10.1f}{result['p50_ms']:>10.2f}"
+                      f"{result['p95_ms']:>10.2f}{result['p99_ms']:>10.2f}{result['errors']:>8}")
+        finally:
+            await self.teardown()
+        return self.results
+
+    def report(self):
+        return {
+            "created_at": datetime.now().isoformat(),
+            "backend": self.backend,
+            "concurrency": self.concurrency,
+            "requests_per_scenario": self.requests_per_scenario,
+            "round_trip_ms": self.round_trip_ms if self.backend == "memory" else None,
+            "python": platform.python_version(),
+            # Numbers only compare across runs on similar hardware
+            "machine": platform.machine(),
+            "cpus": os.cpu_count(),
+            "scenarios": self.results,
+        }
+
+
+def compare(results, baseline, tolerance):
+    """Return a list of human-readable regressions against a saved baseline."""
+    regressions = []
+    for scenario, result in results.items():
+        expected = baseline["scenarios"].get(scenario)
+        if expected is None:
+            continue
+        if result["throughput"] < expected["throughput"] * (1 - tolerance):
+            regressions.append(f"{scenario}: throughput {result['throughput']} req/s "
+                               f"vs baseline {expected['throughput']} req/s")
+        if result["p95_ms"] > expected["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{scenario}: p95 {result['p95_ms']} ms vs baseline {expected['p95_ms']} ms")
+        if result["errors"] > expected["errors"]:
+            regressions.append(f"{scenario}: {result['errors']} errors vs baseline {expected['errors']}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Averix in-process load and latency benchmark")
+    parser.add_argument("--backend", choices=("memory", "mongo"), default="memory")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=1000, help="requests per scenario")
+    parser.add_argument("--users", type=int, default=32, help="seeded users")
+    parser.add_argument("--seed-trades", type=int, default=100, help="trades seeded per user")
+    parser.add_argument("--round-trip-ms", type=float, default=0.5,
+                        help="simulated latency of each repository call on the memory backend")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--bcrypt-rounds", type=int, help="bcrypt cost for register/login")
+    parser.add_argument("--save-baseline", type=Path)
+    parser.add_argument("--compare", type=Path)
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+
+    # The app logs at INFO; one line per in-process request would drown the report
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    if args.bcrypt_rounds is not None:
+        os.environ["BCRYPT_ROUNDS"] = str(args.bcrypt_rounds)
+
+    tester = LoadTester(args.backend, args.concurrency, args.requests, args.users, args.seed_trades,
+                        args.round_trip_ms)
+    results = asyncio.run(tester.run(args.scenarios))
+
+    if args.save_baseline:
+        args.save_baseline.parent.mkdir(parents=True, exist_ok=True)
+        args.save_baseline.write_text(json.dumps(tester.report(), indent=2) + "\n")
+        print(f"\n💾 Baseline saved to {args.save_baseline}")
+
+    if args.compare:
+        regressions = compare(results, json.loads(args.compare.read_text()), args.tolerance)
+        if regressions:
+            print(f"\n❌ {len(regressions)} regression(s) against {args.compare}:")
+            for regression in regressions:
+                print(f"  - {regression}")
+            return 1
+        print(f"\n✅ No regressions against {args.compare} (tolerance {args.tolerance:.0%})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,28 @@
+import asyncio
+import sys
+from pathlib import Path
+
+import pytest
+
+# server.py and its helpers are imported as top-level modules from backend/
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+
+@pytest.fixture
+def server_db(monkeypatch):
+    """server.py pointed at a fresh mongomock database, as its startup hook would.
+
+    Users, stakes and trades go to the memory repositories: mongomock
+    re-applies the filter of a guarded ``find_one_and_update`` to the
+    updated document, so the balance guard in ``increment`` never returns it.
+    """
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+    import server
+    from indexes import ensure_indexes
+    from repositories import memory_repositories
+
+    db = mongomock_motor.AsyncMongoMockClient()["server"]
+    asyncio.run(ensure_indexes(db))
+    monkeypatch.setattr(server, "db", db)
+    monkeypatch.setattr(server, "repos", memory_repositories())
+    return db
@@ -0,0 +1,78 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from analytics import MAX_BUCKETS, AnalyticsCache, TooManyBuckets, build_columns, pnl_report
+from repositories import MemoryTradeRepository
+
+
+def trade(day, pnl, symbol="BTC/USDT", amount=10.0):
+    closed_at = datetime(2025, 3, 1) + timedelta(days=day, hours=12)
+    return {"closed_at": closed_at, "created_at": closed_at, "symbol": symbol, "amount": amount, "pnl": pnl}
+
+
+def test_daily_periods_fill_gaps_and_carry_equity():
+    columns = build_columns(3, [trade(2, -1.0), trade(0, 5.0), trade(0, 1.0, "ETH/USDT")])
+    report = pnl_report(columns, "day")
+
+    assert [p["period"] for p in report["periods"]] == ["2025-03-01", "2025-03-02", "2025-03-03"]
+    assert [p["pnl"] for p in report["periods"]] == [6.0, 0.0, -1.0]
+    assert [p["equity"] for p in report["periods"]] == [6.0, 6.0, 5.0]
+    assert report["summary"]["trades"] == 3
+    assert report["summary"]["max_drawdown"] == 1.0
+    assert report["by_symbol"][0] == {"symbol": "BTC/USDT", "pnl": 4.0, "trades": 2, "win_rate": 0.5, "volume": 20.0}
+
+
+def test_window_starts_from_earlier_equity():
+    columns = build_columns(2, [trade(0, 5.0), trade(10, 2.0)])
+    report = pnl_report(columns, "week", start=datetime(2025, 3, 5, tzinfo=timezone.utc))
+
+    assert report["summary"]["opening_equity"] == 5.0
+    assert report["summary"]["closing_equity"] == 7.0
+    # 2025-03-05 is a Wednesday; weeks start on Monday
+    assert report["periods"][0]["period"] == "2025-03-03"
+    assert sum(p["trades"] for p in report["periods"]) == 1
+
+
+def test_adjacent_windows_share_no_trades():
+    columns = build_columns(3, [trade(0, 1.0), trade(1, 2.0), trade(2, 4.0)])
+    boundary = datetime(2025, 3, 2, 12)  # trade(1) closes exactly here
+    before = pnl_report(columns, "day", end=boundary)["summary"]
+    after = pnl_report(columns, "day", start=boundary)["summary"]
+    assert (before["trades"], after["trades"]) == (1, 2)
+    assert after["opening_equity"] == before["closing_equity"] == 1.0
+    midnight = pnl_report(columns, "day", end=datetime(2025, 3, 3))
+    assert midnight["periods"][-1]["period"] == "2025-03-02"
+
+
+def test_monthly_periods_and_bucket_limit():
+    columns = build_columns(2, [trade(0, 1.0), trade(45, 1.0)])
+    assert [p["period"] for p in pnl_report(columns, "month")["periods"]] == ["2025-03-01", "2025-04-01"]
+    with pytest.raises(TooManyBuckets):
+        pnl_report(columns, "day", start=datetime(2025, 3, 1) - timedelta(days=MAX_BUCKETS))
+
+
+def test_user_without_trades_gets_an_empty_report():
+    report = pnl_report(build_columns(0, []), "day")
+    assert report["periods"] == [] and report["by_symbol"] == []
+    assert report["summary"]["trades"] == 0
+
+
+def test_cache_reloads_when_a_trade_closes():
+    trades = MemoryTradeRepository()
+    cache = AnalyticsCache()
+
+    async def run():
+        await trades.insert_many([
+            {"id": f"t{n}", "user_id": "u1", "status": status, "close_id": None, **trade(n, 1.0)}
+            for n, status in enumerate(("closed", "open"))
+        ])
+        before = await cache.get(trades, "u1")
+        # Closed by another worker, so this one's cache was never invalidated
+        await trades.close([("t1", {"status": "closed", "pnl": 2.0, "close_id": "c1"})])
+        return before, await cache.get(trades, "u1")
+
+    before, after = asyncio.run(run())
+    assert len(before) == 1
+    assert len(after) == 2 and after.pnl.sum() == 3.0
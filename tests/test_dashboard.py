@@ -0,0 +1,41 @@
+import asyncio
+
+import pytest
+
+import server
+from price_book import PriceBook
+from repositories import RECENT_TRADE_PROJECTION
+from server import StakeRequest, TradeRequest, User
+
+
+@pytest.fixture
+def book(monkeypatch):
+    book = PriceBook()
+    book.update("BTC/USDT", 100.0)
+    monkeypatch.setattr(server, "price_book", book)
+    return book
+
+
+def test_dashboard_totals_and_recent_trades(server_db, book):
+    async def run():
+        user = User(email="dash@example.com", first_name="D", last_name="B", tft_balance=1000.0)
+        await server.repos.users.insert({**user.model_dump(), "password": "x"})
+        for amount, days in ((100.0, 30), (50.0, 14)):
+            await server.open_stake(StakeRequest(amount=amount, duration_days=days), user)
+        order = TradeRequest(symbol="BTC/USDT", side="buy", amount=10.0, stop_loss=90.0, take_profit=110.0)
+        await server.fill_orders([order] * 12, user)
+        # Someone else's trades stay off this dashboard
+        other = User(email="other@example.com", first_name="O", last_name="T", tft_balance=1000.0)
+        await server.repos.users.insert({**other.model_dump(), "password": "x"})
+        response = await server.fill_orders([order], other)
+        return await server.get_dashboard(current_user=user), user, response["results"][0]["trade"]["id"]
+
+    dashboard, user, other_trade = asyncio.run(run())
+    assert (dashboard["total_staked"], dashboard["active_stakes"]) == (150.0, 2)
+    assert dashboard["trade_stats"] == {"total_trades": 12, "successful_trades": 0, "total_pnl": 0.0,
+                                        "trade_volume": 120.0}
+    recent = dashboard["recent_trades"]
+    assert len(recent) == 10 and other_trade not in {trade["id"] for trade in recent}
+    assert all(set(trade) == set(RECENT_TRADE_PROJECTION) - {"_id"} for trade in recent)
+    assert [trade["created_at"] for trade in recent] == sorted((trade["created_at"] for trade in recent), reverse=True)
+    assert dashboard["user"]["id"] == user.id
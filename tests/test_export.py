@@ -0,0 +1,81 @@
+import asyncio
+import csv
+import io
+import json
+from datetime import datetime, timedelta
+
+import pyarrow.parquet as pq
+import pytest
+
+from export import EXPORT_COLUMNS, EXPORT_FORMATS, EXPORT_PROJECTION
+from repositories import REPOSITORY_BACKENDS, MemoryTradeRepository
+
+START = datetime(2025, 1, 1)
+
+
+def trades(count):
+    return [
+        {"id": f"t{n:03d}", "user_id": "u1", "symbol": "BTC/USDT" if n % 2 else "ETH/USDT", "side": "buy",
+         "amount": 10.0, "price": 100.0, "stop_loss": None, "take_profit": 110.0,
+         "status": "closed" if n % 3 else "open", "created_at": START + timedelta(minutes=n // 2),
+         "closed_at": None if n % 3 == 0 else START + timedelta(hours=1), "close_price": None,
+         "close_reason": None, "pnl": 0.5, "close_id": "internal"}
+        for n in range(count)
+    ]
+
+
+async def export(repo, name, batch_size=4, **filters):
+    chunks = [chunk async for chunk in EXPORT_FORMATS[name].encode(
+        repo.batches("u1", batch_size, EXPORT_PROJECTION, **filters)
+    )]
+    return chunks
+
+
+def seeded_memory_repo(count=25):
+    repo = MemoryTradeRepository()
+    asyncio.run(repo.insert_many(trades(count)))
+    return repo
+
+
+def test_csv_streams_one_chunk_per_batch():
+    chunks = asyncio.run(export(seeded_memory_repo(), "csv"))
+    # Header, then 25 trades in batches of 4
+    assert len(chunks) == 1 + 7
+    rows = list(csv.reader(io.StringIO(b"".join(chunks).decode())))
+    assert tuple(rows[0]) == EXPORT_COLUMNS
+    assert [row[0] for row in rows[1:]] == [f"t{n:03d}" for n in range(25)]
+    first = dict(zip(rows[0], rows[1]))
+    assert first["created_at"] == "2025-01-01T00:00:00+00:00"
+    assert first["stop_loss"] == "" and first["closed_at"] == ""
+
+
+def test_ndjson_applies_filters_and_hides_internal_fields():
+    chunks = asyncio.run(export(seeded_memory_repo(), "ndjson", symbol="BTC/USDT", status="closed",
+                                start=START + timedelta(minutes=2), end=START + timedelta(minutes=10)))
+    rows = [json.loads(line) for line in b"".join(chunks).decode().splitlines()]
+    assert [row["id"] for row in rows] == ["t005", "t007", "t011", "t013", "t017", "t019"]
+    assert set(rows[0]) == set(EXPORT_COLUMNS)
+    assert rows[0]["closed_at"] == "2025-01-01T01:00:00+00:00"
+
+
+def test_backends_stream_the_same_batches():
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+
+    async def run(repo):
+        await repo.insert_many(trades(25))
+        return [[trade["id"] for trade in batch]
+                async for batch in repo.batches("u1", 4, EXPORT_PROJECTION, status="closed")]
+
+    results = {
+        name: asyncio.run(run(factory(mongomock_motor.AsyncMongoMockClient()["export"]).trades))
+        for name, factory in REPOSITORY_BACKENDS.items()
+    }
+    assert results["memory"] == results["motor"]
+    assert [len(batch) for batch in results["memory"]] == [4, 4, 4, 4]
+
+
+def test_parquet_round_trip():
+    chunks = asyncio.run(export(seeded_memory_repo(), "parquet"))
+    table = pq.read_table(io.BytesIO(b"".join(chunks)))
+    assert table.num_rows == 25 and table.column_names == list(EXPORT_COLUMNS)
+    assert pq.ParquetFile(io.BytesIO(b"".join(chunks))).num_row_groups == 7
@@ -0,0 +1,127 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from idempotency import IdempotencyInProgress, IdempotencyMismatch, IdempotencyStore, StoredResponse
+from indexes import ensure_indexes
+
+
+def mock_db():
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+    return mongomock_motor.AsyncMongoMockClient()["idempotency"]
+
+
+class Handler:
+    def __init__(self, delay=0.0, fail=False):
+        self.calls = 0
+        self.delay = delay
+        self.fail = fail
+
+    async def __call__(self):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError("boom")
+        return StoredResponse(200, b'{"call":%d}' % self.calls)
+
+
+def test_retries_replay_the_first_response():
+    db = mock_db()
+
+    async def run():
+        await ensure_indexes(db)
+        store = IdempotencyStore(lambda: db)
+        handler = Handler(delay=0.01)
+        # Concurrent duplicates wait for the first request instead of running
+        results = await asyncio.gather(*(store.run("u1:stake", "k1", "fp", handler) for _ in range(5)))
+        later = await store.run("u1:stake", "k1", "fp", handler)
+        other_user = await store.run("u2:stake", "k1", "fp", handler)
+        with pytest.raises(IdempotencyMismatch):
+            await store.run("u1:stake", "k1", "other body", handler)
+        return handler.calls, results, later, other_user, await db.idempotency_keys.find_one({"key": "u1:stake:k1"})
+
+    calls, results, later, other_user, record = asyncio.run(run())
+    assert calls == 2
+    assert [replayed for _, replayed in results].count(False) == 1
+    assert {response.body for response, _ in results} == {b'{"call":1}'}
+    assert later == (StoredResponse(200, b'{"call":1}'), True)
+    assert other_user == (StoredResponse(200, b'{"call":2}'), False)
+    assert record["status"] == "completed" and record["status_code"] == 200
+
+
+def test_workers_share_completed_and_pending_keys():
+    db = mock_db()
+
+    async def run():
+        await ensure_indexes(db)
+        first, second = IdempotencyStore(lambda: db, poll_interval=0.001), IdempotencyStore(lambda: db, poll_interval=0.001)
+        handler = Handler(delay=0.05)
+        # The second worker polls the pending record until the first completes it
+        (a, _), (b, replayed) = await asyncio.gather(
+            first.run("u1:order", "k", "fp", handler),
+            second.run("u1:order", "k", "fp", handler),
+        )
+        return handler.calls, a, b, replayed
+
+    calls, a, b, replayed = asyncio.run(run())
+    assert calls == 1 and a == b and replayed
+
+
+def test_failed_requests_release_the_key_and_pending_ones_are_not_taken_over():
+    db = mock_db()
+    untimed = mock_db()
+
+    async def run():
+        await ensure_indexes(db)
+        store = IdempotencyStore(lambda: db, pending_timeout=0.05, poll_interval=0.001)
+        with pytest.raises(RuntimeError):
+            await store.run("u1:order", "failed", "fp", Handler(fail=True))
+        retried = await store.run("u1:order", "failed", "fp", Handler())
+
+        # A worker that died holding a key, or one still running: others
+        # wait, and only run it once the TTL index has dropped the record,
+        # which can be a while past expires_at. mongomock drops it on read
+        # where there is a TTL index, hence a database without one
+        await untimed.idempotency_keys.create_index("key", unique=True)
+        store = IdempotencyStore(lambda: untimed, pending_timeout=0.05, poll_interval=0.001)
+        await untimed.idempotency_keys.insert_one({
+            "key": "u1:order:abandoned", "status": "pending", "fingerprint": "fp",
+            "expires_at": datetime.now(timezone.utc) - timedelta(seconds=1),
+        })
+        handler = Handler()
+        with pytest.raises(IdempotencyInProgress):
+            await store.run("u1:order", "abandoned", "fp", handler)
+        calls_while_pending = handler.calls
+        await untimed.idempotency_keys.delete_one({"key": "u1:order:abandoned"})
+        expired = await store.run("u1:order", "abandoned", "fp", handler)
+        return retried, calls_while_pending, expired
+
+    retried, calls_while_pending, expired = asyncio.run(run())
+    assert retried == (StoredResponse(200, b'{"call":1}'), False)
+    assert calls_while_pending == 0
+    assert expired == (StoredResponse(200, b'{"call":1}'), False)
+
+
+def test_retryable_responses_release_the_key():
+    db = mock_db()
+
+    class Conflict(Handler):
+        async def __call__(self):
+            response = await super().__call__()
+            return StoredResponse(409, b'{"detail":"retry"}') if self.calls == 1 else response
+
+    async def run():
+        await ensure_indexes(db)
+        store = IdempotencyStore(lambda: db)
+        handler = Conflict()
+        first = await store.run("u1:orders", "k", "fp", handler)
+        retried = await store.run("u1:orders", "k", "fp", handler)
+        replayed = await store.run("u1:orders", "k", "fp", handler)
+        return handler.calls, first, retried, replayed
+
+    calls, first, retried, replayed = asyncio.run(run())
+    assert calls == 2
+    assert first == (StoredResponse(409, b'{"detail":"retry"}'), False)
+    assert retried == (StoredResponse(200, b'{"call":2}'), False)
+    assert replayed == (retried[0], True)
@@ -0,0 +1,45 @@
+import asyncio
+import os
+import uuid
+
+import pytest
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import MongoClient
+from pymongo.errors import PyMongoError
+
+from indexes import ensure_indexes, plan_stages, verify_query_plans
+
+MONGO_URL = os.getenv("MONGO_URL", "mongodb://127.0.0.1:27017")
+
+
+def mongod_available():
+    try:
+        MongoClient(MONGO_URL, serverSelectionTimeoutMS=300).admin.command("ping")
+        return True
+    except PyMongoError:
+        return False
+
+
+def test_plan_stages_walks_nested_plans():
+    plan = {
+        "stage": "LIMIT",
+        "inputStage": {"stage": "FETCH", "inputStage": {"stage": "IXSCAN"}},
+        "inputStages": [{"stage": "COLLSCAN"}],
+    }
+    assert list(plan_stages(plan)) == ["LIMIT", "FETCH", "IXSCAN", "COLLSCAN"]
+
+
+@pytest.mark.skipif(not mongod_available(), reason="needs a local mongod")
+def test_hot_queries_use_indexes():
+    async def run():
+        client = AsyncIOMotorClient(MONGO_URL)
+        db = client[f"averix_index_test_{uuid.uuid4().hex[:8]}"]
+        try:
+            await ensure_indexes(db)
+            await ensure_indexes(db)  # idempotent
+            return await verify_query_plans(db)
+        finally:
+            await client.drop_database(db.name)
+            client.close()
+
+    assert asyncio.run(run()) == []
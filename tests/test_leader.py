@@ -0,0 +1,28 @@
+import asyncio
+
+import pytest
+
+from leader import LeaderLease
+
+
+def leases():
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+    return mongomock_motor.AsyncMongoMockClient()["leader"].leases
+
+
+def test_one_worker_holds_the_lease_until_it_expires_or_is_released():
+    collection = leases()
+    first = LeaderLease(lambda: collection, "trading", ttl=0.1, holder="first")
+    second = LeaderLease(lambda: collection, "trading", ttl=0.1, holder="second")
+
+    async def run():
+        steps = [await first.acquire(), await second.acquire(), await first.acquire()]
+        # The holder stalls past its ttl; the next worker to ask takes over
+        await asyncio.sleep(0.15)
+        steps += [await second.acquire(), await first.acquire()]
+        await second.release()
+        steps += [second.is_leader, await first.acquire()]
+        return steps
+
+    assert asyncio.run(run()) == [True, False, True, True, False, False, True]
+    assert not second.is_leader
@@ -0,0 +1,97 @@
+import asyncio
+
+import pytest
+
+from leaderboard import (MIN_TRADES_FOR_WIN_RATE, Leaderboard, display_name, is_promotion, reconcile,
+                         trading_level)
+
+
+def test_ranks_follow_incremental_updates():
+    board = Leaderboard()
+    board.record("alice", [(100.0, 5.0)])
+    board.record("bob", [(50.0, 8.0)])
+    board.record("carol", [(500.0, -2.0)])
+
+    assert [user_id for _, user_id, _ in board.top("pnl", 10)] == ["bob", "alice", "carol"]
+    assert [user_id for _, user_id, _ in board.top("volume", 2)] == ["carol", "alice"]
+
+    board.record("alice", [(10.0, 4.0)])
+    assert board.rank("pnl", "alice") == 1
+    assert board.rank("pnl", "bob") == 2
+    assert board.rank("pnl", "nobody") is None
+    assert board.ranked("pnl") == 3
+
+
+def test_win_rate_needs_minimum_trades():
+    board = Leaderboard()
+    board.record("lucky", [(10.0, 1.0)])
+    board.record("steady", [(10.0, 1.0)] * (MIN_TRADES_FOR_WIN_RATE - 1) + [(10.0, -1.0)])
+
+    assert board.rank("win_rate", "lucky") is None
+    assert board.rank("win_rate", "steady") == 1
+    assert board.stats("steady")[:2] == (MIN_TRADES_FOR_WIN_RATE, MIN_TRADES_FOR_WIN_RATE - 1)
+
+
+def test_replace_rebuilds_from_snapshot():
+    board = Leaderboard()
+    board.record("stale", [(10.0, 100.0)])
+    board.replace({"a": (3, 2, 12.0, 300.0), "b": (1, 1, 20.0, 10.0)})
+
+    assert len(board) == 2
+    assert board.rank("pnl", "stale") is None
+    assert [user_id for _, user_id, _ in board.top("pnl", 10)] == ["b", "a"]
+
+
+def test_trading_levels_and_promotion():
+    assert trading_level(0, 0) == "Bronze"
+    assert trading_level(30, 20) == "Silver"
+    assert trading_level(120, 50) == "Bronze"
+    assert trading_level(600, 400) == "Prime"
+    assert is_promotion("Bronze", "Gold")
+    assert not is_promotion("Gold", "Silver")
+
+
+def test_display_name_uses_last_initial():
+    assert display_name({"first_name": "Ada", "last_name": "Lovelace"}) == "Ada L."
+    assert display_name({}) == "Trader"
+
+
+def test_build_indexes_matches_incremental_keys():
+    stats = {"a": (12, 9, 30.5, 400.0), "b": (15, 9, -3.25, 90.0), "c": (2, 2, 30.5, 10.0)}
+    built = Leaderboard()
+    built.replace(dict(stats))
+    incremental = Leaderboard()
+    for user_id, user_stats in stats.items():
+        incremental.set_stats(user_id, user_stats)
+
+    for metric in ("pnl", "win_rate", "volume"):
+        assert built.top(metric, 10) == incremental.top(metric, 10)
+    # Keys built in bulk must be removable by later incremental updates
+    built.record("b", [(10.0, 50.0)])
+    assert built.rank("pnl", "b") == 1
+    assert built.ranked("pnl") == 3
+
+
+def test_reconcile_moves_only_changed_users():
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+    db = mongomock_motor.AsyncMongoMockClient()["leaderboard"]
+    summary = {"successful_trades": 1, "total_pnl": 1.0, "trade_volume": 10.0}
+
+    async def run():
+        await db.portfolio_summary.insert_many([
+            {"user_id": "a", "total_trades": 1, **summary},
+            {"user_id": "b", "total_trades": 1, **summary, "total_pnl": 5.0},
+            {"user_id": "idle", "total_trades": 0},
+        ])
+        board = Leaderboard()
+        first = await reconcile(db, board)
+        await db.portfolio_summary.update_one({"user_id": "a"}, {"$inc": {"total_trades": 1, "total_pnl": 9.0}})
+        board.record("gone", [(1.0, 1.0)])
+        second = await reconcile(db, board)
+        return board, first, second
+
+    board, first, second = asyncio.run(run())
+    assert first == {"users": 2, "changed": 2}
+    assert second == {"users": 2, "changed": 2}
+    assert board.rank("pnl", "a") == 1
+    assert board.rank("pnl", "gone") is None
@@ -0,0 +1,116 @@
+import asyncio
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+import ledger
+from indexes import ensure_indexes
+from ledger import (
+    LedgerWriter, cutoff_column, find_drift, ledger_balance, ledger_entry, merge_sums, repair_drift, sum_batch,
+    take_snapshots,
+)
+
+
+def test_replay_sums_per_user_and_skips_entries_already_in_a_snapshot():
+    day = datetime(2025, 1, 1)
+    docs = [
+        {"user_id": "u1", "amount": 1000.0, "at": day},
+        {"user_id": "u2", "amount": 50.0, "at": day},
+        {"user_id": "u1", "amount": -100.0, "at": day + timedelta(days=2)},
+    ]
+    assert merge_sums([sum_batch(docs), sum_batch(docs[:1])]) == {"u1": 1900.0, "u2": 50.0}
+    # u1's snapshot already covers the first day
+    since = cutoff_column({"u1": day + timedelta(days=1)})
+    assert merge_sums([sum_batch(docs, since)]) == {"u1": -100.0, "u2": 50.0}
+
+
+def test_writer_commits_concurrent_appends_together():
+    inserts = []
+
+    async def insert_many(entries, ordered):
+        inserts.append(len(entries))
+        return SimpleNamespace(inserted_ids=[None] * len(entries))
+
+    db = SimpleNamespace(ledger=SimpleNamespace(insert_many=insert_many))
+    writer = LedgerWriter(lambda: db, max_batch=3, max_delay=0.01)
+
+    async def run():
+        await asyncio.gather(*(writer.append(ledger_entry("trade_pnl", "u1", 1.0, f"t{i}")) for i in range(5)))
+
+    asyncio.run(run())
+    # Filling a batch writes it at once; the remainder waits for the delay
+    assert inserts == [3, 2]
+
+
+def test_balance_is_snapshot_plus_tail_and_drift_is_repaired():
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+    db = mongomock_motor.AsyncMongoMockClient()["ledger"]
+    start = datetime(2025, 1, 1)
+
+    async def run():
+        await db.ledger.create_index("id", unique=True)
+        await db.users.insert_many([{"id": "u1", "tft_balance": 880.0}, {"id": "u2", "tft_balance": 5.0}])
+        writer = LedgerWriter(lambda: db)
+        await writer.append(
+            ledger_entry("welcome_bonus", "u1", 1000.0, "u1", at=start),
+            ledger_entry("stake_lock", "u1", -100.0, "s1", at=start + timedelta(hours=1)),
+        )
+        # Writing an entry again changes nothing
+        await writer.append(ledger_entry("stake_lock", "u1", -100.0, "s1", at=start + timedelta(hours=1)))
+        await take_snapshots(db, cutoff=start + timedelta(days=1))
+        await writer.append(ledger_entry("trade_pnl", "u1", -20.0, "t1", at=start + timedelta(days=2)))
+        incremental = await take_snapshots(db, cutoff=start + timedelta(days=3))
+        await writer.append(ledger_entry("trade_pnl", "u1", 0.5, "t2", at=start + timedelta(days=4)))
+
+        balance = await ledger_balance(db, "u1")
+        snapshot = await db.ledger_snapshots.find_one({"user_id": "u1"})
+        await take_snapshots(db, cutoff=start + timedelta(days=3), full=True)
+        rebuilt = await db.ledger_snapshots.find_one({"user_id": "u1"})
+
+        drift = await find_drift(db)
+        await repair_drift(db, drift)
+        return balance, snapshot, rebuilt, incremental, drift, await find_drift(db), await ledger_balance(db, "u2")
+
+    balance, snapshot, rebuilt, incremental, drift, after_repair, unledgered = asyncio.run(run())
+    assert balance == 880.5
+    # u2 predates the ledger: no balance from it, and not drift
+    assert unledgered is None
+    assert snapshot["balance"] == rebuilt["balance"] == 880.0
+    # The second snapshot only replayed the entry since the first
+    assert incremental["entries"] == 1
+    assert sorted((row["user_id"], row["ledger_balance"]) for row in drift) == [("u1", 880.5)]
+    assert after_repair == []
+
+
+def test_overlapping_snapshot_runs_count_entries_once(monkeypatch):
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+    db = mongomock_motor.AsyncMongoMockClient()["ledger"]
+    start = datetime(2025, 1, 1)
+    replay = ledger.replay
+
+    async def slow_replay(*args, **kwargs):
+        result = await replay(*args, **kwargs)
+        if not overtaken:
+            overtaken.append(True)
+            # Another run replays the same window and writes first
+            await take_snapshots(db, cutoff=start + timedelta(days=4))
+        return result
+
+    async def run():
+        await ensure_indexes(db)
+        await db.ledger.insert_one(ledger_entry("welcome_bonus", "u1", 100.0, "u1", at=start))
+        await take_snapshots(db, cutoff=start + timedelta(days=1))
+        await db.ledger.insert_many([
+            ledger_entry("trade_pnl", "u1", 5.0, "t1", at=start + timedelta(days=2)),
+            ledger_entry("welcome_bonus", "u2", 100.0, "u2", at=start + timedelta(days=2)),
+        ])
+        monkeypatch.setattr(ledger, "replay", slow_replay)
+        await take_snapshots(db, cutoff=start + timedelta(days=3))
+        return {doc["user_id"]: doc async for doc in db.ledger_snapshots.find({}, {"_id": 0})}
+
+    overtaken = []
+    snapshots = asyncio.run(run())
+    assert {user_id: doc["balance"] for user_id, doc in snapshots.items()} == {"u1": 105.0, "u2": 100.0}
+    # The slower run does not move the snapshots back to its own cutoff
+    assert {doc["through"] for doc in snapshots.values()} == {start + timedelta(days=4)}
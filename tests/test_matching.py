@@ -0,0 +1,122 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+
+from indexes import ensure_indexes
+from matching import MatchingEngine, Position, close_trades, credit_closes, load_open_positions
+from price_book import Quote
+from repositories import REPOSITORY_BACKENDS
+
+
+def position(id, side="buy", price=100.0, stop_loss=90.0, take_profit=110.0, symbol="BTC/USDT", user_id="u1",
+             margin=0.0):
+    return Position(id=id, user_id=user_id, symbol=symbol, side=side, amount=10.0, price=price,
+                    stop_loss=stop_loss, take_profit=take_profit, margin=margin)
+
+
+def tick(engine, price, symbol="BTC/USDT"):
+    return engine.on_quote(Quote(symbol, price, 0.0))
+
+
+def test_ticks_close_only_positions_whose_levels_are_crossed():
+    engine = MatchingEngine()
+    engine.open(position("long"))
+    engine.open(position("short", side="sell", stop_loss=105.0, take_profit=80.0))
+    engine.open(position("other", symbol="ETH/USDT"))
+
+    assert tick(engine, 100.0) == []
+    closed = tick(engine, 106.0)
+    assert [(c.position.id, c.close_reason) for c in closed] == [("short", "stop_loss")]
+    assert closed[0].pnl == pytest.approx(-0.6)
+
+    closed = tick(engine, 111.0)
+    assert [(c.position.id, c.close_reason) for c in closed] == [("long", "take_profit")]
+    assert closed[0].pnl == pytest.approx(1.1)
+    assert len(engine) == 1 and "other" in engine
+    assert [c.position.id for c in engine.drain(10)] == ["short", "long"]
+    assert engine.pending == []
+
+
+def test_stale_levels_are_skipped_and_compacted():
+    engine = MatchingEngine()
+    for n in range(500):
+        engine.open(position(f"p{n}", stop_loss=90.0 - n * 0.01))
+    # Every position closes through its take profit, leaving its stop loss behind
+    assert len(tick(engine, 120.0)) == 500
+    assert tick(engine, 50.0) == []
+    book = engine._books["BTC/USDT"]
+    assert len(book.falling) <= 2 * 64
+
+
+def test_manual_close_removes_both_levels():
+    engine = MatchingEngine()
+    engine.open(position("p1"))
+    close = engine.close("p1", 95.0)
+    assert close.close_reason == "manual" and close.pnl == pytest.approx(-0.5)
+    assert engine.close("p1", 95.0) is None
+    assert tick(engine, 50.0) == [] and tick(engine, 150.0) == []
+    # Picked up again from Mongo before its close settled: stays closed
+    engine.open(position("p1"))
+    assert "p1" not in engine
+
+
+@pytest.mark.parametrize("backend", sorted(REPOSITORY_BACKENDS))
+def test_settlement_is_exactly_once_and_recovers_open_positions(backend):
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+    db = mongomock_motor.AsyncMongoMockClient()["matching"]
+    repos = REPOSITORY_BACKENDS[backend](db)
+
+    async def run():
+        await ensure_indexes(db)
+        await repos.users.insert({"id": "u1", "email": "u1@example.com", "tft_balance": 1000.0, "successful_trades": 0})
+        await repos.trades.insert_many([
+            {**position(id).__dict__, "status": "open", "created_at": datetime(2024, 1, 1)} for id in ("p1", "p2", "p3")
+        ])
+        engine = MatchingEngine()
+        assert await load_open_positions(repos.trades, engine) == 3
+
+        closes = tick(engine, 111.0)
+        assert len(await close_trades(repos.trades, closes)) == 3
+        # A retried batch still reports the closes that landed the first time
+        landed = await close_trades(repos.trades, closes)
+        assert len(landed) == 3
+        assert len(await credit_closes(db, repos.users, landed)) == 3
+        # The batch is requeued when a later step fails; its PnL is not paid again
+        assert await credit_closes(db, repos.users, landed) == []
+
+        # Another engine that still holds p1 open cannot close it again
+        stale = MatchingEngine()
+        stale.open(position("p1"))
+        assert await close_trades(repos.trades, [stale.close("p1", 120.0)]) == []
+        assert await repos.trades.open_positions() == []
+        return await repos.users.get("u1"), await db.portfolio_summary.find_one({"user_id": "u1"})
+
+    user, summary = asyncio.run(run())
+    assert user["tft_balance"] == pytest.approx(1003.3)
+    assert user["successful_trades"] == 3
+    assert summary["total_pnl"] == pytest.approx(3.3)
+
+
+def test_close_releases_margin_and_caps_the_loss():
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+    db = mongomock_motor.AsyncMongoMockClient()["matching"]
+    repos = REPOSITORY_BACKENDS["memory"](db)
+
+    async def run():
+        await ensure_indexes(db)
+        # 20 TFT of margin locked when the positions opened
+        await repos.users.insert({"id": "u1", "email": "u1@example.com", "tft_balance": 0.0, "open_margin": 20.0})
+        engine = MatchingEngine()
+        engine.open(position("long", margin=10.0))
+        engine.open(position("short", side="sell", stop_loss=110.0, take_profit=90.0, margin=10.0))
+        # The short gaps far past its stop loss
+        closes = [engine.close("long", 105.0), engine.close("short", 350.0)]
+        await credit_closes(db, repos.users, closes)
+        await credit_closes(db, repos.users, closes)
+        return closes, await repos.users.get("u1")
+
+    closes, user = asyncio.run(run())
+    assert [close.pnl for close in closes] == [0.5, -10.0]
+    assert user["tft_balance"] == pytest.approx(10.5)
+    assert user["open_margin"] == pytest.approx(0.0)
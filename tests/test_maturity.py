@@ -0,0 +1,112 @@
+import asyncio
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+from maturity import MaturityProcessor
+from rewards import STAKING_APR
+
+
+def stake(id, user_id, end_date, amount=100.0, duration_days=30):
+    return {
+        "id": id, "user_id": user_id, "amount": amount, "duration_days": duration_days,
+        "start_date": end_date - timedelta(days=duration_days), "end_date": end_date,
+        "is_active": True, "rewards_earned": 0.0,
+    }
+
+
+def test_concurrent_workers_settle_each_due_stake_once():
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+    db = mongomock_motor.AsyncMongoMockClient()["maturity"]
+    now = datetime(2025, 6, 1)
+
+    async def run():
+        await db.ledger.create_index("id", unique=True)
+        await db.users.insert_many([
+            {"id": f"u{i}", "tft_balance": 0.0, "staked_amount": 100.0 * 5} for i in range(4)
+        ])
+        await db.stakes.insert_many(
+            [stake(f"s{i}", f"u{i % 4}", now - timedelta(hours=i + 1)) for i in range(19)]
+            + [stake("later", "u0", now + timedelta(days=1))]
+        )
+        matured = []
+        workers = [MaturityProcessor(batch_size=3, on_matured=matured.extend) for _ in range(3)]
+        results = await asyncio.gather(*(worker.run(db, now) for worker in workers))
+        return results, matured, await db.users.find({}, {"_id": 0}).sort("id", 1).to_list(None)
+
+    results, matured, users = asyncio.run(run())
+    assert sum(result["matured"] for result in results) == 19
+    assert set(matured) == {"u0", "u1", "u2", "u3"}
+    reward = 100.0 * STAKING_APR[30] * 30 / 365
+    # u0 has stakes s0, s4, ..., s16; its later stake is not due yet
+    assert users[0]["tft_balance"] == pytest.approx(5 * (100.0 + reward))
+    assert users[0]["staked_amount"] == pytest.approx(0.0)
+    assert users[3]["tft_balance"] == pytest.approx(4 * (100.0 + reward))
+    assert results[0]["backlog"] == 0
+
+
+def test_abandoned_claims_are_taken_over_and_backlog_is_reported():
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+    db = mongomock_motor.AsyncMongoMockClient()["maturity"]
+    now = datetime(2025, 6, 1)
+
+    async def run():
+        await db.users.insert_one({"id": "u1", "tft_balance": 0.0, "staked_amount": 200.0})
+        await db.stakes.insert_many([stake("s1", "u1", now - timedelta(hours=2)), stake("s2", "u1", now)])
+        processor = MaturityProcessor(claim_timeout=60)
+        # A worker claimed both stakes and died before settling them
+        assert len(await processor.claim(db, now)) == 2
+        await processor.measure(db, now)
+        backlog = (processor.backlog, processor.lag_seconds)
+        assert (await processor.run(db, now))["matured"] == 0
+        takeover = await processor.run(db, now + timedelta(seconds=61))
+        return backlog, takeover, await db.users.find_one({"id": "u1"})
+
+    backlog, takeover, user = asyncio.run(run())
+    assert backlog == (2, 7200.0)
+    assert takeover["matured"] == 2
+    assert user["tft_balance"] == pytest.approx(2 * (100.0 + 100.0 * STAKING_APR[30] * 30 / 365))
+
+
+def test_a_failed_balance_write_is_paid_by_a_later_pass():
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+    db = mongomock_motor.AsyncMongoMockClient()["maturity"]
+    now = datetime(2025, 6, 1)
+
+    class FailingUsers:
+        def __init__(self, users):
+            self.users = users
+
+        def __getattr__(self, name):
+            return getattr(self.users, name)
+
+        async def bulk_write(self, *args, **kwargs):
+            raise RuntimeError("users write failed")
+
+    async def run():
+        await db.ledger.create_index("id", unique=True)
+        await db.users.insert_one({"id": "u1", "tft_balance": 0.0, "staked_amount": 200.0})
+        await db.stakes.insert_many([stake("s1", "u1", now - timedelta(hours=2)), stake("s2", "u1", now)])
+        processor = MaturityProcessor(claim_timeout=60)
+        failing = SimpleNamespace(stakes=db.stakes, ledger=db.ledger, portfolio_summary=db.portfolio_summary,
+                                  users=FailingUsers(db.users))
+        with pytest.raises(RuntimeError):
+            await processor.run(failing, now)
+        after_failure = await db.users.find_one({"id": "u1"})
+        # Held by the failed pass until its claim expires, then paid once
+        held = await processor.run(db, now)
+        later = now + timedelta(seconds=61)
+        paid = await processor.run(db, later)
+        again = await processor.run(db, later + timedelta(seconds=61))
+        stakes = await db.stakes.find({}, {"_id": 0, "is_active": 1, "maturity_credited": 1}).to_list(None)
+        return (after_failure, held, paid, again, await db.users.find_one({"id": "u1"}), stakes,
+                await db.ledger.count_documents({"type": "stake_release"}))
+
+    after_failure, held, paid, again, user, stakes, entries = asyncio.run(run())
+    assert after_failure["tft_balance"] == 0.0
+    assert (held["matured"], paid["matured"], again["matured"]) == (0, 2, 0)
+    assert user["tft_balance"] == pytest.approx(2 * (100.0 + 100.0 * STAKING_APR[30] * 30 / 365))
+    assert user["staked_amount"] == pytest.approx(0.0)
+    assert stakes == [{"is_active": False, "maturity_credited": True}] * 2
+    assert entries == 2
@@ -0,0 +1,70 @@
+import asyncio
+import contextvars
+import functools
+from types import SimpleNamespace
+
+from fastapi import FastAPI
+from starlette.testclient import TestClient
+
+from metrics import Histogram, MetricsMiddleware, MetricsRegistry, MongoCommandMetrics, RequestMetrics, current_scope
+
+
+def test_histogram_renders_cumulative_buckets():
+    histogram = Histogram("latency_seconds", "Latency.", ("route",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.5, 3.0):
+        histogram.observe(("/a",), value)
+
+    lines = histogram.render()
+    assert 'latency_seconds_bucket{route="/a",le="0.1"} 1' in lines
+    assert 'latency_seconds_bucket{route="/a",le="1.0"} 3' in lines
+    assert 'latency_seconds_bucket{route="/a",le="+Inf"} 4' in lines
+    assert 'latency_seconds_count{route="/a"} 4' in lines
+    assert 'latency_seconds_sum{route="/a"} 4.05' in lines
+
+
+def test_middleware_labels_requests_by_route_template():
+    registry = MetricsRegistry()
+    app = FastAPI()
+
+    @app.get("/items/{item_id}")
+    async def get_item(item_id: str):
+        return {"id": item_id}
+
+    app.add_middleware(MetricsMiddleware, metrics=RequestMetrics(registry))
+    with TestClient(app) as client:
+        client.get("/items/1")
+        client.get("/items/2")
+        client.get("/missing")
+
+    text = registry.render()
+    assert 'averix_http_requests_total{method="GET",route="/items/{item_id}",status="200"} 2' in text
+    assert 'averix_http_requests_total{method="GET",route="unmatched",status="404"} 1' in text
+    assert 'averix_http_requests_in_flight{method="GET"} 0' in text
+
+
+def _event(request_id, command, **extra):
+    name = next(iter(command))
+    return SimpleNamespace(request_id=request_id, operation_id=request_id, command_name=name,
+                           command=command, **extra)
+
+
+def test_mongo_commands_are_attributed_to_the_issuing_route():
+    registry = MetricsRegistry()
+    listener = MongoCommandMetrics(registry)
+
+    async def handler():
+        current_scope.set({"route": SimpleNamespace(path="/api/user/dashboard")})
+        # Motor runs pymongo in an executor under a copy of the caller's context
+        started = functools.partial(contextvars.copy_context().run, listener.started)
+        await asyncio.get_running_loop().run_in_executor(None, started, _event(1, {"find": "trades", "filter": {}}))
+
+    asyncio.run(handler())
+    listener.succeeded(_event(1, {"find": "trades"}, duration_micros=2500))
+    listener.started(_event(2, {"update": "stakes"}))
+    listener.failed(_event(2, {"update": "stakes"}, duration_micros=1000))
+
+    text = registry.render()
+    assert ('averix_mongo_command_duration_seconds_count'
+            '{collection="trades",operation="find",route="/api/user/dashboard"} 1') in text
+    assert ('averix_mongo_command_failures_total'
+            '{collection="stakes",operation="update",route="background"} 1') in text
@@ -0,0 +1,144 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+import server
+from price_book import PriceBook
+from server import TradeRequest, User
+
+
+@pytest.fixture
+def book(monkeypatch):
+    book = PriceBook()
+    book.update("BTC/USDT", 100.0)
+    monkeypatch.setattr(server, "price_book", book)
+    return book
+
+
+def order(amount, stop_loss=90.0):
+    return TradeRequest(symbol="BTC/USDT", side="buy", amount=amount, stop_loss=stop_loss, take_profit=110.0)
+
+
+async def create_user(balance):
+    user = User(email="trader@example.com", first_name="T", last_name="R", tft_balance=balance)
+    await server.repos.users.insert({**user.model_dump(), "password": "x"})
+    return user
+
+
+async def state(db, user_id):
+    user = await server.repos.users.get(user_id)
+    return (user["tft_balance"], user["open_margin"], user["total_trades"],
+            await db.ledger.count_documents({"type": "trade_margin"}))
+
+
+def test_batch_fills_valid_orders_and_reports_the_rest(server_db, book):
+    async def run():
+        user = await create_user(1000.0)
+        response = await server.fill_orders([order(40.0), order(60.0), order(0.0), order(10.0, None), order(50.0)],
+                                            user)
+        return response, await state(server_db, user.id)
+
+    response, after = asyncio.run(run())
+    assert (response["filled"], response["rejected"]) == (2, 3)
+    assert [result["status"] for result in response["results"]] == [
+        "filled", "rejected", "rejected", "rejected", "filled",
+    ]
+    assert [result.get("detail") for result in response["results"]][1:4] == [
+        "Order exceeds 5% of balance limit", "Order amount must be positive", "Stop loss and take profit are mandatory",
+    ]
+    assert after == (910.0, 90.0, 2, 2)
+
+
+def test_batch_margin_cannot_exceed_the_balance(server_db, book):
+    async def run():
+        user = await create_user(1000.0)
+        response = await server.fill_orders([order(50.0)] * 22, user)
+        return response, await state(server_db, user.id)
+
+    response, after = asyncio.run(run())
+    assert (response["filled"], response["rejected"]) == (20, 2)
+    assert response["results"][-1]["detail"] == "Insufficient TFT balance for margin"
+    assert after == (0.0, 1000.0, 20, 20)
+
+
+def test_batch_revalidates_against_a_balance_that_moved(server_db, book):
+    async def run():
+        user = await create_user(500.0)
+        # Read before the balance dropped: 40 fits 5% of 1000 but not of 500
+        stale = user.model_copy(update={"tft_balance": 1000.0})
+        response = await server.fill_orders([order(40.0), order(20.0)], stale)
+        return response, await state(server_db, user.id)
+
+    response, after = asyncio.run(run())
+    assert [result["status"] for result in response["results"]] == ["rejected", "filled"]
+    assert response["results"][0]["detail"] == "Order exceeds 5% of balance limit"
+    assert after == (480.0, 20.0, 1, 1)
+
+
+def test_batch_gives_up_with_409_after_the_last_attempt(server_db, book, monkeypatch):
+    attempts = []
+
+    async def balance_keeps_moving(user_id, trades):
+        attempts.append(len(trades))
+        return None
+
+    monkeypatch.setattr(server, "apply_trades", balance_keeps_moving)
+
+    async def run():
+        user = await create_user(1000.0)
+        with pytest.raises(HTTPException) as error:
+            await server.fill_orders([order(40.0)], user)
+        return error.value, await state(server_db, user.id)
+
+    error, after = asyncio.run(run())
+    assert error.status_code == 409
+    assert attempts == [1] * server.BATCH_ORDER_ATTEMPTS
+    assert after == (1000.0, 0.0, 0, 0)
+
+
+def test_failures_after_the_fill_do_not_release_the_idempotency_key(server_db, book, monkeypatch):
+    async def fail(*args):
+        raise RuntimeError("write failed")
+
+    # Both run once the margin is locked and the trade stored
+    monkeypatch.setattr(server, "record_trades", fail)
+    monkeypatch.setattr(server, "promote_trading_level", fail)
+
+    async def run():
+        user = await create_user(1000.0)
+        request = order(40.0)
+        responses = [
+            await server.idempotent("place-order", user.id, "k1", request, lambda: server.fill_order(request, user))
+            for _ in range(2)
+        ]
+        return responses, await state(server_db, user.id)
+
+    (first, retry), after = asyncio.run(run())
+    assert first.status_code == retry.status_code == 200
+    assert retry.headers["Idempotent-Replayed"] == "true" and retry.body == first.body
+    assert after == (960.0, 40.0, 1, 1)
+
+
+def test_a_partial_insert_only_releases_the_trades_that_did_not_land(server_db, book, monkeypatch):
+    insert_many = server.repos.trades.insert_many
+
+    async def insert_some(trades):
+        # As an unordered insert_many that failed on its last document
+        await insert_many(trades[:-1])
+        raise RuntimeError("insert failed")
+
+    monkeypatch.setattr(server.repos.trades, "insert_many", insert_some)
+
+    async def run():
+        user = await create_user(1000.0)
+        response = await server.fill_orders([order(40.0), order(30.0), order(20.0)], user)
+        releases = await server_db.ledger.count_documents({"type": "margin_release"})
+        return response, await state(server_db, user.id), releases, len(server.repos.trades)
+
+    response, after, releases, stored = asyncio.run(run())
+    assert (response["filled"], response["rejected"]) == (2, 1)
+    assert response["results"][2] == {"index": 2, "status": "rejected",
+                                      "detail": "Order could not be stored, please retry"}
+    assert after == (930.0, 70.0, 2, 3)
+    assert (releases, stored) == (1, 2)
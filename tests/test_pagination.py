@@ -0,0 +1,37 @@
+from datetime import datetime
+
+import pytest
+
+from pagination import InvalidCursor, date_range, decode_cursor, encode_cursor, keyset_query
+
+
+def test_cursor_round_trip():
+    timestamp = datetime(2025, 3, 1, 12, 30, 15, 123000)
+    cursor = encode_cursor(timestamp, "trade-1")
+    assert "=" not in cursor
+    assert decode_cursor(cursor) == (timestamp, "trade-1")
+
+
+@pytest.mark.parametrize("cursor", ["not-base64!", "bm90IGpzb24", encode_cursor(datetime(2025, 1, 1), "x")[:-3]])
+def test_invalid_cursor_raises(cursor):
+    with pytest.raises(InvalidCursor):
+        decode_cursor(cursor)
+
+
+def test_keyset_query_continues_after_cursor():
+    timestamp = datetime(2025, 3, 1)
+    query = keyset_query({"user_id": "u1"}, "created_at", encode_cursor(timestamp, "t5"))
+    assert query == {"$and": [
+        {"user_id": "u1"},
+        {"$or": [
+            {"created_at": {"$lt": timestamp}},
+            {"created_at": timestamp, "id": {"$lt": "t5"}},
+        ]},
+    ]}
+    assert keyset_query({"user_id": "u1"}, "created_at", None) == {"user_id": "u1"}
+
+
+def test_date_range():
+    start, end = datetime(2025, 1, 1), datetime(2025, 2, 1)
+    assert date_range(start, end) == {"$gte": start, "$lt": end}
+    assert date_range(None, None) is None
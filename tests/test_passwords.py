@@ -0,0 +1,50 @@
+import asyncio
+
+from passwords import BCRYPT_SHA256, PasswordHasher, legacy_sha256
+
+
+def test_hash_records_algorithm_and_cost():
+    hasher = PasswordHasher(rounds=4, max_workers=1)
+    stored = asyncio.run(hasher.hash("TestPass123!"))
+    assert stored.startswith(f"{BCRYPT_SHA256}$$2b$04$")
+    assert asyncio.run(hasher.verify("TestPass123!", stored)) == (True, False)
+    assert asyncio.run(hasher.verify("wrong", stored)) == (False, False)
+
+
+def test_passwords_longer_than_72_bytes_are_not_truncated():
+    hasher = PasswordHasher(rounds=4, max_workers=1)
+    stored = hasher.hash_sync("x" * 100)
+    assert hasher.verify_sync("x" * 100, stored) == (True, False)
+    assert hasher.verify_sync("x" * 99, stored)[0] is False
+
+
+def test_legacy_sha256_hashes_verify_and_need_rehash():
+    hasher = PasswordHasher(rounds=4, max_workers=1)
+    stored = legacy_sha256("TestPass123!")
+    assert asyncio.run(hasher.verify("TestPass123!", stored)) == (True, True)
+    assert asyncio.run(hasher.verify("wrong", stored)) == (False, True)
+
+
+def test_cost_change_triggers_rehash():
+    stored = PasswordHasher(rounds=4, max_workers=1).hash_sync("pw")
+    assert PasswordHasher(rounds=5, max_workers=1).verify_sync("pw", stored) == (True, True)
+
+
+def test_unknown_formats_never_match():
+    hasher = PasswordHasher(rounds=4, max_workers=1)
+    assert hasher.verify_sync("pw", "md5$abc") == (False, False)
+    assert hasher.verify_sync("pw", f"{BCRYPT_SHA256}$garbage") == (False, False)
+
+
+def test_missing_accounts_pay_for_one_bcrypt_check(monkeypatch):
+    hasher = PasswordHasher(rounds=4, max_workers=1)
+    checked = []
+    monkeypatch.setattr(hasher, "verify_sync", lambda password, stored: checked.append(stored) or (False, False))
+
+    async def run():
+        await hasher.verify_missing("pw")
+        await hasher.verify_missing("other")
+
+    asyncio.run(run())
+    assert len(checked) == 2 and checked[0] == checked[1]
+    assert checked[0].startswith(f"{BCRYPT_SHA256}$$2b$04$")
@@ -0,0 +1,94 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+
+from portfolio import (
+    EMPTY_SUMMARY, create_summary, get_summary, rebuild_summaries, record_stake, record_trades,
+    stake_matured_update, trade_closed_update,
+)
+
+START = datetime(2025, 1, 1)
+
+
+def mock_db():
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+    return mongomock_motor.AsyncMongoMockClient()["portfolio"]
+
+
+async def stake(db, stake_id, user_id, amount):
+    await db.stakes.insert_one({"id": stake_id, "user_id": user_id, "amount": amount, "is_active": True,
+                                "rewards_earned": 0.0, "start_date": START})
+    await record_stake(db, user_id, amount)
+
+
+async def fill(db, user_id, amounts):
+    await db.trades.insert_many([
+        {"id": f"{user_id}-t{n}", "user_id": user_id, "amount": amount, "status": "open", "pnl": 0.0}
+        for n, amount in enumerate(amounts)
+    ])
+    await record_trades(db, user_id, [(amount, 0.0) for amount in amounts])
+
+
+async def close(db, user_id, pnls):
+    for trade_id, pnl in pnls.items():
+        await db.trades.update_one({"id": trade_id}, {"$set": {"status": "closed", "pnl": pnl}})
+    await db.portfolio_summary.bulk_write([trade_closed_update(user_id, pnls.values())])
+
+
+async def mature(db, stake_id, rewards):
+    doc = await db.stakes.find_one({"id": stake_id})
+    # Accrued first, as rewards.py does, then matured
+    await db.stakes.update_one({"id": stake_id}, {"$set": {"rewards_earned": rewards}})
+    await db.portfolio_summary.update_one({"user_id": doc["user_id"]}, {"$inc": {"total_rewards": rewards}})
+    await db.stakes.update_one({"id": stake_id}, {"$set": {"is_active": False}})
+    await db.portfolio_summary.bulk_write([stake_matured_update(doc["user_id"], doc["amount"], rewards)])
+
+
+async def stored(db):
+    # As read by the API; an upserted summary only holds the fields written so far
+    return {doc["user_id"]: await get_summary(db, doc["user_id"])
+            async for doc in db.portfolio_summary.find({}, {"_id": 0, "user_id": 1})}
+
+
+def test_incremental_updates_match_a_rebuild():
+    db = mock_db()
+
+    async def run():
+        await create_summary(db, "u1")
+        await stake(db, "s1", "u1", 100.0)
+        await stake(db, "s2", "u1", 50.0)
+        await mature(db, "s2", 3.0)
+        await fill(db, "u1", [10.0, 20.0, 30.0])
+        await close(db, "u1", {"u1-t0": 5.0, "u1-t1": -2.0})
+        # No create_summary: the first write upserts it
+        await fill(db, "u2", [7.0])
+        incremental = await stored(db)
+        await rebuild_summaries(db)
+        return incremental, await stored(db)
+
+    incremental, rebuilt = asyncio.run(run())
+    assert incremental == rebuilt
+    assert rebuilt["u1"] == {"total_staked": 100.0, "total_rewards": 0.0, "active_stakes": 1, "total_trades": 3,
+                             "successful_trades": 1, "total_pnl": 3.0, "trade_volume": 60.0}
+    assert rebuilt["u2"] == {**EMPTY_SUMMARY, "total_trades": 1, "trade_volume": 7.0}
+
+
+def test_rebuild_repairs_drift_and_zeroes_matured_users():
+    db = mock_db()
+
+    async def run():
+        await stake(db, "s1", "u1", 100.0)
+        await mature(db, "s1", 4.0)
+        await fill(db, "u2", [10.0])
+        await record_trades(db, "u2", [(99.0, 1.0)])  # a write with no trade behind it
+        await rebuild_summaries(db, "u2")
+        single = await stored(db)
+        await db.portfolio_summary.update_one({"user_id": "u1"}, {"$set": {"active_stakes": 5}})
+        await rebuild_summaries(db)
+        return single, await stored(db), await get_summary(db, "u3")
+
+    single, rebuilt, missing = asyncio.run(run())
+    assert single["u2"] == {**EMPTY_SUMMARY, "total_trades": 1, "trade_volume": 10.0}
+    assert rebuilt == {"u1": EMPTY_SUMMARY, "u2": single["u2"]}
+    assert missing == EMPTY_SUMMARY
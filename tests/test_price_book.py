@@ -0,0 +1,77 @@
+import asyncio
+
+import pytest
+
+from price_book import DAY_SECONDS, PriceBook, PriceSource, SharedPriceSource, SimulatedPriceSource, save_quotes
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_seeded_book_reports_configured_change():
+    book = PriceBook({"BTC/USDT": (45000.0, 2.5)})
+    assert book.snapshot() == [{"symbol": "BTC/USDT", "price": 45000.0, "change": 2.5}]
+    assert book.price("DOGE/USDT") is None
+
+
+def test_change_is_measured_against_price_24h_ago():
+    clock = FakeClock()
+    book = PriceBook({"BTC/USDT": (100.0, 0.0)}, clock=clock)
+    clock.now += DAY_SECONDS
+    book.update("BTC/USDT", 110.0)
+    assert book.get("BTC/USDT").change == 10.0
+    clock.now += DAY_SECONDS
+    book.update("BTC/USDT", 99.0)
+    assert book.get("BTC/USDT").change == -10.0
+
+
+def test_snapshot_is_rebuilt_after_update():
+    book = PriceBook({"BTC/USDT": (100.0, 0.0)})
+    first = book.snapshot()
+    assert book.snapshot() is first
+    book.update("BTC/USDT", 101.0)
+    assert book.snapshot()[0]["price"] == 101.0
+
+
+def test_simulated_source_is_deterministic():
+    async def prices():
+        book = PriceBook()
+        ticks = SimulatedPriceSource(seed=7, interval=0).ticks(book)
+        for _ in range(400):
+            symbol, price = await ticks.__anext__()
+            book.update(symbol, price)
+        return book.snapshot()
+
+    assert asyncio.run(prices()) == asyncio.run(prices())
+    with pytest.raises(TypeError):
+        PriceSource()
+
+
+def test_followers_track_the_quotes_the_leader_saves():
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+    prices = mongomock_motor.AsyncMongoMockClient()["prices"].prices
+    clock = FakeClock()
+    leader = PriceBook({"BTC/USDT": (100.0, 0.0), "ETH/USDT": (10.0, 0.0)}, clock=clock)
+    follower = PriceBook({"BTC/USDT": (1.0, 0.0), "ETH/USDT": (1.0, 0.0)})
+
+    async def follow(count):
+        ticks = SharedPriceSource(lambda: prices, interval=0).ticks(follower)
+        return [await ticks.__anext__() for _ in range(count)]
+
+    async def run():
+        since = await save_quotes(prices, leader)
+        first = await follow(2)
+        clock.now += 1
+        leader.update("BTC/USDT", 101.0)
+        # Only the quote updated since the last save is written again
+        assert await save_quotes(prices, leader, since) == clock.now
+        return first, await prices.find_one({"_id": "BTC/USDT"}), await prices.find_one({"_id": "ETH/USDT"})
+
+    first, btc, eth = asyncio.run(run())
+    assert sorted(first) == [("BTC/USDT", 100.0), ("ETH/USDT", 10.0)]
+    assert btc["price"] == 101.0 and eth["updated_at"] < btc["updated_at"]
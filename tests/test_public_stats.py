@@ -0,0 +1,77 @@
+import asyncio
+
+import pytest
+
+from public_stats import SnapshotCache, format_usd
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_concurrent_requests_share_one_computation():
+    calls = 0
+
+    async def compute():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return {"total_traders": calls}
+
+    async def run():
+        cache = SnapshotCache(compute, max_staleness=60)
+        return await asyncio.gather(*(cache.get() for _ in range(50)))
+
+    results = asyncio.run(run())
+    assert calls == 1
+    assert all(result == {"total_traders": 1} for result in results)
+
+
+def test_snapshot_is_recomputed_only_past_max_staleness():
+    clock = FakeClock()
+    calls = 0
+
+    async def compute():
+        nonlocal calls
+        calls += 1
+        return calls
+
+    async def run():
+        cache = SnapshotCache(compute, max_staleness=10, clock=clock)
+        first = await cache.get()
+        clock.now = 10
+        second = await cache.get()
+        clock.now = 10.1
+        third = await cache.get()
+        return first, second, third
+
+    assert asyncio.run(run()) == (1, 1, 2)
+
+
+def test_failed_refresh_propagates_and_next_call_retries():
+    attempts = 0
+
+    async def compute():
+        nonlocal attempts
+        attempts += 1
+        if attempts == 1:
+            raise RuntimeError("mongo down")
+        return "ok"
+
+    async def run():
+        cache = SnapshotCache(compute, max_staleness=10)
+        with pytest.raises(RuntimeError):
+            await cache.get()
+        return await cache.get()
+
+    assert asyncio.run(run()) == "ok"
+
+
+def test_format_usd():
+    assert format_usd(2_500_000) == "$2.5M"
+    assert format_usd(950_000) == "$950.0K"
+    assert format_usd(0.45) == "$0.45"
@@ -0,0 +1,109 @@
+import asyncio
+from datetime import timezone
+
+import pytest
+
+from rate_limit import BucketStore, MemoryBucketStore, MongoBucketStore, RateLimit, RateLimiter
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_parse_rate_limit():
+    limit = RateLimit.parse("20/10")
+    assert (limit.capacity, limit.period, limit.rate) == (20, 10, 2)
+    with pytest.raises(ValueError):
+        RateLimit.parse("0/10")
+
+
+def test_bucket_allows_burst_then_refills():
+    clock = FakeClock()
+    store = MemoryBucketStore(clock=clock)
+    limit = RateLimit(3, 3)
+
+    assert [store.acquire_nowait("u1", limit) for _ in range(3)] == [0, 0, 0]
+    assert store.acquire_nowait("u1", limit) == pytest.approx(1.0)
+    # Other users have buckets of their own
+    assert store.acquire_nowait("u2", limit) == 0
+
+    clock.now = 1.0
+    assert store.acquire_nowait("u1", limit) == 0
+    assert store.acquire_nowait("u1", limit) > 0
+
+
+def test_refilled_buckets_are_evicted():
+    clock = FakeClock()
+    store = MemoryBucketStore(sweep_interval=1.0, clock=clock)
+    limit = RateLimit(10, 10)
+    for user in range(100):
+        store.acquire_nowait(f"u{user}", limit)
+    assert len(store) == 100
+
+    clock.now = 0.5
+    store.acquire_nowait("active", limit)
+    assert len(store) == 101
+
+    clock.now = 2.0
+    store.acquire_nowait("active", limit)
+    assert len(store) == 1
+
+
+def test_sweep_follows_refill_time_not_last_use():
+    clock = FakeClock()
+    store = MemoryBucketStore(sweep_interval=100.0, clock=clock)
+    # Touched first, but a long period keeps it refilling for a minute
+    store.acquire_nowait("slow", RateLimit(1, 60))
+    for user in range(10):
+        store.acquire_nowait(f"u{user}", RateLimit(10, 10))
+    clock.now = 1.5
+    store.acquire_nowait("u0", RateLimit(1, 10))
+
+    clock.now = 2.0
+    assert store.sweep() == 9
+    assert len(store) == 2
+    clock.now = 60.0
+    assert store.sweep() == 2 and len(store) == 0
+
+
+def test_store_size_is_capped():
+    store = MemoryBucketStore(max_buckets=10, clock=FakeClock())
+    for user in range(50):
+        store.acquire_nowait(f"u{user}", RateLimit(5, 60))
+    assert len(store) == 10
+    with pytest.raises(TypeError):
+        BucketStore()
+
+
+def test_limiter_reports_whole_seconds_and_skips_unlimited_routes():
+    limiter = RateLimiter(MemoryBucketStore(clock=FakeClock()), {"stake": RateLimit(1, 60)})
+
+    async def run():
+        return [await limiter.check("stake", "u1") for _ in range(2)] + [await limiter.check("profile", "u1")]
+
+    assert asyncio.run(run()) == [0, 60, 0]
+
+
+def test_workers_share_mongo_buckets():
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+    db = mongomock_motor.AsyncMongoMockClient()["rate_limit"]
+    clock = FakeClock()
+    # Two workers, one collection
+    first, second = MongoBucketStore(lambda: db, clock=clock), MongoBucketStore(lambda: db, clock=clock)
+    limit = RateLimit(3, 3)
+
+    async def run():
+        burst = [await store.acquire("u1", limit) for store in (first, second, first, second)]
+        clock.now = 1.0
+        refilled = [await second.acquire("u1", limit), await first.acquire("u1", limit)]
+        return burst, refilled, await db.rate_limits.find_one({"_id": "u1"})
+
+    burst, refilled, bucket = asyncio.run(run())
+    assert burst[:3] == [0, 0, 0] and burst[3] == pytest.approx(1.0)
+    assert refilled[0] == 0 and refilled[1] == pytest.approx(1.0)
+    # Stored as naive UTC
+    assert bucket["expires_at"].replace(tzinfo=timezone.utc).timestamp() == pytest.approx(4.0)
@@ -0,0 +1,114 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from pymongo.errors import DuplicateKeyError
+
+from indexes import ensure_indexes
+from pagination import InvalidCursor
+from repositories import REPOSITORY_BACKENDS, MemoryStakeRepository, StakeRepository
+
+START = datetime(2025, 1, 1)
+
+
+def backends():
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+    return {name: factory(mongomock_motor.AsyncMongoMockClient()[f"repos_{name}"])
+            for name, factory in REPOSITORY_BACKENDS.items()}
+
+
+async def seed_trades(repos):
+    # Two trades share a timestamp so pages have to break ties on id
+    await repos.trades.insert_many([
+        {"id": f"t{n:02d}", "user_id": "u1" if n % 4 else "u2", "symbol": "BTC/USDT" if n % 3 else "ETH/USDT",
+         "side": "buy", "amount": 10.0, "price": 100.0, "status": "open" if n % 2 else "closed",
+         "pnl": 0.0, "close_id": None, "created_at": START + timedelta(hours=min(n, 20))}
+        for n in range(24)
+    ])
+
+
+async def all_pages(page, **filters):
+    rows, cursor = [], None
+    while True:
+        batch, cursor = await page("u1", cursor, 3, **filters)
+        rows.extend(row["id"] for row in batch)
+        if cursor is None:
+            return rows
+
+
+def test_trade_pages_match_between_backends():
+    async def run(repos):
+        await seed_trades(repos)
+        return [
+            await all_pages(repos.trades.page),
+            await all_pages(repos.trades.page, symbol="BTC/USDT", status="open"),
+            await all_pages(repos.trades.page, start=START + timedelta(hours=5),
+                            end=(START + timedelta(hours=20)).replace(tzinfo=timezone.utc)),
+            [trade["id"] for trade in await repos.trades.recent("u1", 5)],
+            [trade["id"] for trade in await repos.trades.open_for_user("u1", 5)],
+            await repos.trades.closed_count("u1"),
+            sorted(trade["id"] for trade in await repos.trades.closed("u1")),
+            sorted(trade["id"] for trade in await repos.trades.open_since(START + timedelta(hours=18))),
+            [(await repos.trades.get_open(user_id, trade_id) or {}).get("id")
+             for user_id, trade_id in (("u1", "t21"), ("u2", "t21"), ("u1", "t22"))],
+            await repos.trades.stored_ids(["t03", "t99", "t23"]),
+        ]
+
+    results = {name: asyncio.run(run(repos)) for name, repos in backends().items()}
+    assert results["memory"] == results["motor"]
+    pages = results["memory"]
+    assert pages[0][:3] == ["t23", "t22", "t21"] and len(pages[0]) == 18
+    assert pages[5] == 6
+    assert pages[7] == ["t19", "t21", "t23"]
+    # Only the owner's trade, and only while it is open
+    assert pages[8] == ["t21", None, None]
+    assert pages[9] == {"t03", "t23"}
+
+
+def test_stake_pages_hide_claim_fields():
+    async def run(repos):
+        for n in range(5):
+            await repos.stakes.insert({"id": f"s{n}", "user_id": "u1", "amount": 10.0, "is_active": n != 2,
+                                       "start_date": START + timedelta(days=n), "maturity_claim": "c"})
+        await repos.stakes.delete("s4")
+        stakes, cursor = await repos.stakes.page("u1", None, 2, is_active=True)
+        more, _ = await repos.stakes.page("u1", cursor, 2, is_active=True)
+        with pytest.raises(InvalidCursor):
+            await repos.stakes.page("u1", "bogus", 2)
+        return stakes + more
+
+    for repos in backends().values():
+        stakes = asyncio.run(run(repos))
+        assert [stake["id"] for stake in stakes] == ["s3", "s1", "s0"]
+        assert all("maturity_claim" not in stake for stake in stakes)
+
+
+def test_user_writes_are_conditional():
+    async def run(repos, db_indexes):
+        await db_indexes()
+        await repos.users.insert({"id": "u1", "email": "a@example.com", "tft_balance": 100.0, "total_trades": 0})
+        with pytest.raises(DuplicateKeyError):
+            await repos.users.insert({"id": "u2", "email": "a@example.com", "tft_balance": 0.0})
+        debited = await repos.users.increment("u1", {"tft_balance": -30.0, "total_trades": 1}, min_balance=30.0)
+        refused = await repos.users.increment("u1", {"tft_balance": -80.0}, min_balance=80.0)
+        stale = await repos.users.update("u1", {"trading_level": "Gold"}, expected={"trading_level": "Silver"})
+        await repos.users.update("u1", {"trading_level": "Silver"})
+        await repos.users.increment_many({"u1": {"tft_balance": 5.0}, "missing": {"tft_balance": 1.0}})
+        return debited, refused, stale, await repos.users.get_by_email("a@example.com")
+
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+    for name, factory in REPOSITORY_BACKENDS.items():
+        db = mongomock_motor.AsyncMongoMockClient()[f"users_{name}"]
+        debited, refused, stale, user = asyncio.run(run(factory(db), lambda: ensure_indexes(db)))
+        assert debited["tft_balance"] == 70.0 and debited["total_trades"] == 1
+        assert refused is None and stale is None
+        assert user["tft_balance"] == 75.0 and user["trading_level"] == "Silver"
+        assert "_id" not in user
+
+
+def test_implementations_must_cover_the_interface():
+    class Incomplete(StakeRepository):
+        insert = MemoryStakeRepository.insert
+
+    with pytest.raises(TypeError, match="delete, page"):
+        Incomplete()
@@ -0,0 +1,39 @@
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+from rewards import STAKING_APR, compute_batch, tier_rates
+
+
+def stake(amount, duration_days, start, rewards_earned=0.0):
+    return {
+        "id": "s1", "user_id": "u1", "amount": amount, "duration_days": duration_days,
+        "start_date": start, "end_date": start + timedelta(days=duration_days),
+        "rewards_earned": rewards_earned,
+    }
+
+
+def test_tier_rates_match_duration_tiers():
+    rates = tier_rates(np.array([14, 30, 90, 180, 360, 7, 1000]))
+    expected = [STAKING_APR[d] for d in (14, 30, 90, 180, 360)] + [0.0, 0.0]
+    assert rates.tolist() == expected
+
+
+def test_rewards_accrue_linearly_and_stop_at_end_date():
+    start = datetime(2025, 1, 1)
+    docs = [stake(1000.0, 360, start), stake(1000.0, 30, start), stake(1000.0, 90, start + timedelta(days=100))]
+    batch = compute_batch(docs, start + timedelta(days=73))
+    assert np.allclose(batch["rewards"], [
+        1000.0 * STAKING_APR[360] * 73 / 365,
+        1000.0 * STAKING_APR[30] * 30 / 365,
+        0.0,
+    ])
+    assert batch["changed"].tolist() == [True, True, False]
+
+
+def test_timezone_aware_as_of_is_treated_as_utc():
+    start = datetime(2025, 1, 1)
+    docs = [stake(365.0, 360, start)]
+    naive = compute_batch(docs, datetime(2025, 1, 11))
+    aware = compute_batch(docs, datetime(2025, 1, 11, tzinfo=timezone.utc))
+    assert naive["rewards"].tolist() == aware["rewards"].tolist() == [365.0 * STAKING_APR[360] * 10 / 365]
@@ -0,0 +1,45 @@
+from datetime import datetime, timezone
+
+import orjson
+from fastapi import APIRouter, FastAPI
+from fastapi.testclient import TestClient
+from pydantic import BaseModel
+
+from serialization import FastJSONRoute, dumps
+
+
+class Item(BaseModel):
+    name: str
+    created_at: datetime
+
+
+def test_dumps_handles_models_and_native_datetimes():
+    created = datetime(2025, 1, 2, 3, 4, 5)
+    assert orjson.loads(dumps({"at": created, "item": Item(name="a", created_at=created)})) == {
+        "at": "2025-01-02T03:04:05",
+        "item": {"name": "a", "created_at": "2025-01-02T03:04:05"},
+    }
+    assert orjson.loads(dumps(Item(name="b", created_at=datetime(2025, 1, 1, tzinfo=timezone.utc)))) == {
+        "name": "b", "created_at": "2025-01-01T00:00:00Z",
+    }
+
+
+def test_route_encodes_results_and_keeps_status_code():
+    router = APIRouter(route_class=FastJSONRoute)
+
+    @router.get("/item", response_model=Item)
+    async def get_item():
+        return Item(name="a", created_at=datetime(2025, 1, 1))
+
+    @router.post("/items", status_code=201)
+    async def create_item(name: str):
+        return {"name": name}
+
+    app = FastAPI()
+    app.include_router(router)
+    client = TestClient(app)
+    assert client.get("/item").json() == {"name": "a", "created_at": "2025-01-01T00:00:00"}
+    response = client.post("/items", params={"name": "b"})
+    assert response.status_code == 201
+    assert response.json() == {"name": "b"}
+    assert client.post("/items").status_code == 422
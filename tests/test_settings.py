@@ -0,0 +1,36 @@
+import pytest
+
+from settings import Settings
+
+
+def test_unset_pool_options_keep_driver_defaults():
+    settings = Settings.from_env({"MONGO_URL": "mongodb://db", "DB_NAME": "averix"})
+    assert settings.client_options() == {"appname": "averix-backend"}
+
+
+def test_pool_and_compression_options_map_to_client_keywords():
+    settings = Settings.from_env({
+        "MONGO_URL": "mongodb://db", "DB_NAME": "averix", "MONGO_MAX_POOL_SIZE": "50",
+        "MONGO_WAIT_QUEUE_TIMEOUT_MS": "500", "MONGO_COMPRESSORS": "zstd, zlib",
+        "MONGO_ZLIB_COMPRESSION_LEVEL": "6",
+    })
+    options = settings.client_options()
+    assert options["maxPoolSize"] == 50
+    assert options["waitQueueTimeoutMS"] == 500
+    assert options["compressors"] == "zstd,zlib"
+    assert options["zlibCompressionLevel"] == 6
+
+
+def test_unknown_compressor_is_rejected():
+    with pytest.raises(ValueError):
+        Settings.from_env({"MONGO_URL": "mongodb://db", "DB_NAME": "averix", "MONGO_COMPRESSORS": "gzip"})
+
+
+def test_repository_backend_must_be_known_and_not_memory():
+    env = {"MONGO_URL": "mongodb://db", "DB_NAME": "averix"}
+    assert Settings.from_env(env).repository_backend == "motor"
+    with pytest.raises(ValueError, match="Unknown repository backend 'mongo'"):
+        Settings.from_env({**env, "REPOSITORY_BACKEND": "mongo"})
+    with pytest.raises(ValueError, match="tests and benchmarks only"):
+        Settings.from_env({**env, "REPOSITORY_BACKEND": "memory"})
+    assert Settings("mongodb://db", "averix", repository_backend="memory").repository_backend == "memory"
@@ -0,0 +1,74 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+import server
+from server import StakeRequest, User
+
+
+async def create_user(db, balance):
+    user = User(email="staker@example.com", first_name="S", last_name="T", tft_balance=balance)
+    await server.repos.users.insert({**user.model_dump(), "password": "x"})
+    return user
+
+
+async def state(db, user_id):
+    user = await server.repos.users.get(user_id)
+    return (user["tft_balance"], user["staked_amount"], len(server.repos.stakes),
+            await db.ledger.count_documents({"type": "stake_lock"}))
+
+
+def test_stakes_only_debit_a_balance_that_covers_them(server_db):
+    async def run():
+        user = await create_user(server_db, 150.0)
+        # Both read a balance of 150; the guarded write lets one through
+        results = await asyncio.gather(
+            *(server.open_stake(StakeRequest(amount=100.0, duration_days=30), user) for _ in range(2)),
+            return_exceptions=True,
+        )
+        return results, await state(server_db, user.id)
+
+    results, after = asyncio.run(run())
+    rejected = [result for result in results if isinstance(result, HTTPException)]
+    assert len(rejected) == 1 and rejected[0].detail == "Insufficient TFT balance"
+    assert after == (50.0, 100.0, 1, 1)
+
+
+@pytest.mark.parametrize("failing", ["stake", "ledger"])
+def test_failed_writes_roll_the_debit_back(server_db, monkeypatch, failing):
+    async def fail(*args):
+        raise RuntimeError("write failed")
+
+    if failing == "stake":
+        monkeypatch.setattr(server.repos.stakes, "insert", fail)
+    else:
+        monkeypatch.setattr(server.ledger_writer, "append", fail)
+
+    async def run():
+        user = await create_user(server_db, 150.0)
+        with pytest.raises(RuntimeError):
+            await server.open_stake(StakeRequest(amount=100.0, duration_days=30), user)
+        return await state(server_db, user.id), server.user_cache.get(user.id)
+
+    after, cached = asyncio.run(run())
+    assert after == (150.0, 0.0, 0, 0)
+    assert cached is None
+
+
+def test_a_failed_summary_update_keeps_the_stake(server_db, monkeypatch):
+    async def fail(*args):
+        raise RuntimeError("summary write failed")
+
+    monkeypatch.setattr(server, "record_stake", fail)
+
+    async def run():
+        user = await create_user(server_db, 150.0)
+        response = await server.open_stake(StakeRequest(amount=100.0, duration_days=30), user)
+        before = await server_db.portfolio_summary.find_one({"user_id": user.id})
+        return response, await state(server_db, user.id), before
+
+    response, after, summary = asyncio.run(run())
+    assert response["stake"]["amount"] == 100.0
+    assert after == (50.0, 100.0, 1, 1)
+    assert summary is None
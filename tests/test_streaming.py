@@ -0,0 +1,65 @@
+import asyncio
+import json
+
+from price_book import PriceBook
+from streaming import StreamHub
+
+
+def drain(subscriber):
+    return [json.loads(message) for message in asyncio.run(subscriber.next_batch())]
+
+
+def test_price_ticks_fan_out_and_coalesce_per_symbol():
+    book = PriceBook({"BTC/USDT": (100.0, 0.0), "ETH/USDT": (10.0, 0.0)})
+    hub = StreamHub()
+    book.add_listener(hub.publish_price)
+    first, second = hub.connect("u1"), hub.connect("u2")
+    hub.subscribe(first, ["BTC/USDT", "ETH/USDT"])
+    hub.subscribe(second, ["BTC/USDT"])
+
+    for price in (101.0, 102.0, 103.0):
+        book.update("BTC/USDT", price)
+    book.update("ETH/USDT", 11.0)
+
+    assert [(m["symbol"], m["price"]) for m in drain(first)] == [("BTC/USDT", 103.0), ("ETH/USDT", 11.0)]
+    assert [(m["symbol"], m["price"]) for m in drain(second)] == [("BTC/USDT", 103.0)]
+    assert first.coalesced_prices == 2
+
+
+def test_fills_go_only_to_the_owner_and_overflow_requests_resync():
+    hub = StreamHub(max_pending_fills=2)
+    owner, other = hub.connect("u1"), hub.connect("u2")
+    for n in range(3):
+        hub.publish_fill("u1", {"id": f"t{n}"})
+
+    messages = drain(owner)
+    assert messages[0] == {"type": "resync", "dropped_fills": 1}
+    assert [m["trade"]["id"] for m in messages[1:]] == ["t1", "t2"]
+    assert not other._ready.is_set()
+
+
+def test_disconnect_removes_all_subscriptions():
+    hub = StreamHub()
+    subscriber = hub.connect("u1")
+    hub.subscribe(subscriber, ["BTC/USDT"])
+    hub.disconnect(subscriber)
+    assert hub.connections == 0
+    assert hub._by_symbol == {}
+
+
+def test_failed_sends_are_logged(server_db, monkeypatch, caplog):
+    from fastapi.testclient import TestClient
+
+    import server
+
+    async def broken_sender(websocket, subscriber):
+        raise RuntimeError("send failed")
+
+    monkeypatch.setattr(server, "send_stream", broken_sender)
+    user = server.User(email="viewer@example.com", first_name="V", last_name="W")
+    asyncio.run(server.repos.users.insert({**user.model_dump(), "password": "x"}))
+    token = server.create_access_token({"sub": user.id, "email": user.email})
+
+    with TestClient(server.app).websocket_connect(f"/api/ws/stream?token={token}") as websocket:
+        websocket.send_text("{}")
+    assert any(record.exc_info and str(record.exc_info[1]) == "send failed" for record in caplog.records)
@@ -0,0 +1,77 @@
+from user_cache import UserCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_hit_and_miss_counters():
+    cache = UserCache(max_size=10, ttl_seconds=30)
+    assert cache.get("u1") is None
+    cache.set("u1", "alice")
+    assert cache.get("u1") == "alice"
+    stats = cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+    assert stats["hit_rate"] == 0.5
+
+
+def test_entries_expire_after_ttl():
+    clock = FakeClock()
+    cache = UserCache(max_size=10, ttl_seconds=5, clock=clock)
+    cache.set("u1", "alice")
+    clock.now = 4.9
+    assert cache.get("u1") == "alice"
+    clock.now = 5.0
+    assert cache.get("u1") is None
+    assert cache.stats()["size"] == 0
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = UserCache(max_size=2, ttl_seconds=30)
+    cache.set("u1", "alice")
+    cache.set("u2", "bob")
+    cache.get("u1")
+    cache.set("u3", "carol")
+    assert cache.get("u2") is None
+    assert cache.get("u1") == "alice"
+    assert cache.get("u3") == "carol"
+    assert cache.stats()["evictions"] == 1
+
+
+def test_invalidate_drops_entry():
+    cache = UserCache(max_size=10, ttl_seconds=30)
+    cache.set("u1", "alice")
+    cache.invalidate("u1")
+    cache.invalidate("missing")
+    assert cache.get("u1") is None
+    assert cache.stats()["invalidations"] == 1
+
+
+def test_fills_read_before_an_invalidation_are_refused():
+    cache = UserCache(max_size=2, ttl_seconds=30)
+    before = cache.version()
+    # A write lands while the lookup is reading the old document
+    cache.invalidate("u1")
+    cache.set("u1", "old balance", version=before)
+    assert cache.get("u1") is None
+
+    after = cache.version()
+    cache.set("u1", "new balance", version=after)
+    assert cache.get("u1") == "new balance"
+    # Other users' invalidations do not refuse the fill
+    cache.invalidate("u2")
+    cache.set("u3", "carol", version=after)
+    assert cache.get("u3") == "carol"
+
+    # Once u1 is no longer tracked, reads older than what was dropped are refused
+    cache.invalidate("u4")
+    cache.invalidate("u5")
+    cache.set("u1", "old balance", version=before)
+    cache.set("u6", "dave", version=after)
+    assert cache.get("u6") is None
+    assert cache.stats()["stale_fills"] == 3